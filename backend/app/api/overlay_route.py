@@ -1,15 +1,38 @@
-from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import Optional
+from sqlalchemy import update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import json
 
-from app.db import get_db, Overlay
+from app.db import get_db, get_async_db, Overlay
 from app.services.video_services import save_file, get_video_by_id
-from app.services.overlay_services import validate_overlays
-from app.jobs.celery_tasks import call_overlay_task
-from app.schemas.schemas import TaskStatusResponse
-from app.utils import get_task_status, get_upload_path
+from app.services.overlay_services import (
+    validate_overlays, overlay_cache_key, get_cached_overlay, get_overlay_outputs, touch_overlay_output, save_overlay,
+    VALID_RENDER_MODES, VALID_OUTPUT_FORMATS, PIPELINE_RENDER_MODE
+)
+from app.services.pipeline_services import (
+    validate_pipeline, pipeline_profile, pipeline_cache_key, pipeline_overlays
+)
+from app.services.probe_services import get_media_probe
+from app.services.delivery_services import ensure_output_hash, media_file_response, hls_file_response
+from app.services.blob_services import register_blob, get_blob_path
+from app.services.template_services import (
+    create_overlay_template, get_overlay_template, create_overlay_batch, get_overlay_batch
+)
+from app.services.lifecycle_services import restorable, restore_in_progress, restoring_response
+from app.jobs.celery_tasks import call_overlay_task, batch_overlay_task, finish_overlay_batch_task, restore_overlay_task
+from app.schemas.schemas import (
+    TaskStatusResponse, BulkStatusRequest, BulkStatusResponse, OverlayTemplateSchema, OverlayBatchRequest,
+    OverlayBatchSchema
+)
+from app.celery_app import PRIORITY_HIGH
+from app.config import settings
+from celery import chord, group
+from app.utils import get_task_status, get_task_statuses, get_upload_path, mark_task_success, stream_job_events, HLS_PLAYLIST
+import uuid
 
 
 router = APIRouter(prefix="/process", tags=["process"])
@@ -18,6 +41,11 @@ router = APIRouter(prefix="/process", tags=["process"])
     Schedule the overlay process. 
     In single request max 3 overlay can be schedule
     "text", "image" and "video" overlay support
+    render_mode "parallel" splits long videos at keyframes and renders the segments concurrently,
+    "windowed" only re-encodes the keyframe-aligned parts where overlays are visible
+    output_format "hls" also packages the result for streaming at /result/{job_id}/hls/index.m3u8
+    profile picks the encoder profile (e.g. "fast-preview", "standard", "archive"),
+    preview=true also queues a quick low-resolution render first, returned as preview_job_id
 """
 @router.post("/overlay")
 async def process_video_overlay_request(
@@ -26,7 +54,11 @@ async def process_video_overlay_request(
     overlay_file_1: Optional[UploadFile] = File(None),
     overlay_file_2: Optional[UploadFile] = File(None),
     overlay_file_3: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    render_mode: str = Form("single"),
+    output_format: str = Form("mp4"),
+    profile: Optional[str] = Form(None),
+    preview: bool = Form(False),
+    db: AsyncSession = Depends(get_async_db)
 ):
             
     try:
@@ -34,6 +66,14 @@ async def process_video_overlay_request(
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON for overlays")
     
+    if render_mode not in VALID_RENDER_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid render_mode '{render_mode}'")
+    if output_format not in VALID_OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid output_format '{output_format}'")
+    profile = profile or settings.default_encoder_profile
+    if profile not in settings.encoder_profiles:
+        raise HTTPException(status_code=400, detail=f"Invalid profile '{profile}'")
+    
     file_map = {
         "overlay_file_1": overlay_file_1,
         "overlay_file_2": overlay_file_2,
@@ -45,42 +85,206 @@ async def process_video_overlay_request(
         raise HTTPException(status_code=400, detail=errors)
     
     # Save files and update overlay paths
+    await _store_overlay_files(db, file_map, overlays_data)
+    
+    video_data = await db.run_sync(get_video_by_id, video_id)
+
+    # the preview is queued first, so it is ready long before the final render
+    preview_job = None
+    if preview and profile != settings.preview_encoder_profile:
+        preview_job = await _queue_overlay_job(
+            db, video_data, overlays_data, render_mode, "mp4", settings.preview_encoder_profile
+        )
+
+    response = await _queue_overlay_job(db, video_data, overlays_data, render_mode, output_format, profile)
+    if preview:
+        response["preview_job_id"] = preview_job["job_id"] if preview_job else response["job_id"]
+    return response
+
+
+async def _queue_overlay_job(db: AsyncSession, video_data, overlays_data: list, render_mode: str,
+                             output_format: str, profile: str, cache_key: str | None = None) -> dict:
+    """
+    Queue one overlay render of a video, or finish it right away when an
+    identical render is cached. `cache_key` defaults to the overlay cache key.
+    """
+    # same video, overlays, assets and profile rendered before: finish the job right away
+    cache_key = cache_key or overlay_cache_key(video_data.content_hash, overlays_data, profile, render_mode)
+    cached = await db.run_sync(get_cached_overlay, cache_key)
+    if cached:
+        job_id = str(uuid.uuid4())
+        await run_in_threadpool(
+            save_overlay,
+            job_id, cached.overlay_filename, overlays_data, cache_key=cache_key, output_hash=cached.output_hash,
+            profile=profile, video_id=video_data.id, render_mode=render_mode
+        )
+        await db.run_sync(touch_overlay_output, cached.overlay_filename)
+        await run_in_threadpool(mark_task_success, job_id, {"job_id": job_id})
+        return {"job_id": job_id, "cached": True}
+
+    # quick previews don't wait behind full renders
+    options = {"queue": "preview", "priority": PRIORITY_HIGH} if profile == settings.preview_encoder_profile else {}
+
+    # pass the process in job queue
+    job = call_overlay_task.apply_async(
+        kwargs=dict(
+            input_file=video_data.saved_filename,
+            overlays=overlays_data,
+            content_hash=video_data.content_hash,
+            cache_key=cache_key,
+            render_mode=render_mode,
+            output_format=output_format,
+            profile=profile,
+            video_id=video_data.id,
+        ),
+        **options,
+    )
+        
+    return {"job_id": job.id, "cached": False}
+
+
+"""
+    Schedule a pipeline: ordered operations applied to a video in a single ffmpeg pass (one decode, one encode),
+    e.g. [{"type": "trim", "start": 600, "end": 720}, {"type": "overlay", "overlays": [...]},
+    {"type": "scale", "width": 1280, "height": -2}, {"type": "encode", "profile": "archive"}]
+    overlay times are on the timeline of the clip at that point, i.e. after the trims before them
+    overlay files, /status, /events and /result work like for /overlay
+"""
+@router.post("/pipeline")
+async def process_pipeline_request(
+    video_id: str = Form(...),
+    operations: str = Form(...),
+    overlay_file_1: Optional[UploadFile] = File(None),
+    overlay_file_2: Optional[UploadFile] = File(None),
+    overlay_file_3: Optional[UploadFile] = File(None),
+    output_format: str = Form("mp4"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        operations_data = json.loads(operations)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON for operations")
+    
+    if output_format not in VALID_OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid output_format '{output_format}'")
+    
+    try:
+        video_data = await db.run_sync(get_video_by_id, video_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    probe = await db.run_sync(get_media_probe, video_data.content_hash)
+    
+    file_map = {
+        "overlay_file_1": overlay_file_1,
+        "overlay_file_2": overlay_file_2,
+        "overlay_file_3": overlay_file_3
+    }
+    is_valid, errors = validate_pipeline(
+        operations_data, file_map, duration=probe.duration if probe else video_data.duration
+    )
+    if not is_valid:
+        raise HTTPException(status_code=400, detail=errors)
+    
+    # the overlays of every operation point at the stored files
+    await _store_overlay_files(db, file_map, pipeline_overlays(operations_data))
+    
+    profile = pipeline_profile(operations_data)
+    cache_key = pipeline_cache_key(video_data.content_hash, operations_data, profile)
+    return await _queue_overlay_job(
+        db, video_data, operations_data, PIPELINE_RENDER_MODE, output_format, profile, cache_key=cache_key
+    )
+
+
+async def _store_overlay_files(db: AsyncSession, file_map: dict, overlays_data: list) -> None:
+    """
+    Store the uploaded overlay files as blobs and point the overlays using them at the stored files.
+    Jobs take no reference, the lifecycle task keeps the blobs their outputs may be restored from.
+    """
     for key, file in file_map.items():
         if file is not None:
-            saved_filename, file_path = await save_file(file, "overlay_items")
+            saved_filename, file_path, digest = await save_file(file, "overlay_items")
+            # sync services run on the async connection, the event loop is never blocked
+            blob = await db.run_sync(register_blob, digest, saved_filename, "overlay_items")
+            file_path = get_blob_path(blob)
             
             # Update overlays where file_key == current key
             for overlay in overlays_data:
                 if overlay.get("file_key") == key:
                     overlay["file_key"] = str(file_path)
-    
-    video_data = get_video_by_id(db, video_id)
-    input_file=video_data.saved_filename
-
-    # pass the process in job queue
-    job = call_overlay_task.delay(input_file=input_file, overlays=overlays_data)
-        
-    return {"job_id": job.id}
+                    overlay["file_hash"] = digest
 
 
-# download the overlay processed video
-@router.get("/result/{job_id}")
-def get_overlay_file(job_id: str, db: Session = Depends(get_db)):
+def _get_overlay_output(db: Session, job_id: str) -> Overlay:
     overlay = db.query(Overlay).filter(Overlay.job_id == job_id).first()
     
     if not overlay:
         raise HTTPException(status_code=404, detail="Overlay not found")
     
+    return overlay
+
+
+def _restore_overlay_response(db: Session, overlay: Overlay):
+    """
+    Answer a request for an evicted output: queue its restore (once for
+    all the jobs sharing it) and tell the client to retry.
+    """
+    if not overlay.video_id or not restorable(overlay.evicted_at):
+        raise HTTPException(status_code=410, detail="Overlay result was evicted from the render cache")
+    
+    if not restore_in_progress(overlay.restore_job_id):
+        job_id = str(uuid.uuid4())
+        db.execute(
+            update(Overlay)
+            .where(Overlay.overlay_filename == overlay.overlay_filename)
+            .values(restore_job_id=job_id)
+        )
+        db.commit()
+        restore_overlay_task.apply_async(kwargs={"overlay_job_id": overlay.job_id}, task_id=job_id)
+        return restoring_response(job_id)
+    
+    return restoring_response(overlay.restore_job_id)
+
+
+# download the overlay processed video, supports Range and If-None-Match
+# an evicted output is rendered again: 202 with the restore job, retry once it finished
+@router.get("/result/{job_id}")
+def get_overlay_file(job_id: str, request: Request, db: Session = Depends(get_db)):
+    overlay = _get_overlay_output(db, job_id)
+    if overlay.evicted_at is not None:
+        return _restore_overlay_response(db, overlay)
+    
     overlays_folder = get_upload_path('overlays')
     overlay_filename = overlay.overlay_filename
     
     path = overlays_folder / overlay_filename    
     
-    return FileResponse(
-            path=path,
+    touch_overlay_output(db, overlay_filename)
+    
+    return media_file_response(
+            request,
+            path,
+            etag=ensure_output_hash(db, overlay, path),
             filename=overlay_filename,
-            media_type="video/mp4"
         )
+
+
+# stream the overlay processed video, packaged as HLS by a job on first use: 202 with the job, retry once it finished
+@router.get("/result/{job_id}/hls/{name}")
+def get_overlay_hls_file(job_id: str, name: str, request: Request, db: Session = Depends(get_db)):
+    overlay = _get_overlay_output(db, job_id)
+    if overlay.evicted_at is not None:
+        return _restore_overlay_response(db, overlay)
+    
+    path = get_upload_path('overlays') / overlay.overlay_filename
+    output_hash = ensure_output_hash(db, overlay, path)
+    
+    if name == HLS_PLAYLIST:
+        touch_overlay_output(db, overlay.overlay_filename)
+    
+    try:
+        return hls_file_response(request, output_hash, path, name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     
     
 # check the status of job    
@@ -99,4 +303,151 @@ def status_request(job_id: str):
     if job_status.get("result") is not None:
         job_status["result"] = str(job_status["result"])
 
-    return job_status
\ No newline at end of file
+    return job_status
+
+
+# status of many jobs at once, for dashboards: one result backend read and one query for all of them
+@router.post("/status", response_model=BulkStatusResponse)
+def bulk_status_request(request: BulkStatusRequest, db: Session = Depends(get_db)):
+    """
+    Check the status of many jobs by ID, with the output of the finished overlay jobs.
+    """
+    job_ids = list(dict.fromkeys(request.job_ids))
+    if len(job_ids) > settings.status_bulk_max_jobs:
+        raise HTTPException(
+            status_code=400, detail=f"Maximum {settings.status_bulk_max_jobs} jobs allowed per request."
+        )
+    
+    try:
+        statuses = get_task_statuses(job_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching task status: {str(e)}")
+    outputs = get_overlay_outputs(db, job_ids)
+    
+    jobs = []
+    for job_id in job_ids:
+        job_status = statuses[job_id]
+        if job_status.get("result") is not None:
+            job_status["result"] = str(job_status["result"])
+        jobs.append({**job_status, "output": outputs.get(job_id)})
+    
+    return {"jobs": jobs}
+
+
+# push job progress and completion to the client instead of polling /status
+@router.get("/events/{job_id}")
+async def job_events_request(job_id: str, request: Request):
+    """
+    Stream the state of a job as Server-Sent Events: the current state,
+    then a `progress` event per update and a final `success` or `failure`.
+    """
+    async def current_state():
+        return await run_in_threadpool(get_task_status, job_id)
+
+    return StreamingResponse(
+        stream_job_events(job_id, current_state, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+"""
+    Store an overlay template: same overlays and files as /overlay, without a video.
+    Assets are prepared once here and reused by every batch applying the template.
+"""
+@router.post("/templates", response_model=OverlayTemplateSchema)
+async def create_template_request(
+    name: str = Form(...),
+    overlays: str = Form(...),
+    overlay_file_1: Optional[UploadFile] = File(None),
+    overlay_file_2: Optional[UploadFile] = File(None),
+    overlay_file_3: Optional[UploadFile] = File(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        overlays_data = json.loads(overlays)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON for overlays")
+    
+    file_map = {
+        "overlay_file_1": overlay_file_1,
+        "overlay_file_2": overlay_file_2,
+        "overlay_file_3": overlay_file_3
+    }
+    is_valid, errors = validate_overlays(overlays_data, file_map, max_overlays=3)
+    if not is_valid:
+        raise HTTPException(status_code=400, detail=errors)
+    
+    # the template takes its own references once the assets are prepared
+    await _store_overlay_files(db, file_map, overlays_data)
+    
+    try:
+        return await run_in_threadpool(create_overlay_template, name, overlays_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/templates/{template_id}", response_model=OverlayTemplateSchema)
+def get_template_request(template_id: str, db: Session = Depends(get_db)):
+    template = get_overlay_template(db, template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Overlay template not found")
+    return template
+
+
+"""
+    Apply a template to many videos: one overlay job per video, run as a
+    Celery chord. The batch id is a job id too, /status and /events report
+    the aggregate progress and the final summary.
+"""
+@router.post("/batch", response_model=OverlayBatchSchema)
+def overlay_batch_request(request: OverlayBatchRequest, db: Session = Depends(get_db)):
+    if not request.video_ids:
+        raise HTTPException(status_code=400, detail="At least one video is required.")
+    if len(request.video_ids) > settings.overlay_batch_max_videos:
+        raise HTTPException(
+            status_code=400, detail=f"Maximum {settings.overlay_batch_max_videos} videos allowed per batch."
+        )
+    
+    profile = request.profile or settings.default_encoder_profile
+    if profile not in settings.encoder_profiles:
+        raise HTTPException(status_code=400, detail=f"Invalid profile '{profile}'")
+    
+    template = get_overlay_template(db, request.template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Overlay template not found")
+    
+    try:
+        batch, jobs = create_overlay_batch(
+            db, template, request.video_ids, render_mode=request.render_mode, output_format=request.output_format,
+            profile=profile
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # fan out one job per video, the callback closes the batch once all are done
+    header = group(
+        batch_overlay_task.s(
+            batch_id=batch.id,
+            video_id=job["video_id"],
+            input_file=job["input_file"],
+            overlays=template.overlays,
+            content_hash=job["content_hash"],
+            cache_key=job["cache_key"],
+            render_mode=request.render_mode,
+            output_format=request.output_format,
+            profile=profile,
+        ).set(task_id=job["job_id"])
+        for job in jobs
+    )
+    chord(header, finish_overlay_batch_task.s(batch_id=batch.id)).apply_async(task_id=batch.id)
+    
+    return batch
+
+
+@router.get("/batch/{batch_id}", response_model=OverlayBatchSchema)
+def get_batch_request(batch_id: str, db: Session = Depends(get_db)):
+    batch = get_overlay_batch(db, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Overlay batch not found")
+    return batch
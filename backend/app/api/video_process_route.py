@@ -1,25 +1,104 @@
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Header, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from app.db import get_db, Video
-from app.services.video_services import save_file, save_video_metadata, get_video_by_id, trim_video, save_trim_video_metadata
-from app.schemas.schemas import VideoSchema, TrimVideoRequest
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from app.config import settings
+from app.db import get_db, get_async_db, TrimmedVideo
+from app.services.video_services import (
+    save_file, save_video_metadata, get_video_by_id, get_video_by_hash, save_trim_video_metadata,
+    get_cached_trim, get_trimmed_video_by_job, is_batch_trim_job, list_videos, get_batch_trim_clips,
+    get_batch_trim_clip, touch_trimmed_output
+)
+from app.services.probe_services import get_media_probe
+from app.services.delivery_services import ensure_output_hash, media_file_response, hls_file_response
+from app.services.preview_services import (
+    PREVIEW_MEDIA_TYPES, SPRITE_NAME, THUMBNAILS_VTT_NAME, PREVIEW_NAME, get_video_preview, request_video_preview,
+    preview_dir
+)
+from app.services.upload_services import (
+    create_upload_session, get_upload_session, save_upload_part, complete_upload_session, abort_upload_session
+)
+from app.schemas.schemas import (
+    VideoSchema, VideoPageSchema, TrimVideoRequest, UploadSessionCreate, UploadSessionSchema, UploadPartSchema,
+    BatchTrimRequest, BatchTrimManifestSchema, VideoPreviewSchema
+)
+from app.services.lifecycle_services import restorable, restore_in_progress, restoring_response
+from app.jobs.celery_tasks import trim_video_task, batch_trim_video_task, generate_previews_task, restore_trim_task
+from app.utils import mark_task_success, HLS_PLAYLIST
+from pathlib import Path
+import logging
+import os
+import uuid
 
 
 
 router = APIRouter(prefix="/video", tags=["videos"])
 
-@router.get("/get", response_model=list[VideoSchema])
-def get_all_videos(db: Session = Depends(get_db)):
+logger = logging.getLogger(__name__)
+
+
+def _schedule_previews(db: Session, video) -> str | None:
     """
-    Fetch all videos with error handling.
+    Queue the preview job of a video unless its content already has one,
+    returning the job ID.
+    """
+    preview, created = request_video_preview(db, video)
+    if created:
+        generate_previews_task.apply_async(kwargs={"video_id": video.id}, task_id=preview.job_id)
+    return preview.job_id
+
+
+def _upload_response(db: Session, video) -> dict:
+    preview_job_id = None
+    if settings.previews_on_upload and video.content_hash:
+        try:
+            preview_job_id = _schedule_previews(db, video)
+        except Exception as e:
+            # previews are optional, the upload itself succeeded
+            logger.warning("Error scheduling previews: %s", e)
+
+    return {
+        "message": "Upload successful",
+        "result": VideoSchema.model_validate(video),
+        "preview_job_id": preview_job_id,
+    }
+
+
+@router.get("/get", response_model=VideoPageSchema)
+async def get_all_videos(
+    limit: int = Query(settings.list_default_limit, ge=1, le=settings.list_max_limit),
+    cursor: str | None = None,
+    fields: str | None = Query(None, description="Comma separated columns to return"),
+    filename: str | None = None,
+    content_hash: str | None = None,
+    uploaded_after: datetime | None = None,
+    uploaded_before: datetime | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Fetch videos newest first, one page at a time.
+    Pass the returned next_cursor as `cursor` to get the next page.
     """
     try:
-        videos = db.query(Video).all()
-        return videos
+        items, next_cursor = await list_videos(
+            db,
+            limit,
+            cursor=cursor,
+            fields=[field.strip() for field in fields.split(",") if field.strip()] if fields else None,
+            filename=filename,
+            content_hash=content_hash,
+            uploaded_after=uploaded_after,
+            uploaded_before=uploaded_before,
+        )
+        return {"items": items, "next_cursor": next_cursor}
 
-    except Exception as e:
-        print(f"Unexpected error: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception:
+        logger.exception("Unexpected error listing videos")
         raise HTTPException(
             status_code=500,
             detail="Unexpected error occurred."
@@ -34,19 +113,106 @@ async def upload_file(
     try:
         # Save file to disk
         original_filename = file.filename
-        saved_filename, file_path = await save_file(file)
+        saved_filename, file_path, digest = await save_file(file)
         
-        response = save_video_metadata(original_filename, saved_filename, db, file_path=str(file_path))              
+        # probing blocks, keep it off the event loop
+        response = await run_in_threadpool(
+            save_video_metadata, original_filename, saved_filename, db, file_path=str(file_path), content_hash=digest
+        )
 
-        return {"message": "Upload successful", "result": response}
+        return await run_in_threadpool(_upload_response, db, response)
 
-    except Exception as e:
-        print(f"Error uploading file: {str(e)}")
+    except Exception:
+        logger.exception("Error uploading file")
+        raise HTTPException(status_code=500, detail="Failed to upload file")
+
+
+@router.post("/upload/sessions")
+def init_upload_session(request: UploadSessionCreate, db: Session = Depends(get_db)):
+    """
+    Start a resumable chunked upload. Parts are sent with
+    PUT /upload/sessions/{upload_id}/parts/{part_number}.
+    
+    If the client sends the sha256 of a file that is already stored,
+    the existing video is returned and nothing needs to be uploaded.
+    """
+    if request.sha256:
+        existing_video = get_video_by_hash(db, request.sha256.lower())
+        if existing_video:
+            return {"message": "Upload successful", "result": VideoSchema.model_validate(existing_video)}
+
+    return UploadSessionSchema(**create_upload_session(request.filename, sha256=request.sha256))
+
+
+@router.get("/upload/sessions/{upload_id}", response_model=UploadSessionSchema)
+def upload_session_status(upload_id: str):
+    """
+    List the parts received so far, so a client can resume a dropped upload.
+    """
+    try:
+        return get_upload_session(upload_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.put("/upload/sessions/{upload_id}/parts/{part_number}", response_model=UploadPartSchema)
+async def upload_session_part(
+    upload_id: str,
+    part_number: int,
+    request: Request,
+    x_content_sha256: str | None = Header(None),
+):
+    """
+    Stream the raw request body as one part of the upload.
+    """
+    try:
+        return await save_upload_part(upload_id, part_number, request.stream(), expected_sha256=x_content_sha256)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/upload/sessions/{upload_id}/complete")
+async def finalize_upload_session(upload_id: str, db: Session = Depends(get_db)):
+    """
+    Assemble the uploaded parts and register the video.
+    """
+    try:
+        original_filename, saved_filename, file_path, digest = await complete_upload_session(upload_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # probing blocks, keep it off the event loop
+        response = await run_in_threadpool(
+            save_video_metadata, original_filename, saved_filename, db, file_path=str(file_path), content_hash=digest
+        )
+
+        return await run_in_threadpool(_upload_response, db, response)
+
+    except Exception:
+        logger.exception("Error uploading file")
         raise HTTPException(status_code=500, detail="Failed to upload file")
 
 
+@router.delete("/upload/sessions/{upload_id}")
+def cancel_upload_session(upload_id: str):
+    try:
+        abort_upload_session(upload_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {"message": "Upload session aborted"}
+
+
 @router.post("/trim")
 def trim_video_request(request: TrimVideoRequest, db: Session = Depends(get_db)):
+    """
+    Schedule a trim job. Poll GET /process/status/{job_id} and download
+    the clip from GET /video/trim/result/{job_id}.
+    
+    Trims are memoized by (source content, start, end, mode), a repeated
+    request completes immediately with the existing clip.
+    """
     try:
         start_time = request.start_time
         end_time = request.end_time
@@ -64,27 +230,279 @@ def trim_video_request(request: TrimVideoRequest, db: Session = Depends(get_db))
                 detail=f"Video with ID {request.video_id} not found"
             )
         
-        if video_data.duration < duration:
+        # stored at upload time, no need to probe the file again
+        probe = get_media_probe(db, video_data.content_hash)
+        video_duration = probe.duration if probe else video_data.duration
+        
+        if video_duration < duration:
             raise ValueError("Trim duration must be smaller than video duration.")
+        if end_time > video_duration:
+            raise ValueError("End time must not exceed video duration.")
         
-        # trim video
-        saved_filename = trim_video(start_time, end_time, saved_filename=video_data.saved_filename)
-
-        trimmed_video_metadata = save_trim_video_metadata(original_file_id=video_data.id, saved_filename=saved_filename, db=db)
-
-        return FileResponse(
-            path=trimmed_video_metadata.saved_filename,
-            filename=saved_filename,
-            media_type="video/mp4"
+        cached = get_cached_trim(db, video_data.content_hash, start_time, end_time, request.mode)
+        if cached:
+            job_id = str(uuid.uuid4())
+            trimmed = save_trim_video_metadata(
+                original_file_id=video_data.id,
+                saved_filename=cached.saved_filename,
+                db=db,
+                job_id=job_id,
+                source_hash=video_data.content_hash,
+                start_time=start_time,
+                end_time=end_time,
+                mode=request.mode,
+                output_hash=cached.output_hash,
+            )
+            mark_task_success(job_id, {"job_id": job_id, "trimmed_video_id": trimmed.id, "cached": True})
+            return {"job_id": job_id, "cached": True}
+        
+        # pass the trim in job queue
+        job = trim_video_task.delay(
+            video_id=video_data.id, start_time=start_time, end_time=end_time, mode=request.mode,
+            output_format=request.output_format
         )
+        
+        return {"job_id": job.id, "cached": False}
     
     except Exception as e:
-        print(f"An error occurred while trimming the video: {str(e)}")
+        logger.exception("An error occurred while trimming the video")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred while trimming the video: {str(e)}"
         )
+
+
+def _restore_trim_response(db: Session, trimmed: TrimmedVideo):
+    """
+    Answer a request for an evicted clip: queue the restore of its job
+    (once while it runs) and tell the client to retry.
+    """
+    if not restorable(trimmed.evicted_at):
+        raise HTTPException(status_code=410, detail="Trimmed video was evicted")
     
+    if not restore_in_progress(trimmed.restore_job_id):
+        restore_job_id = str(uuid.uuid4())
+        db.execute(
+            update(TrimmedVideo)
+            .where(TrimmedVideo.job_id == trimmed.job_id)
+            .values(restore_job_id=restore_job_id)
+        )
+        db.commit()
+        restore_trim_task.apply_async(kwargs={"trim_job_id": trimmed.job_id}, task_id=restore_job_id)
+        return restoring_response(restore_job_id)
+    
+    return restoring_response(trimmed.restore_job_id)
+
+
+def _get_trim_output(db: Session, job_id: str) -> TrimmedVideo:
+    trimmed = get_trimmed_video_by_job(db, job_id)
+    
+    if not trimmed:
+        if is_batch_trim_job(db, job_id):
+            # several clips, no single result
+            raise HTTPException(
+                status_code=400,
+                detail=f"Job {job_id} is a batch trim, its clips are listed at /video/trim/batch/{job_id}",
+            )
+        raise HTTPException(status_code=404, detail="Trimmed video not found")
+    
+    return trimmed
+
+
+# download the trimmed video, supports Range and If-None-Match
+# an evicted clip is cut again: 202 with the restore job, retry once it finished
+@router.get("/trim/result/{job_id}")
+def get_trimmed_file(job_id: str, request: Request, db: Session = Depends(get_db)):
+    trimmed = _get_trim_output(db, job_id)
+    if trimmed.evicted_at is not None:
+        return _restore_trim_response(db, trimmed)
+    
+    touch_trimmed_output(db, trimmed.saved_filename)
+    
+    return media_file_response(
+            request,
+            Path(trimmed.saved_filename),
+            etag=ensure_output_hash(db, trimmed, Path(trimmed.saved_filename)),
+            filename=os.path.basename(trimmed.saved_filename),
+        )
+
+
+# stream the trimmed video, packaged as HLS by a job on first use: 202 with the job, retry once it finished
+@router.get("/trim/result/{job_id}/hls/{name}")
+def get_trimmed_hls_file(job_id: str, name: str, request: Request, db: Session = Depends(get_db)):
+    trimmed = _get_trim_output(db, job_id)
+    if trimmed.evicted_at is not None:
+        return _restore_trim_response(db, trimmed)
     
+    path = Path(trimmed.saved_filename)
+    if name == HLS_PLAYLIST:
+        touch_trimmed_output(db, trimmed.saved_filename)
+    try:
+        return hls_file_response(request, ensure_output_hash(db, trimmed, path), path, name)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post("/trim/batch")
+def batch_trim_video_request(request: BatchTrimRequest, db: Session = Depends(get_db)):
+    """
+    Schedule one job cutting many ranges of the same video with a single
+    ffmpeg run. Poll GET /process/status/{job_id}, then read the manifest
+    from GET /video/trim/batch/{job_id}.
+    """
+    if not request.ranges:
+        raise HTTPException(status_code=400, detail="At least one range is required.")
+    if len(request.ranges) > settings.batch_trim_max_ranges:
+        raise HTTPException(status_code=400, detail=f"Maximum {settings.batch_trim_max_ranges} ranges allowed.")
+
+    try:
+        video_data = get_video_by_id(db, request.video_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
-    
\ No newline at end of file
+    probe = get_media_probe(db, video_data.content_hash)
+    video_duration = probe.duration if probe else video_data.duration
+
+    errors = []
+    for idx, trim_range in enumerate(request.ranges, start=1):
+        if trim_range.start_time < 0 or trim_range.end_time <= trim_range.start_time:
+            errors.append(f"Range {idx}: end time must be greater than start time")
+        elif video_duration is not None and trim_range.end_time > video_duration:
+            errors.append(f"Range {idx}: end time must not exceed video duration")
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+    job = batch_trim_video_task.delay(
+        video_id=video_data.id,
+        ranges=[[trim_range.start_time, trim_range.end_time] for trim_range in request.ranges],
+        mode=request.mode,
+    )
+
+    return {"job_id": job.id}
+
+
+# manifest of a finished batch trim
+@router.get("/trim/batch/{job_id}", response_model=BatchTrimManifestSchema)
+def get_batch_trim_manifest(job_id: str, db: Session = Depends(get_db)):
+    clips = get_batch_trim_clips(db, job_id)
+    
+    if not clips:
+        raise HTTPException(status_code=404, detail="Batch trim not found")
+    
+    return {
+        "job_id": job_id,
+        "video_id": clips[0].original_file_id,
+        "mode": clips[0].mode,
+        "clips": [
+            {
+                "index": clip.batch_index,
+                "start_time": clip.start_time,
+                "end_time": clip.end_time,
+                "trimmed_video_id": clip.id,
+                "saved_filename": os.path.basename(clip.saved_filename),
+            }
+            for clip in clips
+        ],
+    }
+
+
+# download one clip of a batch trim, supports Range and If-None-Match
+@router.get("/trim/batch/{job_id}/{index}")
+def get_batch_trim_file(job_id: str, index: int, request: Request, db: Session = Depends(get_db)):
+    clip = get_batch_trim_clip(db, job_id, index)
+    
+    if not clip:
+        raise HTTPException(status_code=404, detail="Trimmed clip not found")
+    if clip.evicted_at is not None:
+        return _restore_trim_response(db, clip)
+    
+    touch_trimmed_output(db, clip.saved_filename)
+    
+    path = Path(clip.saved_filename)
+    return media_file_response(
+            request,
+            path,
+            etag=ensure_output_hash(db, clip, path),
+            filename=os.path.basename(clip.saved_filename),
+        )
+
+
+def _preview_schema(video, preview) -> VideoPreviewSchema:
+    data = {
+        "video_id": video.id,
+        "job_id": preview.job_id,
+        "status": preview.status,
+        "error": preview.error,
+        "frame_count": preview.frame_count,
+        "interval": preview.interval,
+        "tile_width": preview.tile_width,
+        "tile_height": preview.tile_height,
+        "columns": preview.columns,
+        "rows": preview.rows,
+    }
+    if preview.status == "SUCCESS":
+        base = f"{router.prefix}/{video.id}/thumbnails"
+        data.update(
+            sprite_url=f"{base}/{SPRITE_NAME}",
+            vtt_url=f"{base}/{THUMBNAILS_VTT_NAME}",
+            preview_url=f"{base}/{PREVIEW_NAME}",
+        )
+    return VideoPreviewSchema(**data)
+
+
+# state of the scrubber previews of a video and where to fetch them
+@router.get("/{video_id}/thumbnails", response_model=VideoPreviewSchema)
+def get_video_thumbnails(video_id: str, db: Session = Depends(get_db)):
+    try:
+        video = get_video_by_id(db, video_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    preview = get_video_preview(db, video.content_hash)
+    if not preview:
+        raise HTTPException(status_code=404, detail="No previews generated for this video")
+    
+    return _preview_schema(video, preview)
+
+
+@router.post("/{video_id}/thumbnails", response_model=VideoPreviewSchema)
+def generate_video_thumbnails(video_id: str, db: Session = Depends(get_db)):
+    """
+    Schedule the sprite sheet, thumbnail track and preview of a video,
+    for videos uploaded with `previews_on_upload` off or whose previews
+    failed. Previews already generated or pending are returned as is.
+    """
+    try:
+        video = get_video_by_id(db, video_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    try:
+        _schedule_previews(db, video)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return _preview_schema(video, get_video_preview(db, video.content_hash))
+
+
+# sprite.jpg, thumbnails.vtt or preview.mp4 of a video, supports Range and If-None-Match
+@router.get("/{video_id}/thumbnails/{name}")
+def get_video_thumbnails_file(video_id: str, name: str, request: Request, db: Session = Depends(get_db)):
+    if name not in PREVIEW_MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail=f"Unknown preview file '{name}'")
+    
+    try:
+        video = get_video_by_id(db, video_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    preview = get_video_preview(db, video.content_hash)
+    if not preview or preview.status != "SUCCESS":
+        raise HTTPException(status_code=404, detail="Previews not available")
+    
+    return media_file_response(
+            request,
+            preview_dir(video.content_hash) / name,
+            etag=f"{preview.preview_hash}-{name}",
+            media_type=PREVIEW_MEDIA_TYPES[name],
+        )
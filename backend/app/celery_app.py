@@ -7,9 +7,28 @@ celery_app = Celery(
     backend=settings.redis_url  # store task results
 )
 
-# route all tasks under "app.tasks" to default queue
+# Redis priorities, 0 is served first: inside a queue, interactive jobs go before bulk ones
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+# one queue per job class, so hour-long renders never hold up quick trims
 celery_app.conf.task_routes = {
-    "app.tasks.*": {"queue": "default"},
+    "app.jobs.trim_video_task": {"queue": "trim"},
+    "app.jobs.batch_trim_video_task": {"queue": "trim"},
+    "app.jobs.generate_previews_task": {"queue": "preview"},
+    "app.jobs.call_overlay_task": {"queue": "overlay"},
+    "app.jobs.batch_overlay_task": {"queue": "batch"},
+    "app.jobs.finish_overlay_batch_task": {"queue": "default"},
+    "app.jobs.restore_overlay_task": {"queue": "overlay"},
+    "app.jobs.restore_trim_task": {"queue": "trim"},
+    "app.jobs.package_hls_task": {"queue": "trim"},
+    "app.jobs.lifecycle_task": {"queue": "default"},
+}
+
+# lifecycle of derived files (TTLs, disk high-water mark, orphaned inputs), run by `celery beat`
+celery_app.conf.beat_schedule = {
+    "lifecycle": {"task": "app.jobs.lifecycle_task", "schedule": settings.lifecycle_interval},
 }
 
 celery_app.conf.update(
@@ -18,6 +37,19 @@ celery_app.conf.update(
     accept_content=['json'],
     timezone='UTC',
     enable_utc=True,
+    task_default_queue="default",
+    task_default_priority=PRIORITY_NORMAL,
+    # a process reserves one job at a time and acknowledges it once done,
+    # long jobs don't hold queued ones hostage and a lost worker's job is redelivered
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    broker_transport_options={
+        "priority_steps": list(range(PRIORITY_LOW + 1)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+        "visibility_timeout": settings.job_visibility_timeout,
+    },
 )
 
 from .jobs import celery_tasks
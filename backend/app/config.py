@@ -1,3 +1,4 @@
+from typing import Any, Dict
 from pydantic_settings import BaseSettings
 
 
@@ -5,6 +6,165 @@ class Settings(BaseSettings):
     database_url: str
     redis_url: str
 
+    # async routes use the same database through its async driver, unless set explicitly
+    async_database_url: str | None = None
+    # connection pool of each engine (sync and async) in every process
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    # job results and job events are buffered per process and inserted in bulk, every `db_flush_interval`
+    # seconds or once `db_flush_max_rows` rows are pending; a job result is committed before its job finishes
+    db_flush_interval: float = 1.0
+    db_flush_max_rows: int = 500
+
+    # Celery workers started by start_celery.py, one per queue: pool processes (0 = one per core) and ffmpeg
+    # threads of each job (0 = the cores shared evenly between the processes of all the queues)
+    worker_queues: Dict[str, Dict[str, int]] = {
+        "trim": {"concurrency": 0, "ffmpeg_threads": 1},
+        "preview": {"concurrency": 2, "ffmpeg_threads": 0},
+        "overlay": {"concurrency": 2, "ffmpeg_threads": 0},
+        "batch": {"concurrency": 2, "ffmpeg_threads": 0},
+        "default": {"concurrency": 1, "ffmpeg_threads": 1},
+    }
+    # threads the ffmpeg encoders and filters of one job may use, 0 = every core; start_celery.py sets it per worker
+    ffmpeg_threads: int = 0
+    # unacknowledged jobs are redelivered after this long, must exceed the longest render
+    job_visibility_timeout: int = 12 * 3600
+
+    # page size of listings
+    list_default_limit: int = 50
+    list_max_limit: int = 500
+
+    # most ranges cut from one video by a batch trim
+    batch_trim_max_ranges: int = 100
+    # most videos a template is applied to in one batch
+    overlay_batch_max_videos: int = 10000
+    # operations (trim, overlay, scale, encode) allowed in one pipeline job
+    pipeline_max_operations: int = 10
+
+    # size of each read/write when streaming uploads to disk
+    upload_chunk_size: int = 1024 * 1024
+
+    # total size of rendered overlay outputs kept for reuse, least recently used are evicted first
+    overlay_cache_max_bytes: int = 20 * 1024 ** 3
+    # outputs used this recently (seconds) are being downloaded or streamed, never evicted to fit the budget
+    overlay_cache_protect_seconds: float = 15 * 60
+    # total size of normalized overlay assets (lossless FFV1) kept in the store, least recently used are removed first
+    normalized_cache_max_bytes: int = 20 * 1024 ** 3
+
+    # lifecycle of derived files, run every `lifecycle_interval` seconds by Celery beat: per class, files unused
+    # for longer than their TTL (seconds) are removed; overlays and trims are evicted and rendered again on demand
+    lifecycle_interval: float = 15 * 60
+    lifecycle_ttls: Dict[str, float] = {
+        "overlays": 7 * 86400,
+        "trims": 7 * 86400,
+        "hls": 2 * 86400,
+        "text_cache": 30 * 86400,
+        "assets": 30 * 86400,
+        "sessions": 2 * 86400,
+        "tmp": 86400,
+    }
+    # when the uploads disk is fuller than the high-water mark, least recently used outputs are evicted
+    # (with a remote storage backend, local copies are dropped) until it is back under the low-water mark
+    disk_high_water: float = 0.85
+    disk_low_water: float = 0.75
+    # evicted outputs can be rendered again for this long, their overlay inputs are kept until then
+    restore_ttl: float = 30 * 86400
+    # Retry-After (seconds) of the 202 answered while an evicted output is being restored
+    restore_retry_after: int = 10
+    # uploads not used by anything for this long are leftovers (failed requests, expired jobs)
+    orphan_grace_seconds: float = 86400
+
+    # encoder settings of overlay renders, picked per request by name. max_height downscales the output,
+    # audio is stream-copied when the source codec fits in MP4 and re-encoded to AAC at audio_bitrate otherwise
+    encoder_profiles: Dict[str, Dict[str, Any]] = {
+        "fast-preview": {
+            "vcodec": "libx264", "preset": "ultrafast", "crf": 30, "pix_fmt": "yuv420p", "threads": 0,
+            "max_height": 480, "audio_bitrate": "96k",
+        },
+        "standard": {
+            "vcodec": "libx264", "preset": "veryfast", "crf": 23, "pix_fmt": "yuv420p", "threads": 0,
+            "audio_bitrate": "128k",
+        },
+        "archive": {
+            "vcodec": "libx264", "preset": "slow", "crf": 18, "pix_fmt": "yuv420p", "threads": 0,
+            "audio_bitrate": "192k",
+        },
+    }
+    default_encoder_profile: str = "standard"
+    # profile of the quick preview render a client can ask for next to the final one
+    preview_encoder_profile: str = "fast-preview"
+
+    # parallel overlay rendering: number of segments (0 = one per core) and shortest segment
+    render_segments: int = 0
+    render_min_segment_seconds: float = 10.0
+
+    # fonts used to rasterize text overlays, per language; relative paths are looked up in text_font_dir
+    text_font_dir: str = "/usr/share/fonts/truetype/noto"
+    text_fonts: Dict[str, str] = {
+        "en": "NotoSans-Regular.ttf",
+        "hi": "NotoSansDevanagari-Regular.ttf",
+        "mr": "NotoSansDevanagari-Regular.ttf",
+        "ta": "NotoSansTamil-Regular.ttf",
+        "bn": "NotoSansBengali-Regular.ttf",
+        "te": "NotoSansTelugu-Regular.ttf",
+    }
+    text_default_language: str = "en"
+
+    # scrubber previews generated after every upload: a thumbnail every `thumbnail_interval` seconds
+    # (at most `thumbnail_max_count`) tiled `sprite_columns` wide, and a small preview rendition
+    previews_on_upload: bool = True
+    thumbnail_interval: float = 5.0
+    thumbnail_max_count: int = 200
+    thumbnail_width: int = 160
+    sprite_columns: int = 10
+    preview_height: int = 360
+    preview_video_bitrate: str = "400k"
+    preview_audio_bitrate: str = "64k"
+
+    # seconds between progress updates of a running job, and between keepalives on idle event streams
+    progress_interval: float = 1.0
+    job_events_keepalive: float = 15.0
+    # job progress is stored as an event every this many percent
+    job_event_progress_step: float = 25.0
+
+    # statuses of finished jobs kept in each process (seconds, entries), they never change
+    status_cache_ttl: float = 60.0
+    status_cache_size: int = 10000
+    # most job ids looked up by one bulk status request
+    status_bulk_max_jobs: int = 500
+
+    # serve results through nginx (X-Accel-Redirect) from this internal location mapped to the uploads folder
+    accel_redirect_prefix: str | None = None
+
+    # where uploads and results are kept: "local" (the uploads folder, shared by the API and the workers) or "s3"
+    # (an S3-compatible bucket; the uploads folder is then a per-node cache and ffmpeg streams missing inputs)
+    storage_backend: str = "local"
+    s3_bucket: str | None = None
+    s3_prefix: str = ""
+    s3_endpoint_url: str | None = None
+    s3_region: str | None = None
+    s3_access_key_id: str | None = None
+    s3_secret_access_key: str | None = None
+    # part size of multipart uploads and downloads
+    s3_chunk_size: int = 16 * 1024 * 1024
+    # lifetime of the presigned URLs given to ffmpeg and clients
+    s3_presign_seconds: int = 6 * 3600
+    # how often a stored object in use is rewritten in place to refresh its last use (seconds)
+    s3_touch_interval: int = 3600
+    # send clients to a presigned URL instead of proxying downloads through the API
+    s3_redirect_downloads: bool = False
+    # target length of HLS segments in seconds
+    hls_segment_seconds: float = 6.0
+    # Retry-After (seconds) of the 202 answered while an output is being packaged for HLS
+    hls_retry_after: int = 5
+
+    # log level of the API and the app loggers in workers
+    log_level: str = "INFO"
+    # port of the Prometheus endpoint each Celery worker serves (0 disables it), the API serves /metrics
+    worker_metrics_port: int = 9540
+
     class Config:
         env_file = ".env"
 
@@ -1,3 +1,5 @@
-from .models import Video, Overlay
+from .models import Video, TrimmedVideo, Overlay, OverlayTemplate, OverlayBatch, VideoPreview, Blob, MediaProbe, JobEvent
 from .base import Base
-from .session import get_db, engine, SessionLocal
\ No newline at end of file
+from .session import get_db, get_async_db, engine, async_engine, SessionLocal, AsyncSessionLocal, dispose_engine_after_fork
+from .batch_writer import BatchWriter, get_batch_writer
+from .schema import create_schema
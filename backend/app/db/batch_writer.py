@@ -0,0 +1,131 @@
+from typing import Any, Dict, List, Tuple
+import atexit
+import logging
+import os
+import threading
+
+from sqlalchemy import insert
+
+from app.config import settings
+from .session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def _group_key(model, values: Dict[str, Any]) -> Tuple[Any, Tuple[str, ...]]:
+    # a multi-row INSERT needs the same columns in every row
+    return model, tuple(sorted(values))
+
+
+class _Batch:
+    def __init__(self):
+        self.groups: Dict[Tuple[Any, Tuple[str, ...]], List[Dict[str, Any]]] = {}
+        self.size = 0
+        self.done = threading.Event()
+        self.errors: Dict[Tuple[Any, Tuple[str, ...]], Exception] = {}
+
+
+class BatchWriter:
+    """
+    Buffer row inserts and write them in bulk from a background thread:
+    every `interval` seconds, once `max_rows` are pending, or right away
+    when a caller waits for its row. The pending rows of all the callers
+    are grouped by table (group commit), each group is one multi-row
+    INSERT in its own transaction: a failing group doesn't take the rows
+    of other tables down with it, and a waiter only gets the error of
+    its own group.
+
+    Each process has its own thread and buffer, a forked child starts
+    with an empty one (the parent still writes its pending rows).
+    """
+
+    def __init__(self, interval: float, max_rows: int):
+        self.interval = interval
+        self.max_rows = max_rows
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._batch = _Batch()
+        self._thread = None
+
+    def add(self, model, values: Dict[str, Any], wait: bool = False) -> None:
+        """
+        Queue the insert of a row.
+
+        Args:
+            model: Mapped class of the table.
+            values (dict): Column values, columns left out get their default.
+            wait (bool): Return only once the row is committed.
+
+        Raises:
+            Exception: With `wait`, the error of the transaction of the row's group.
+        """
+        key = _group_key(model, values)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+                self._thread.start()
+            batch = self._batch
+            batch.groups.setdefault(key, []).append(values)
+            batch.size += 1
+            if wait or batch.size >= self.max_rows:
+                self._wake.set()
+
+        if wait:
+            batch.done.wait()
+            if key in batch.errors:
+                raise batch.errors[key]
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the pending rows now.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._batch = self._batch, _Batch()
+            for key, rows in batch.groups.items():
+                try:
+                    self._write(key[0], rows)
+                except Exception as e:
+                    logger.exception("Error writing %d buffered %s row(s)", len(rows), key[0].__tablename__)
+                    batch.errors[key] = e
+            batch.done.set()
+
+    @staticmethod
+    def _write(model, rows: List[Dict[str, Any]]) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(insert(model), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+_batch_writer: BatchWriter | None = None
+_batch_writer_lock = threading.Lock()
+
+
+def get_batch_writer() -> BatchWriter:
+    """
+    The batch writer of this process, created on first use.
+    """
+    global _batch_writer
+    with _batch_writer_lock:
+        if _batch_writer is None:
+            _batch_writer = BatchWriter(settings.db_flush_interval, settings.db_flush_max_rows)
+            # rows still pending when the API exits
+            atexit.register(_batch_writer.flush)
+        return _batch_writer
@@ -1,29 +1,54 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, UniqueConstraint, Index, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from .base import Base
 from sqlalchemy.dialects.postgresql import JSONB
 
+# JSONB on PostgreSQL, plain JSON elsewhere (SQLite for benchmarks and local runs)
+JSONType = JSON().with_variant(JSONB, "postgresql")
+
 class Video(Base):
     __tablename__ = "videos" 
+    __table_args__ = (
+        # keyset pagination of the listing, newest first
+        Index("ix_videos_upload_time_id", "upload_time", "id"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     original_filename = Column(String, nullable=False)
     saved_filename = Column(String, nullable=False, unique=True)
-    size = Column(Integer)
+    content_hash = Column(String, index=True)
+    size = Column(BigInteger)
     duration = Column(Float)
-    upload_time = Column(DateTime, default=datetime.now(timezone.utc))
+    upload_time = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     
     # relation to TrimmedVideo
     trimmed_videos = relationship("TrimmedVideo", back_populates='original_video', cascade="all, delete-orphan")
     
 class TrimmedVideo(Base):
     __tablename__ = "trimmed_videos"
+    __table_args__ = (
+        # memoized trims are looked up by (source content, range, mode)
+        Index("ix_trimmed_videos_cache_key", "source_hash", "start_time", "end_time", "mode"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     original_file_id = Column(String, ForeignKey("videos.id"), nullable=False)
     saved_filename = Column(String, nullable=False)
-    upload_time = Column(DateTime, default=datetime.now(timezone.utc))
+    upload_time = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    job_id = Column(String, index=True)
+    source_hash = Column(String)
+    start_time = Column(Float)
+    end_time = Column(Float)
+    mode = Column(String)
+    # sha256 of the clip, served as its ETag
+    output_hash = Column(String)
+    # position of the clip in a batch trim job
+    batch_index = Column(Integer)
+    # lifecycle: evicted clips keep their row and can be cut again on demand
+    last_accessed = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    evicted_at = Column(DateTime)
+    restore_job_id = Column(String)
     
     # relationship back to Video
     original_video = relationship("Video", back_populates="trimmed_videos")
@@ -34,4 +59,146 @@ class Overlay(Base):
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(String, index=True, nullable=False)
     overlay_filename = Column(String, nullable=False)
-    overlay = Column(JSONB, nullable=False)
\ No newline at end of file
+    overlay = Column(JSONType, nullable=False)
+    # render cache: jobs with the same canonical spec share one output file
+    cache_key = Column(String, index=True)
+    size = Column(BigInteger)
+    # sha256 of the output, served as its ETag and naming its HLS package
+    output_hash = Column(String)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    last_accessed = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    evicted_at = Column(DateTime)
+    # set when the job is part of a template batch
+    batch_id = Column(String, index=True)
+    # encoder profile the output was rendered with
+    profile = Column(String)
+    # what an evicted output is rendered again from, on demand
+    video_id = Column(String)
+    render_mode = Column(String)
+    restore_job_id = Column(String)
+    
+class OverlayTemplate(Base):
+    """
+    Overlay list stored once and applied to many videos. Assets are
+    prepared at creation (scaled, opacity baked in, text rasterized) and
+    held as blobs, `overlays` points at them like a validated job does.
+    """
+    __tablename__ = "overlay_templates"
+
+    id = Column(String, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    overlays = Column(JSONType, nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class OverlayBatch(Base):
+    """
+    One template applied to a list of videos. `id` is also the Celery task
+    ID of the chord callback, so the batch has a single job status.
+    """
+    __tablename__ = "overlay_batches"
+
+    id = Column(String, primary_key=True, index=True)
+    template_id = Column(String, ForeignKey("overlay_templates.id"), nullable=False)
+    render_mode = Column(String)
+    output_format = Column(String)
+    profile = Column(String)
+    # video_id -> job_id of every video in the batch
+    jobs = Column(JSONType, nullable=False)
+    total = Column(Integer, nullable=False)
+    completed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default="PENDING")
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime)
+    
+class VideoPreview(Base):
+    """
+    Scrubber previews of a stored file (sprite sheet, WebVTT thumbnail
+    track and low-bitrate rendition), generated once per content hash.
+    Files live in uploads/previews/<content_hash>.
+    """
+    __tablename__ = "video_previews"
+
+    content_hash = Column(String, primary_key=True, index=True)
+    job_id = Column(String, index=True)
+    status = Column(String, nullable=False, default="PENDING")
+    error = Column(String)
+    # thumbnails: count, seconds between them, tile size and sprite layout
+    frame_count = Column(Integer)
+    interval = Column(Float)
+    tile_width = Column(Integer)
+    tile_height = Column(Integer)
+    columns = Column(Integer)
+    rows = Column(Integer)
+    # sha256 of the preview rendition, served as its ETag
+    preview_hash = Column(String)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime)
+    
+class Blob(Base):
+    """
+    Content-addressed file stored once per (digest, subfolder).
+    ref_count tracks the templates using it. A blob at 0 is kept while
+    overlay jobs may still render from it, then collected by the lifecycle task.
+    """
+    __tablename__ = "blobs"
+    __table_args__ = (UniqueConstraint("digest", "subfolder", name="uq_blobs_digest_subfolder"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    digest = Column(String, nullable=False, index=True)
+    subfolder = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+    size = Column(BigInteger)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # last upload of the content, a blob only used by jobs is collected some time after it
+    last_used = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    
+class MediaProbe(Base):
+    """
+    ffprobe result of a stored file, computed once per content hash.
+    The most used fields are columns, the full per-stream data is in `streams`.
+    """
+    __tablename__ = "media_probes"
+
+    content_hash = Column(String, primary_key=True, index=True)
+    format_name = Column(String)
+    # presentation time of the first frame, keyframes and durations are relative to it
+    start_time = Column(Float)
+    duration = Column(Float)
+    size = Column(BigInteger)
+    bit_rate = Column(BigInteger)
+
+    # first video stream
+    video_codec = Column(String)
+    width = Column(Integer)
+    height = Column(Integer)
+    fps = Column(Float)
+    pix_fmt = Column(String)
+
+    # first audio stream
+    audio_codec = Column(String)
+    audio_channels = Column(Integer)
+    channel_layout = Column(String)
+    sample_rate = Column(Integer)
+
+    streams = Column(JSONType, nullable=False)
+    # presentation times (seconds) of the video keyframes, in order
+    keyframes = Column(JSONType)
+    probed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class JobEvent(Base):
+    """
+    Lifecycle event of a job: queued, started, progress checkpoints and
+    finished. Written in bulk by the batch writer, `status` is the Celery
+    state at that point.
+    """
+    __tablename__ = "job_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, index=True, nullable=False)
+    job_type = Column(String)
+    event = Column(String, nullable=False)
+    status = Column(String)
+    percent = Column(Float)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
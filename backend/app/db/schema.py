@@ -0,0 +1,97 @@
+from functools import partial
+from typing import List
+import logging
+
+from sqlalchemy import BigInteger, Integer, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from .base import Base
+
+logger = logging.getLogger(__name__)
+
+
+def create_schema(engine: Engine) -> List[str]:
+    """
+    Create the missing tables, then bring the tables of an existing
+    database up to the models: `create_all` never alters a table, so
+    the columns and indexes added to the models since it was created
+    are added here. New columns are nullable, existing rows get NULL.
+    Integer columns widened to BigInteger are altered on PostgreSQL
+    (SQLite integers are 64-bit already).
+
+    Safe to run from several processes at once: a change another
+    process made in the meantime is skipped.
+
+    Returns:
+        list: The changes applied, as SQL statements.
+    """
+    Base.metadata.create_all(bind=engine)
+
+    applied = []
+    preparer = engine.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        existing = _columns(engine, table.name)
+        for column in table.columns:
+            current = existing.get(column.name)
+            if current is None:
+                statement = (
+                    f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} "
+                    f"{column.type.compile(dialect=engine.dialect)}"
+                )
+                done = partial(_has_column, engine, table.name, column.name)
+            elif (
+                engine.dialect.name == "postgresql"
+                and isinstance(column.type, BigInteger)
+                and type(current["type"]) is Integer
+            ):
+                statement = (
+                    f"ALTER TABLE {preparer.format_table(table)} ALTER COLUMN {preparer.format_column(column)} "
+                    "TYPE BIGINT"
+                )
+                done = partial(_is_widened, engine, table.name, column.name)
+            else:
+                continue
+            if _apply(engine, statement, done):
+                applied.append(statement)
+
+        index_names = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in index_names:
+                if _apply(engine, index, partial(_has_index, engine, table.name, index.name)):
+                    applied.append(f"CREATE INDEX {index.name}")
+
+    for change in applied:
+        logger.info("Schema upgrade: %s", change)
+    return applied
+
+
+def _columns(engine: Engine, table_name: str) -> dict:
+    return {column["name"]: column for column in inspect(engine).get_columns(table_name)}
+
+
+def _has_column(engine: Engine, table_name: str, column_name: str) -> bool:
+    return column_name in _columns(engine, table_name)
+
+
+def _is_widened(engine: Engine, table_name: str, column_name: str) -> bool:
+    return type(_columns(engine, table_name)[column_name]["type"]) is not Integer
+
+
+def _has_index(engine: Engine, table_name: str, index_name: str) -> bool:
+    return index_name in {index["name"] for index in inspect(engine).get_indexes(table_name)}
+
+
+def _apply(engine: Engine, change, done_elsewhere) -> bool:
+    # one transaction per change, another process may be upgrading too
+    try:
+        with engine.begin() as conn:
+            if isinstance(change, str):
+                conn.exec_driver_sql(change)
+            else:
+                change.create(conn)
+        return True
+    except SQLAlchemyError:
+        if done_elsewhere():
+            return False
+        raise
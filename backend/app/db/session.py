@@ -1,16 +1,87 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 from app.config import settings
+from app.utils.metrics import observe_stage
+import time
 
-# Create SQLAlchemy engine
+# async driver used for each database dialect
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def _pool_args(url: str) -> dict:
+    # the default SQLite pools don't take sizing arguments
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": True,
+    }
+
+
+def _async_database_url() -> str:
+    if settings.async_database_url:
+        return settings.async_database_url
+    url = make_url(settings.database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver known for database '{url.get_backend_name()}'.")
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+# Create SQLAlchemy engine, used by the Celery workers and sync routes
 engine = create_engine(
     settings.database_url,
     echo=False,
+    **_pool_args(settings.database_url),
 )
 
 # Create a configured "SessionLocal" class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# async engine for the async routes, so they never block the event loop on the database
+async_engine = create_async_engine(
+    _async_database_url(),
+    echo=False,
+    **_pool_args(settings.database_url),
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+# time every commit (sync and async sessions) as the db_commit stage
+@event.listens_for(Session, "before_commit")
+def _start_commit_timer(session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _observe_commit(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        observe_stage("db_commit", time.perf_counter() - started)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_commit_timer(session):
+    session.info.pop("commit_started", None)
+
+
+def dispose_engine_after_fork() -> None:
+    """
+    Give a forked process (prefork Celery worker) its own connection pool.
+    The connections inherited from the parent are left to it, not closed,
+    and the child opens and then reuses its own for every job it runs.
+    """
+    engine.dispose(close=False)
+
 
 # Dependency to get a DB session in routes
 def get_db():
@@ -19,3 +90,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency to get an async DB session in async routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,21 +1,166 @@
-from ..celery_app import celery_app
-from ..services.video_services import trim_video 
-from ..services.overlay_services import apply_overlays_to_video, save_overlay
+from celery.signals import (
+    task_success, task_failure, before_task_publish, task_prerun, task_postrun, worker_init, worker_process_init,
+    worker_process_shutdown
+)
+from prometheus_client import start_http_server
+from ..celery_app import celery_app, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from ..config import settings
+from ..db import dispose_engine_after_fork, get_batch_writer
+from ..utils.job_events import publish_job_event
+from ..utils.metrics import start_job, finish_job, observe_queue_wait, metrics_registry
+from ..utils.text_util import text_shaping_available
+from pathlib import Path
+import logging
+import time
+from ..services.video_services import process_trim_job, process_batch_trim_job, restore_trim_output
+from ..services.overlay_services import process_overlay_job, restore_overlay_output
+from ..services.template_services import record_batch_job, finish_overlay_batch
+from ..services.preview_services import generate_video_previews
+from ..services.lifecycle_services import run_lifecycle
+from ..services.delivery_services import ensure_hls_package
+from ..services.job_event_services import record_job_event
 
-@celery_app.task(bind=True, name="app.jobs.trim_video_task")
-def trim_video_task(start_time, end_time, saved_filename):
-    return trim_video(start_time, end_time, saved_filename)
+@celery_app.task(bind=True, name="app.jobs.trim_video_task", priority=PRIORITY_HIGH)
+def trim_video_task(self, video_id, start_time, end_time, mode="copy", output_format="mp4"):
+    job_id = self.request.id
+    
+    return process_trim_job(job_id, video_id, start_time, end_time, mode, output_format=output_format)
 
-@celery_app.task(bind=True, name="app.jobs.call_overlay_task")
-def call_overlay_task(self, input_file, overlays):
+@celery_app.task(bind=True, name="app.jobs.batch_trim_video_task", priority=PRIORITY_LOW)
+def batch_trim_video_task(self, video_id, ranges, mode="copy"):
     job_id = self.request.id
     
-    # Process video
-    overlay_filename = apply_overlays_to_video(input_file, overlays)    
-    # Save result to DB
-    save_overlay(job_id,overlay_filename, overlays )
+    return process_batch_trim_job(job_id, video_id, ranges, mode)
+
+@celery_app.task(bind=True, name="app.jobs.generate_previews_task", priority=PRIORITY_NORMAL)
+def generate_previews_task(self, video_id):
+    job_id = self.request.id
+    
+    return generate_video_previews(job_id, video_id)
+
+@celery_app.task(bind=True, name="app.jobs.call_overlay_task", priority=PRIORITY_NORMAL)
+def call_overlay_task(self, input_file, overlays, content_hash=None, cache_key=None, render_mode="single",
+                      output_format="mp4", profile=None, video_id=None):
+    job_id = self.request.id
+    
+    # Process video (or reuse an identical render) and save result to DB
+    process_overlay_job(
+        job_id, input_file, overlays, content_hash=content_hash, cache_key=cache_key, render_mode=render_mode,
+        output_format=output_format, profile=profile, video_id=video_id
+    )
     
     return {"job_id": job_id}
+
+@celery_app.task(bind=True, name="app.jobs.batch_overlay_task", priority=PRIORITY_LOW)
+def batch_overlay_task(self, batch_id, video_id, input_file, overlays, content_hash=None, cache_key=None,
+                       render_mode="single", output_format="mp4", profile=None):
+    job_id = self.request.id
+    
+    try:
+        process_overlay_job(
+            job_id, input_file, overlays, content_hash=content_hash, cache_key=cache_key, render_mode=render_mode,
+            output_format=output_format, batch_id=batch_id, profile=profile, video_id=video_id
+        )
+    except Exception as e:
+        # report instead of raising, one failed video must not fail the chord of the whole batch
+        record_batch_job(batch_id, succeeded=False)
+        return {"job_id": job_id, "video_id": video_id, "error": str(e)}
     
+    record_batch_job(batch_id, succeeded=True)
+    return {"job_id": job_id, "video_id": video_id}
+
+@celery_app.task(bind=True, name="app.jobs.finish_overlay_batch_task", priority=PRIORITY_HIGH)
+def finish_overlay_batch_task(self, results, batch_id):
+    return finish_overlay_batch(batch_id, results)
+
+# evicted outputs are requested by a waiting client
+@celery_app.task(bind=True, name="app.jobs.restore_overlay_task", priority=PRIORITY_HIGH)
+def restore_overlay_task(self, overlay_job_id):
+    job_id = self.request.id
     
+    return {"job_id": overlay_job_id, "overlay_filename": restore_overlay_output(job_id, overlay_job_id)}
+
+@celery_app.task(bind=True, name="app.jobs.restore_trim_task", priority=PRIORITY_HIGH)
+def restore_trim_task(self, trim_job_id):
+    job_id = self.request.id
     
+    return {"job_id": trim_job_id, "restored": len(restore_trim_output(job_id, trim_job_id))}
+
+# outputs streamed before they were packaged for HLS
+@celery_app.task(name="app.jobs.package_hls_task", priority=PRIORITY_HIGH)
+def package_hls_task(output_hash, file_path):
+    ensure_hls_package(output_hash, Path(file_path))
+    return {"output_hash": output_hash}
+
+# run periodically by Celery beat
+@celery_app.task(name="app.jobs.lifecycle_task", priority=PRIORITY_LOW)
+def lifecycle_task():
+    return run_lifecycle()
+
+
+# tell the clients streaming a job's events that it finished
+@task_success.connect
+def publish_task_success(sender=None, result=None, **kwargs):
+    publish_job_event(sender.request.id, "SUCCESS", result=result)
+
+@task_failure.connect
+def publish_task_failure(task_id=None, exception=None, **kwargs):
+    publish_job_event(task_id, "FAILURE", result=str(exception))
+
+
+logger = logging.getLogger(__name__)
+
+
+def _job_type(task_name: str) -> str:
+    # "app.jobs.trim_video_task" -> "trim_video"
+    return task_name.rsplit(".", 1)[-1].removesuffix("_task")
+
+
+# stamp jobs when queued, so the worker can tell how long they waited
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+        if headers.get("id") and headers.get("task"):
+            record_job_event(headers["id"], "queued", status="PENDING", job_type=_job_type(headers["task"]))
+
+@task_prerun.connect
+def start_job_metrics(task_id=None, task=None, **kwargs):
+    job_type = _job_type(task.name)
+    published_at = getattr(task.request, "published_at", None)
+    if published_at:
+        observe_queue_wait(job_type, time.time() - published_at)
+    task.request.metrics_token = start_job(job_type, task_id)
+    record_job_event(task_id, "started", status="STARTED", job_type=job_type)
+
+@task_postrun.connect
+def finish_job_metrics(task_id=None, task=None, state=None, **kwargs):
+    token = getattr(task.request, "metrics_token", None)
+    if token is not None:
+        finish_job(token, (state or "UNKNOWN").lower())
+    record_job_event(task_id, "finished", status=state, job_type=_job_type(task.name))
+
+# every pool process opens its own database connections, the parent's must not be shared across the fork
+@worker_process_init.connect
+def reset_db_engine(**kwargs):
+    dispose_engine_after_fork()
+
+# write the job events still buffered before the pool process exits
+@worker_process_shutdown.connect
+def flush_batch_writer(**kwargs):
+    get_batch_writer().flush()
+
+# every worker serves its own metrics, merged across the pool with PROMETHEUS_MULTIPROC_DIR
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    if settings.worker_metrics_port:
+        start_http_server(settings.worker_metrics_port, registry=metrics_registry())
+        logger.info("Serving worker metrics on port %s", settings.worker_metrics_port)
+
+# complex scripts render differently without raqm, tell it once per worker
+@worker_init.connect
+def check_text_shaping(**kwargs):
+    if not text_shaping_available():
+        logger.warning(
+            "Pillow has no raqm support: text overlays in complex scripts are drawn with ffmpeg drawtext instead"
+        )
@@ -1,15 +1,29 @@
 import app.ffmpeg_config
-from fastapi import FastAPI
+import logging
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import make_asgi_app
 
 from app.api.video_process_route import router as video_router
 from app.api.overlay_route import router as process_router
 
-from app.db import Base, engine
+from app.config import settings
+from app.db import create_schema, engine
+from app.utils import text_shaping_available
+from app.utils.metrics import HTTP_REQUEST_SECONDS, metrics_registry
 
-# Create bd table if not exist
+logging.basicConfig(level=settings.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+if not text_shaping_available():
+    logging.getLogger(__name__).warning(
+        "Pillow has no raqm support: text overlays in complex scripts (hi, mr, ta, bn, te) are drawn with ffmpeg "
+        "drawtext instead, install libraqm to rasterize them with Pillow"
+    )
+
+# Create bd table if not exist, and add the columns and indexes newer than an existing database
 # Base.metadata.drop_all(bind=engine)
-Base.metadata.create_all(bind=engine)
+create_schema(engine)
 
 app = FastAPI(
     title="Video processing",
@@ -26,10 +40,26 @@ app.add_middleware(
 )
 
 
+# time every request by route template, so ids in paths don't explode the label set
+@app.middleware("http")
+async def observe_request_time(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    if route is not None:
+        HTTP_REQUEST_SECONDS.labels(request.method, route.path, response.status_code).observe(
+            time.perf_counter() - start
+        )
+    return response
+
+
 # include routes
 app.include_router(video_router)
 app.include_router(process_router)
 
+# Prometheus scrape endpoint
+app.mount("/metrics", make_asgi_app(registry=metrics_registry()))
+
 
 @app.get("/", summary="Root endpoint")
 def read_root():
@@ -1,27 +1,115 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Any, Literal
 
 class VideoSchema(BaseModel):
     id: str
     original_filename: str 
     saved_filename: str
+    content_hash: str | None = None
     size: int | None = None
     duration: float | None = None
     upload_time: datetime | None = None
 
     class Config:
-        orm_mode = True
+        from_attributes = True
+
+class VideoPageSchema(BaseModel):
+    # videos, reduced to the requested fields
+    items: list[dict[str, Any]]
+    # pass as `cursor` to get the next page, None on the last page
+    next_cursor: str | None = None
+
+class VideoPreviewSchema(BaseModel):
+    video_id: str
+    job_id: str | None = None
+    # PENDING until the job finishes, then SUCCESS or FAILURE
+    status: str
+    error: str | None = None
+    frame_count: int | None = None
+    interval: float | None = None
+    tile_width: int | None = None
+    tile_height: int | None = None
+    columns: int | None = None
+    rows: int | None = None
+    # set once generated, relative to the API root
+    sprite_url: str | None = None
+    vtt_url: str | None = None
+    preview_url: str | None = None
 
 class TrimVideoRequest(BaseModel):
     video_id: str
     start_time: float
     end_time: float
+    # copy: fast, snaps to keyframes. accurate: full re-encode. smart: re-encode only the edges
+    mode: Literal["copy", "accurate", "smart"] = "copy"
+    # hls: also package the clip for streaming at /video/trim/result/{job_id}/hls/index.m3u8
+    output_format: Literal["mp4", "hls"] = "mp4"
     
+class TrimRange(BaseModel):
+    start_time: float
+    end_time: float
+
+class BatchTrimRequest(BaseModel):
+    video_id: str
+    ranges: list[TrimRange]
+    # copy: keyframe-snapped starts, no decoding. accurate: one decode, every clip re-encoded
+    mode: Literal["copy", "accurate"] = "copy"
+
+class BatchTrimClipSchema(BaseModel):
+    index: int
+    start_time: float
+    end_time: float
+    trimmed_video_id: str
+    saved_filename: str
+
+class BatchTrimManifestSchema(BaseModel):
+    job_id: str
+    video_id: str
+    mode: str
+    clips: list[BatchTrimClipSchema]
+
+class JobProgressSchema(BaseModel):
+    percent: float | None = None
+    out_time: float | None = None
+    fps: float | None = None
+    speed: float | None = None
+    # batches report finished videos instead of ffmpeg progress
+    completed: int | None = None
+    failed: int | None = None
+    total: int | None = None
+
 class TaskStatusResponse(BaseModel):
     task_id: str
     status: str
     result: str | None
+    progress: JobProgressSchema | None = None
     
+class BulkStatusRequest(BaseModel):
+    job_ids: list[str]
+
+class OverlayOutputSchema(BaseModel):
+    overlay_filename: str
+    size: int | None = None
+    output_hash: str | None = None
+    profile: str | None = None
+    render_mode: str | None = None
+    video_id: str | None = None
+    batch_id: str | None = None
+    created_at: datetime | None = None
+    # set once the output was evicted, /result then restores it first
+    evicted_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+class JobStatusSchema(TaskStatusResponse):
+    # the rendered output of a finished overlay job
+    output: OverlayOutputSchema | None = None
+
+class BulkStatusResponse(BaseModel):
+    jobs: list[JobStatusSchema]
+
 class TrimmedVideoSchema(BaseModel):
     id: int
     original_file_id: str 
@@ -29,4 +117,58 @@ class TrimmedVideoSchema(BaseModel):
     upload_time: datetime | None = None
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        from_attributes = True
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    sha256: str | None = None
+
+
+class UploadPartSchema(BaseModel):
+    part_number: int
+    size: int
+    sha256: str
+
+
+class UploadSessionSchema(BaseModel):
+    upload_id: str
+    filename: str
+    sha256: str | None = None
+    created_at: datetime
+    parts: list[UploadPartSchema] = []
+
+
+class OverlayTemplateSchema(BaseModel):
+    id: str
+    name: str
+    overlays: list[dict[str, Any]]
+    created_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class OverlayBatchRequest(BaseModel):
+    template_id: str
+    video_ids: list[str]
+    render_mode: Literal["single", "parallel", "windowed"] = "single"
+    output_format: Literal["mp4", "hls"] = "mp4"
+    # encoder profile name, the default one if not set
+    profile: str | None = None
+
+
+class OverlayBatchSchema(BaseModel):
+    id: str
+    template_id: str
+    profile: str | None = None
+    status: str
+    total: int
+    completed: int
+    failed: int
+    # video_id -> job_id, results download from /process/result/{job_id}
+    jobs: dict[str, str]
+    created_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
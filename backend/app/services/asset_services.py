@@ -0,0 +1,124 @@
+from pathlib import Path
+from typing import Any, Dict, List
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+import ffmpeg
+
+from app.storage import get_storage
+from app.utils import get_upload_path, run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+NORMALIZED_SUBFOLDER = "overlay_assets"
+
+# image assets a single frame can be baked from, animated formats are normalized like videos
+STILL_IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
+
+# what the overlay filter composites onto yuv420p renders, normalized videos are stored in it
+NORMALIZED_PIX_FMT = "yuva420p"
+
+# bump when the normalization changes, older cache entries are then ignored
+# (2: straight alpha, the overlay filter blends premultiplied input in its own pixel format only)
+NORMALIZE_VERSION = 2
+
+
+def normalized_asset_key(file_hash: str, params: Dict[str, Any]) -> str:
+    """
+    Cache key of a normalized asset: the content hash of the upload and
+    the parameters it was normalized with.
+    """
+    payload = json.dumps(
+        {"file_hash": file_hash, "version": NORMALIZE_VERSION, **params}, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _normalize_params(overlay: Dict[str, Any], fps: float | None) -> Dict[str, Any]:
+    still = overlay["type"] == "image" and Path(overlay["file_key"]).suffix.lower() in STILL_IMAGE_EXTS
+    params = {"still": still, "scale": overlay.get("scale") or None, "opacity": overlay.get("opacity")}
+    if params["opacity"] is not None and params["opacity"] >= 1:
+        params["opacity"] = None
+    if not still:
+        # a still is a single frame, its rate doesn't matter
+        params["fps"] = round(fps, 3) if fps else None
+    return params
+
+
+def _render_normalized(input_url: str, params: Dict[str, Any], output_path: Path) -> None:
+    stream = ffmpeg.input(input_url)
+    scale = params["scale"]
+    if scale:
+        stream = stream.filter("scale", scale["width"], scale["height"])
+
+    if params["still"]:
+        stream = stream.filter("format", "rgba")
+        if params["opacity"] is not None:
+            stream = stream.filter("colorchannelmixer", aa=params["opacity"])
+        run_ffmpeg(stream.output(str(output_path), vframes=1, format="image2", vcodec="png"))
+        return
+
+    if params.get("fps"):
+        stream = stream.filter("fps", params["fps"])
+    stream = stream.filter("format", NORMALIZED_PIX_FMT)
+    if params["opacity"] is not None:
+        stream = stream.filter("lutyuv", a=f"val*{params['opacity']}")
+    # lossless and intra-only: decoded cheaply and seeked exactly by segment renders, at the cost of
+    # files several times larger than the upload, the cache is bounded by normalized_cache_max_bytes
+    run_ffmpeg(stream.output(str(output_path), format="matroska", vcodec="ffv1", level=3, an=None))
+
+
+def normalize_overlay_asset(overlay: Dict[str, Any], fps: float | None = None) -> Dict[str, Any]:
+    """
+    Return the overlay pointing at its normalized asset: scaled to the
+    requested `scale`, opacity baked in (alpha kept straight) and, for
+    videos, converted to the render frame rate and pixel format. The
+    render graph then composites it without filtering it on every frame.
+
+    Normalized assets are cached in uploads/overlay_assets by content hash
+    and parameters and published to the storage backend, so an asset is
+    normalized once and reused by every job (and node) using it.
+
+    Args:
+        overlay (dict): Image or video overlay, its upload stored (`file_key`, `file_hash`).
+        fps (float | None): Frame rate of the video the overlay is rendered onto.
+
+    Returns:
+        dict: A copy of the overlay, unchanged if it has no stored upload.
+    """
+    if overlay.get("type") not in ("image", "video") or not overlay.get("file_hash") or overlay.get("normalized"):
+        return overlay
+
+    params = _normalize_params(overlay, fps)
+    key = normalized_asset_key(overlay["file_hash"], params)
+    output_path = get_upload_path(NORMALIZED_SUBFOLDER) / f"{key}{'.png' if params['still'] else '.mkv'}"
+
+    storage = get_storage()
+    if output_path.exists() or storage.exists(output_path):
+        # used again, the lifecycle task expires the cache by last use in the store
+        storage.touch(output_path)
+    else:
+        # several jobs may normalize the same asset at once, publish it atomically
+        tmp_path = output_path.with_name(f"{key}_{uuid.uuid4().hex}.tmp{output_path.suffix}")
+        try:
+            _render_normalized(storage.input_url(Path(overlay["file_key"])), params, tmp_path)
+            os.replace(tmp_path, output_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        storage.publish(output_path)
+        logger.debug("Normalized overlay asset %s to %s", overlay["file_key"], output_path)
+
+    normalized = {name: value for name, value in overlay.items() if name not in ("scale", "opacity")}
+    normalized["file_key"] = str(output_path)
+    normalized["normalized"] = True
+    return normalized
+
+
+def normalize_overlay_assets(overlays: List[Dict[str, Any]], fps: float | None = None) -> List[Dict[str, Any]]:
+    """
+    normalize_overlay_asset for every overlay of a job.
+    """
+    return [normalize_overlay_asset(overlay, fps) for overlay in overlays]
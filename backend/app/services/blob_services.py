@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import update, delete
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from app.db.models import Blob
+from app.utils import get_upload_path
+from app.storage import get_storage
+
+
+def get_blob(db: Session, digest: str, subfolder: str = "videos") -> Blob | None:
+    """
+    Return the stored blob for a digest, if any.
+    """
+    return db.query(Blob).filter(Blob.digest == digest, Blob.subfolder == subfolder).first()
+
+
+def get_blob_path(blob: Blob) -> Path:
+    return get_upload_path(blob.subfolder) / blob.filename
+
+
+def register_blob(db: Session, digest: str, saved_filename: str, subfolder: str = "videos") -> Blob:
+    """
+    Get or create the Blob record for a content-addressed file.
+
+    When the digest is already known under a different file name
+    (e.g. same bytes uploaded with another extension), the new file is
+    removed and the existing blob is returned.
+
+    Args:
+        db (Session): SQLAlchemy session object.
+        digest (str): sha256 digest of the file.
+        saved_filename (str): Content-addressed name the file was stored under.
+        subfolder (str): Uploads subfolder holding the file.
+
+    Returns:
+        Blob: The blob record, the file is guaranteed to be stored.
+    """
+    file_path = get_upload_path(subfolder) / saved_filename
+
+    blob = get_blob(db, digest, subfolder)
+    if blob is None:
+        blob = Blob(
+            digest=digest,
+            subfolder=subfolder,
+            filename=saved_filename,
+            size=file_path.stat().st_size,
+            ref_count=0,
+        )
+        db.add(blob)
+        try:
+            db.commit()
+        except IntegrityError:
+            # registered concurrently by another upload of the same content
+            db.rollback()
+            blob = get_blob(db, digest, subfolder)
+        else:
+            db.refresh(blob)
+    else:
+        # uploaded again, the lifecycle task keeps it a while longer
+        db.execute(update(Blob).where(Blob.id == blob.id).values(last_used=datetime.now(timezone.utc)))
+        db.commit()
+
+    if blob.filename != saved_filename:
+        get_storage().delete(file_path)
+
+    return blob
+
+
+def acquire_blob(db: Session, blob: Blob) -> None:
+    """
+    Record a new reference to the blob.
+    """
+    db.execute(update(Blob).where(Blob.id == blob.id).values(ref_count=Blob.ref_count + 1))
+    db.commit()
+
+
+def release_blob(db: Session, blob: Blob) -> bool:
+    """
+    Drop a reference to the blob and delete it once nothing uses it.
+
+    Returns:
+        bool: True if the blob was deleted.
+    """
+    db.execute(
+        update(Blob).where(Blob.id == blob.id, Blob.ref_count > 0).values(ref_count=Blob.ref_count - 1)
+    )
+    # only delete if no reference was acquired in the meantime
+    deleted = db.execute(delete(Blob).where(Blob.id == blob.id, Blob.ref_count == 0)).rowcount
+    db.commit()
+
+    if not deleted:
+        return False
+
+    get_storage().delete(get_blob_path(blob))
+    return True
@@ -0,0 +1,265 @@
+from pathlib import Path
+from typing import Tuple
+from fastapi import Request
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.storage import get_storage
+from app.utils import (
+    get_upload_path, file_sha256, package_hls, claim_job, release_job, get_task_status, HLS_PLAYLIST, TERMINAL_STATES
+)
+import os
+import re
+import shutil
+import uuid
+
+
+HLS_SUBFOLDER = "hls"
+HLS_MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+}
+_HLS_FILE_RE = re.compile(r"^[A-Za-z0-9_]+\.(m3u8|m4s|mp4)$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# results never change once rendered, clients revalidate with their ETag and get a 304
+RESULT_CACHE_CONTROL = "no-cache"
+SEGMENT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def ensure_output_hash(db: Session, record, file_path: Path) -> str:
+    """
+    Return the output hash of a finished job record (Overlay or TrimmedVideo),
+    hashing the file once for records created before hashes were stored.
+    """
+    if not record.output_hash:
+        record.output_hash = file_sha256(get_storage().fetch(file_path))
+        db.commit()
+    return record.output_hash
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    True if the client's If-None-Match already names `etag`.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def parse_range(range_header: str | None, size: int) -> Tuple[int, int] | None:
+    """
+    Parse a single-range `Range` header into inclusive byte offsets.
+
+    Returns:
+        tuple | None: (start, end), None when the header is absent, has
+            several ranges or is malformed (the whole file is sent).
+
+    Raises:
+        ValueError: If the range can't be satisfied.
+    """
+    match = _RANGE_RE.match(range_header.strip()) if range_header else None
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range not satisfiable for {size} bytes.")
+    return start, end
+
+
+def _storage_file_response(
+    request: Request, file_path: Path, headers: dict, filename: str | None, media_type: str
+) -> Response:
+    """
+    Serve a file kept only by the storage backend: redirect to a presigned
+    URL when allowed, otherwise proxy it with ranged reads.
+    """
+    storage = get_storage()
+    if settings.s3_redirect_downloads:
+        url = storage.download_url(file_path, filename)
+        if url:
+            return RedirectResponse(url, status_code=307, headers={"cache-control": "no-store"})
+
+    size = storage.size(file_path)
+    if size is None:
+        return Response(status_code=404)
+
+    headers["accept-ranges"] = "bytes"
+    if filename:
+        headers["content-disposition"] = f'attachment; filename="{filename}"'
+
+    # a stale If-Range gets the whole file
+    if_range = request.headers.get("if-range")
+    byte_range = None
+    if not if_range or if_range == headers.get("etag"):
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+
+    if byte_range is None:
+        headers["content-length"] = str(size)
+        return StreamingResponse(storage.iter_range(file_path), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(end - start + 1)
+    return StreamingResponse(
+        storage.iter_range(file_path, start, end), status_code=206, media_type=media_type, headers=headers
+    )
+
+
+def media_file_response(
+    request: Request,
+    file_path: Path,
+    etag: str | None,
+    filename: str | None = None,
+    media_type: str = "video/mp4",
+    cache_control: str = RESULT_CACHE_CONTROL,
+) -> Response:
+    """
+    Serve a stored file with conditional and range support.
+
+    A matching If-None-Match gets a 304 without touching the file. When
+    `accel_redirect_prefix` is set, nginx is told to send the file itself
+    (sendfile, Range handled there), otherwise FileResponse streams it
+    and answers Range / If-Range requests with 206. A file that is not
+    on this node is served from the storage backend.
+
+    Args:
+        request (Request): Incoming request, for its conditional headers.
+        file_path (Path): File to send.
+        etag (str | None): Content hash of the file, used as a strong ETag.
+        filename (str | None): Download name, sent as an attachment if given.
+        media_type (str): Content type of the file.
+        cache_control (str): Cache-Control header value.
+    """
+    headers = {"cache-control": cache_control}
+    if etag:
+        headers["etag"] = f'"{etag}"'
+        if is_not_modified(request, headers["etag"]):
+            return Response(status_code=304, headers=headers)
+
+    if not Path(file_path).exists():
+        return _storage_file_response(request, Path(file_path), headers, filename, media_type)
+
+    if settings.accel_redirect_prefix:
+        relative = Path(file_path).resolve().relative_to(get_upload_path("").resolve())
+        headers["x-accel-redirect"] = f"{settings.accel_redirect_prefix.rstrip('/')}/{relative.as_posix()}"
+        if filename:
+            headers["content-disposition"] = f'attachment; filename="{filename}"'
+        return Response(headers=headers, media_type=media_type)
+
+    return FileResponse(path=file_path, filename=filename, media_type=media_type, headers=headers)
+
+
+def hls_package_dir(output_hash: str) -> Path:
+    """
+    Folder of the HLS package of an output, keyed by output hash so jobs
+    sharing an output share the package too.
+    """
+    return get_upload_path(HLS_SUBFOLDER) / output_hash
+
+
+def ensure_hls_package(output_hash: str, file_path: Path) -> None:
+    """
+    Package an output for HLS unless it already is, and publish the
+    package to the storage backend. The output is fetched from the
+    storage backend when it is not on this node. Run by the jobs, never
+    in a request.
+
+    Raises:
+        ffmpeg.Error: If the output can't be remuxed to HLS.
+    """
+    storage = get_storage()
+    hls_dir = hls_package_dir(output_hash)
+    if storage.exists(hls_dir / HLS_PLAYLIST):
+        return
+
+    # package aside and rename, so a playlist is never seen half written
+    tmp_dir = hls_dir.with_name(f"{output_hash}_{uuid.uuid4().hex}.tmp")
+    try:
+        package_hls(storage.fetch(file_path), tmp_dir, settings.hls_segment_seconds)
+        os.replace(tmp_dir, hls_dir)
+    except OSError:
+        # packaged concurrently by another job
+        if not (hls_dir / HLS_PLAYLIST).exists():
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # the playlist goes last, once it is stored every segment is
+    for path in sorted(hls_dir.iterdir(), key=lambda path: path.name == HLS_PLAYLIST):
+        storage.publish(path)
+
+
+def queue_hls_package(output_hash: str, file_path: Path) -> str:
+    """
+    Queue the packaging of an output for HLS, once for all the requests
+    asking for it while it runs.
+
+    Returns:
+        str: ID of the packaging job.
+    """
+    from app.celery_app import celery_app, PRIORITY_HIGH
+
+    name = f"hls_package:{output_hash}"
+    job_id = str(uuid.uuid4())
+    holder = claim_job(name, job_id, settings.job_visibility_timeout)
+    if holder != job_id and get_task_status(holder)["status"] in TERMINAL_STATES:
+        # the last packaging failed or its package expired since, package again
+        release_job(name, holder)
+        holder = claim_job(name, job_id, settings.job_visibility_timeout)
+    if holder == job_id:
+        celery_app.send_task(
+            "app.jobs.package_hls_task",
+            kwargs={"output_hash": output_hash, "file_path": str(file_path)},
+            task_id=job_id,
+            priority=PRIORITY_HIGH,
+        )
+    return holder
+
+
+def hls_file_response(request: Request, output_hash: str, file_path: Path, name: str) -> Response:
+    """
+    Serve the playlist or a segment of an output's HLS package. An output
+    not packaged yet gets its packaging queued and a 202 with the job and
+    Retry-After, like an evicted output being restored.
+
+    Raises:
+        ValueError: If `name` is not a file of an HLS package.
+    """
+    if not _HLS_FILE_RE.match(name):
+        raise ValueError(f"Invalid HLS file name '{name}'.")
+
+    hls_path = hls_package_dir(output_hash) / name
+    if name == HLS_PLAYLIST:
+        storage = get_storage()
+        if not storage.exists(hls_path):
+            return JSONResponse(
+                status_code=202,
+                content={"detail": "HLS package is being prepared", "job_id": queue_hls_package(output_hash, file_path)},
+                headers={"Retry-After": str(settings.hls_retry_after)},
+            )
+        # packages expire by the last use of their playlist
+        storage.touch(hls_path)
+
+    suffix = hls_path.suffix
+    return media_file_response(
+        request,
+        hls_path,
+        etag=f"{output_hash}-{name}",
+        media_type=HLS_MEDIA_TYPES[suffix],
+        cache_control=RESULT_CACHE_CONTROL if suffix == ".m3u8" else SEGMENT_CACHE_CONTROL,
+    )
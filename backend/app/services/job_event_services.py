@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+import logging
+
+from app.db import JobEvent, get_batch_writer
+from app.utils import current_job
+
+logger = logging.getLogger(__name__)
+
+# events of a job, in order
+JOB_EVENTS = ("queued", "started", "progress", "finished")
+
+
+def record_job_event(job_id: str, event: str, status: str | None = None, percent: float | None = None,
+                     job_type: str | None = None) -> None:
+    """
+    Store a lifecycle event of a job through the batch writer, without
+    waiting for it to be written. Recording is best effort, a job never
+    fails because its event was not stored.
+
+    Args:
+        job_id (str): Celery task ID.
+        event (str): One of JOB_EVENTS.
+        status (str | None): Celery state of the job.
+        percent (float | None): Progress of the job, for progress events.
+        job_type (str | None): Job type, the running job's one by default.
+    """
+    if job_type is None:
+        job_type = (current_job() or {}).get("job_type")
+    try:
+        get_batch_writer().add(JobEvent, {
+            "job_id": job_id,
+            "job_type": job_type,
+            "event": event,
+            "status": status,
+            "percent": percent,
+            "created_at": datetime.now(timezone.utc),
+        })
+    except Exception as e:
+        logger.warning("Error recording job event: %s", e)
@@ -0,0 +1,408 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple
+import logging
+import shutil
+import time
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal, Overlay, TrimmedVideo, Blob
+from app.services.asset_services import NORMALIZED_SUBFOLDER
+from app.services.blob_services import get_blob_path
+from app.services.delivery_services import HLS_SUBFOLDER
+from app.services.pipeline_services import pipeline_overlays
+from app.services.preview_services import PREVIEW_SUBFOLDER
+from app.services.template_services import ASSET_SUBFOLDER
+from app.services.upload_services import SESSION_SUBFOLDER
+from app.services.video_services import TRIM_SUBFOLDER
+from app.storage import get_storage
+from app.utils import get_upload_path, get_task_status, TERMINAL_STATES, TEXT_CACHE_SUBFOLDER
+
+logger = logging.getLogger(__name__)
+
+# cache folders, their entries are rebuilt on demand once expired
+CACHE_SUBFOLDERS = {
+    "hls": HLS_SUBFOLDER,
+    "text_cache": TEXT_CACHE_SUBFOLDER,
+    "assets": NORMALIZED_SUBFOLDER,
+    "sessions": SESSION_SUBFOLDER,
+    "tmp": "tmp",
+}
+# folders of published files, a remote backend still holds them once the local copy is dropped
+STORED_SUBFOLDERS = (
+    "videos", ASSET_SUBFOLDER, NORMALIZED_SUBFOLDER, "overlays", TRIM_SUBFOLDER, PREVIEW_SUBFOLDER, HLS_SUBFOLDER
+)
+# bounded by size as well as by TTL, files least recently used in the store are removed first
+CACHE_BUDGETS = {
+    "assets": "normalized_cache_max_bytes",
+}
+# partial files of failed uploads, downloads and normalizations
+LEFTOVER_MARKERS = (".upload", ".download", ".tmp")
+
+
+class Output(NamedTuple):
+    """
+    A rendered overlay or trimmed clip, shared by every job that produced it.
+    """
+    kind: str
+    name: str
+    path: Path
+    last_accessed: datetime
+
+
+def _as_utc(value: datetime | None) -> datetime:
+    # naive values are stored as UTC
+    if value is None:
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _local_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _last_read(path: Path) -> float:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return 0.0
+    return max(stat.st_atime, stat.st_mtime)
+
+
+def list_outputs(db: Session) -> List[Output]:
+    """
+    Stored (not evicted) outputs, least recently used first.
+    """
+    overlays_folder = get_upload_path('overlays')
+    overlays = (
+        db.query(Overlay.overlay_filename, func.max(Overlay.last_accessed))
+        .filter(Overlay.evicted_at.is_(None))
+        .group_by(Overlay.overlay_filename)
+        .all()
+    )
+    trims = (
+        db.query(
+            TrimmedVideo.saved_filename,
+            func.max(func.coalesce(TrimmedVideo.last_accessed, TrimmedVideo.upload_time)),
+        )
+        .filter(TrimmedVideo.evicted_at.is_(None))
+        .group_by(TrimmedVideo.saved_filename)
+        .all()
+    )
+    outputs = [
+        Output("overlays", name, overlays_folder / name, _as_utc(last_accessed)) for name, last_accessed in overlays
+    ] + [
+        Output("trims", name, Path(name), _as_utc(last_accessed)) for name, last_accessed in trims
+    ]
+    return sorted(outputs, key=lambda output: output.last_accessed)
+
+
+def evict_outputs(db: Session, outputs: List[Output]) -> None:
+    """
+    Delete the files of the outputs, their jobs keep the rows with
+    `evicted_at` set and are restored on demand.
+    """
+    if not outputs:
+        return
+
+    for output in outputs:
+        get_storage().delete(output.path)
+
+    now = datetime.now(timezone.utc)
+    overlays = [output.name for output in outputs if output.kind == "overlays"]
+    trims = [output.name for output in outputs if output.kind == "trims"]
+    if overlays:
+        db.execute(update(Overlay).where(Overlay.overlay_filename.in_(overlays)).values(evicted_at=now))
+    if trims:
+        db.execute(update(TrimmedVideo).where(TrimmedVideo.saved_filename.in_(trims)).values(evicted_at=now))
+    db.commit()
+
+
+def evict_expired_outputs(db: Session, now: datetime | None = None) -> Dict[str, int]:
+    """
+    Evict the outputs unused for longer than the TTL of their class.
+
+    Returns:
+        dict: Number of evicted outputs per class.
+    """
+    now = now or datetime.now(timezone.utc)
+    expired = [
+        output for output in list_outputs(db)
+        if now - output.last_accessed > timedelta(seconds=settings.lifecycle_ttls.get(output.kind, float("inf")))
+    ]
+    evict_outputs(db, expired)
+    return {kind: sum(output.kind == kind for output in expired) for kind in ("overlays", "trims")}
+
+
+def _iter_entries(folder: Path) -> Iterator[Path]:
+    if folder.is_dir():
+        yield from folder.iterdir()
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def _local_mtime(entry: Path) -> float:
+    # a package folder is as recent as its newest file
+    files = [entry] if entry.is_file() else [path for path in entry.rglob("*") if path.is_file()]
+    return max((path.stat().st_mtime for path in files), default=entry.stat().st_mtime)
+
+
+def _expire_stored_cache(subfolder: str, ttl: float, max_bytes: int | None, now: float) -> int:
+    # the store is shared by every node: its last use decides, a stale local copy is only dropped
+    storage = get_storage()
+    folder = get_upload_path(subfolder)
+
+    # entries of the folder (a file, or a folder such as an HLS package) with their stored files
+    entries: Dict[Path, List] = {}
+    for path, size, last_used in storage.list_files(folder):
+        entry = folder / path.relative_to(folder).parts[0]
+        if any(marker in entry.name for marker in LEFTOVER_MARKERS):
+            continue
+        files, entry_size, entry_used = entries.get(entry, ([], 0, 0.0))
+        entries[entry] = [files + [path], entry_size + size, max(entry_used, last_used)]
+
+    total = sum(size for _, size, _ in entries.values())
+    removed = 0
+    for entry, (files, size, last_used) in sorted(entries.items(), key=lambda item: item[1][2]):
+        if now - last_used <= ttl and (max_bytes is None or total <= max_bytes):
+            break
+        for path in files:
+            storage.delete(path)
+        if entry.is_dir():
+            _remove(entry)
+        total -= size
+        removed += 1
+
+    for entry in _iter_entries(folder):
+        try:
+            stale = now - _local_mtime(entry) > ttl
+        except FileNotFoundError:
+            continue
+        if not stale:
+            continue
+        if entry not in entries:
+            # never published (interrupted packaging or normalization)
+            _remove(entry)
+        elif entry.is_file():
+            storage.drop_local(entry)
+        else:
+            for path in entry.rglob("*"):
+                if path.is_file():
+                    storage.drop_local(path)
+            if not any(entry.iterdir()):
+                entry.rmdir()
+    return removed
+
+
+def expire_cache_files(now: float | None = None) -> Dict[str, int]:
+    """
+    Remove the entries of the cache folders (HLS packages, text rasters,
+    normalized overlay assets, upload sessions, temporary files) older
+    than their TTL, by modification time. Published caches (HLS packages,
+    normalized assets) go by their last use in the store instead, and are
+    also trimmed to their size budget, least recently used first.
+
+    Returns:
+        dict: Number of removed entries per class.
+    """
+    now = now or time.time()
+    removed = {}
+    for kind, subfolder in CACHE_SUBFOLDERS.items():
+        ttl = settings.lifecycle_ttls.get(kind)
+        removed[kind] = 0
+        if ttl is None:
+            continue
+        if subfolder in STORED_SUBFOLDERS:
+            budget = CACHE_BUDGETS.get(kind)
+            removed[kind] = _expire_stored_cache(subfolder, ttl, getattr(settings, budget) if budget else None, now)
+            continue
+        for entry in _iter_entries(get_upload_path(subfolder)):
+            try:
+                expired = now - entry.stat().st_mtime > ttl
+            except FileNotFoundError:
+                continue
+            if expired:
+                _remove(entry)
+                removed[kind] += 1
+    return removed
+
+
+def collect_overlay_inputs(db: Session, now: datetime | None = None) -> int:
+    """
+    Mark-and-sweep the uploaded overlay files. A blob is kept while a
+    template references it, while it was uploaded within the grace period
+    (its job may still be queued), or while an overlay job using it can
+    be restored. Files of the folder without a blob are removed after the
+    grace period too.
+
+    Returns:
+        int: Number of removed files.
+    """
+    now = now or datetime.now(timezone.utc)
+    grace = timedelta(seconds=settings.orphan_grace_seconds)
+    restorable_since = now - timedelta(seconds=settings.restore_ttl)
+
+    # mark: inputs of the jobs whose output is stored or can still be restored
+    marked = set()
+    for overlays, evicted_at in db.query(Overlay.overlay, Overlay.evicted_at).yield_per(500):
+        if evicted_at is not None and _as_utc(evicted_at) < restorable_since:
+            continue
+        overlays = [overlay for overlay in overlays or [] if isinstance(overlay, dict)]
+        # pipeline jobs store their operations, the overlays are nested in them
+        marked.update(overlay.get("file_hash") for overlay in [*overlays, *pipeline_overlays(overlays)])
+
+    # sweep
+    removed = 0
+    known = set()
+    for blob in db.query(Blob).filter(Blob.subfolder == ASSET_SUBFOLDER).all():
+        known.add(blob.filename)
+        if blob.ref_count > 0 or blob.digest in marked or now - _as_utc(blob.last_used) < grace:
+            continue
+        path = get_blob_path(blob)
+        # only delete if no reference was acquired nor the content uploaded again in the meantime
+        deleted = (
+            db.query(Blob)
+            .filter(Blob.id == blob.id, Blob.ref_count == 0, Blob.last_used == blob.last_used)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        if deleted:
+            get_storage().delete(path)
+            removed += 1
+
+    for entry in _iter_entries(get_upload_path(ASSET_SUBFOLDER)):
+        try:
+            orphaned = entry.name not in known and now.timestamp() - entry.stat().st_mtime > grace.total_seconds()
+        except FileNotFoundError:
+            continue
+        if orphaned:
+            _remove(entry)
+            removed += 1
+    return removed
+
+
+def remove_leftovers(now: float | None = None) -> int:
+    """
+    Remove the partial files of failed uploads and downloads older than the grace period.
+    """
+    now = now or time.time()
+    removed = 0
+    for subfolder in STORED_SUBFOLDERS:
+        for entry in _iter_entries(get_upload_path(subfolder)):
+            if not entry.is_file() or not any(marker in entry.name for marker in LEFTOVER_MARKERS):
+                continue
+            try:
+                leftover = now - entry.stat().st_mtime > settings.orphan_grace_seconds
+            except FileNotFoundError:
+                continue
+            if leftover:
+                entry.unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+
+def _stored_files() -> List[Path]:
+    files = []
+    for subfolder in STORED_SUBFOLDERS:
+        for root in _iter_entries(get_upload_path(subfolder)):
+            files.extend(path for path in ([root] if root.is_file() else root.rglob("*")) if path.is_file())
+    return files
+
+
+def relieve_disk_pressure(db: Session) -> Dict[str, int]:
+    """
+    When the uploads disk is fuller than `disk_high_water`, free space
+    down to `disk_low_water`: first drop the local copies the storage
+    backend still holds (least recently read first), then evict the least
+    recently used outputs.
+
+    Returns:
+        dict: Dropped local copies, evicted outputs and freed bytes.
+    """
+    summary = {"dropped": 0, "evicted": 0, "freed": 0}
+    usage = shutil.disk_usage(get_upload_path(""))
+    if usage.used < usage.total * settings.disk_high_water:
+        return summary
+
+    to_free = usage.used - usage.total * settings.disk_low_water
+    logger.warning("Uploads disk is %.0f%% full, freeing %d bytes", 100 * usage.used / usage.total, to_free)
+
+    storage = get_storage()
+    for path in sorted(_stored_files(), key=_last_read):
+        if summary["freed"] >= to_free:
+            return summary
+        size = _local_size(path)
+        if storage.drop_local(path):
+            summary["dropped"] += 1
+            summary["freed"] += size
+
+    evicted = []
+    for output in list_outputs(db):
+        if summary["freed"] >= to_free:
+            break
+        summary["freed"] += _local_size(output.path)
+        evicted.append(output)
+    evict_outputs(db, evicted)
+    summary["evicted"] = len(evicted)
+    return summary
+
+
+def run_lifecycle() -> Dict[str, Any]:
+    """
+    One pass of the lifecycle manager, run periodically by Celery beat.
+
+    Returns:
+        dict: What each step removed.
+    """
+    db: Session = SessionLocal()
+    try:
+        summary = {
+            "expired": evict_expired_outputs(db),
+            "cache_files": expire_cache_files(),
+            "overlay_inputs": collect_overlay_inputs(db),
+            "leftovers": remove_leftovers(),
+            "disk": relieve_disk_pressure(db),
+        }
+        logger.info("Lifecycle pass: %s", summary)
+        return summary
+    finally:
+        db.close()
+
+
+def restorable(evicted_at: datetime | None) -> bool:
+    """
+    Whether an evicted output can still be rendered again, its inputs are kept for `restore_ttl`.
+    """
+    return evicted_at is None or datetime.now(timezone.utc) - _as_utc(evicted_at) < timedelta(
+        seconds=settings.restore_ttl
+    )
+
+
+def restore_in_progress(restore_job_id: str | None) -> bool:
+    """
+    Whether a restore job was queued and has not finished yet.
+    """
+    return bool(restore_job_id) and get_task_status(restore_job_id)["status"] not in TERMINAL_STATES
+
+
+def restoring_response(restore_job_id: str) -> JSONResponse:
+    """
+    202 telling the client the evicted output is being restored, to retry once the job finished.
+    """
+    return JSONResponse(
+        status_code=202,
+        content={"detail": "Result was evicted and is being restored", "job_id": restore_job_id},
+        headers={"Retry-After": str(settings.restore_retry_after)},
+    )
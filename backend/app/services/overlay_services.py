@@ -1,9 +1,29 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterable, Tuple
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import contextvars
 import ffmpeg
-from app.utils import create_file_name, get_upload_path
+import hashlib
+import json
+import logging
+import tempfile
+from app.config import settings
+from app.utils import (
+    create_file_name, get_upload_path, split_at_keyframes, keyframe_windows, copy_keyframe_range, concat_segments,
+    source_encoder_args, SEGMENT_EXT, SOURCE_ENCODERS, parse_color, rasterize_text, run_ffmpeg, JobProgress,
+    file_sha256, span, set_job_resolution, get_encoder_profile, profile_video_args, profile_audio_args, scale_to_height,
+    ffmpeg_thread_budget
+)
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
-from app.db import SessionLocal, Overlay
+from app.db import SessionLocal, Overlay, MediaProbe, Video, get_batch_writer
+from app.services.probe_services import get_media_probe
+from app.services.delivery_services import ensure_hls_package
+from app.services.asset_services import normalize_overlay_assets
+from app.storage import get_storage
 
+logger = logging.getLogger(__name__)
 
 VALID_OVERLAY_TYPES = {"text", "image", "video"}
 VALID_LANGUAGES = {"en", "hi", "ta", "bn", "te", "mr"}  # Example Indian languages
@@ -62,6 +82,17 @@ def validate_overlays(
             language = overlay.get("language")
             if language and language not in VALID_LANGUAGES:
                 errors.append(f"Overlay {idx}: Invalid language '{language}'")
+            fontsize = overlay.get("fontsize")
+            if fontsize is not None and (
+                isinstance(fontsize, bool) or not isinstance(fontsize, (int, float)) or fontsize <= 0
+            ):
+                errors.append(f"Overlay {idx}: fontsize must be a positive number")
+            fontcolor = overlay.get("fontcolor")
+            if fontcolor is not None:
+                try:
+                    parse_color(fontcolor)
+                except ValueError:
+                    errors.append(f"Overlay {idx}: Invalid fontcolor '{fontcolor}'")
 
         # Validate image/video overlay
         if otype in {"image", "video"}:
@@ -92,52 +123,64 @@ def validate_overlays(
     return is_valid, errors
 
 
-def apply_overlays_to_video(input_file: str, overlays: List[Dict[str, Any]]) -> str:
-    """"
-    start the overlay process
+VALID_RENDER_MODES = {"single", "parallel", "windowed"}
+VALID_OUTPUT_FORMATS = {"mp4", "hls"}
+# render mode of pipeline jobs (trim, overlay, scale, encode in one pass), stored and served like overlay jobs
+PIPELINE_RENDER_MODE = "pipeline"
+
+
+def build_overlay_graph(base, overlays: List[Dict[str, Any]], offset: float = 0.0, duration: float | None = None):
     """
-    input_folder = get_upload_path()
-    input_file_path = input_folder / input_file
-    
-    base = ffmpeg.input(input_file_path)
-    
-    inputs = []  # extra inputs for images/videos
+    Apply the overlay filters on the video of `base`.
 
-    # Prepare inputs for image/video overlays
-    for overlay in overlays:
-        if overlay['type'] in ['image', 'video']:
-            inputs.append(ffmpeg.input(overlay['file_key']))
-        else:
-            inputs.append(None)
+    `offset` and `duration` describe the part of the source timeline
+    `base` covers, when rendering a segment: overlay windows are
+    shifted onto the segment's local timeline, overlays outside it are
+    skipped and video overlays are seeked and cut to the same range.
 
+    Returns:
+        The filtered video stream.
+    """
     overlay_stream = base
-    # input_index = 0
     
-    for idx, overlay in enumerate(overlays):
+    for overlay in overlays:
         otype = overlay['type']
-        start = overlay.get('start', 0)
-        end = overlay.get('end', 999999)
-        enable_expr = f'between(t,{start},{end})'
+        start = overlay.get('start', 0) - offset
+        end = overlay.get('end', 999999) - offset
+        if end <= 0 or (duration is not None and start >= duration):
+            continue
+        enable_expr = f'between(t,{max(start, 0)},{end})'
 
         pos = overlay.get('position', {'x': 0, 'y': 0})
         x = pos.get('x', 0)
         y = pos.get('y', 0)
 
-        if otype == 'text':            
-            overlay_stream = overlay_stream.drawtext(
-                text=overlay['content'],
-                x=x,
-                y=y,
+        if otype == 'text':
+            # rasterized once and cached, composited like an image overlay
+            text_image = rasterize_text(
+                overlay['content'],
+                language=overlay.get('language'),
                 fontsize=overlay.get('fontsize', 24),
                 fontcolor=overlay.get('fontcolor', 'white'),
-                enable=enable_expr,
-                fontfile='C:/Windows/Fonts/arial.ttf',
-                escape_text=True
+            )
+            overlay_stream = ffmpeg.overlay(
+                overlay_stream,
+                ffmpeg.input(str(text_image)),
+                x=x,
+                y=y,
+                enable=enable_expr
             )
 
         elif otype in ['image', 'video']:
-            media = inputs[idx]
-            # input_index += 1
+            input_args = {}
+            if otype == 'video':
+                # keep the overlay video in sync with the source timeline,
+                # and never let it run past the end of the segment
+                if offset > 0:
+                    input_args['ss'] = offset
+                if duration is not None:
+                    input_args['t'] = duration
+            media = ffmpeg.input(get_storage().input_url(Path(overlay['file_key'])), **input_args)
 
             scale = overlay.get('scale')
             if scale:
@@ -151,40 +194,535 @@ def apply_overlays_to_video(input_file: str, overlays: List[Dict[str, Any]]) ->
                 enable=enable_expr
             )
 
+    return overlay_stream
+
+
+def apply_overlays_to_video(input_file: str, overlays: List[Dict[str, Any]], probe: MediaProbe | None = None,
+                            progress: JobProgress | None = None, profile: str | None = None) -> str:
+    """"
+    start the overlay process
+    
+    `probe` is the stored probe of the input, when known the audio
+    track is carried over to the output. `progress` receives the
+    ffmpeg progress reports. `profile` names the encoder profile,
+    the default one if None.
+    """
+    encoder = get_encoder_profile(profile)
+    input_folder = get_upload_path()
+    input_file_path = get_storage().input_url(input_folder / input_file)
+    
+    base = ffmpeg.input(input_file_path)
+    
+    overlay_stream = scale_to_height(build_overlay_graph(base, overlays), encoder.get("max_height"))
+
     output_folder = get_upload_path('overlays')
     output_file= create_file_name()
     output_path = output_folder / output_file
     
-    print(output_path)
+    logger.debug("Rendering overlays to %s", output_path)
     
-    ffmpeg.output(overlay_stream, str(output_path)).run(overwrite_output=True)
+    streams = [overlay_stream]
+    output_args = profile_video_args(encoder)
+    if probe and probe.audio_codec:
+        streams.append(base.audio)
+        output_args.update(profile_audio_args(encoder, probe.audio_codec))
+    
+    run_ffmpeg(ffmpeg.output(*streams, str(output_path), **output_args), progress)
+    return output_file
+
+
+def _render_segment(input_path: str | Path, overlays: List[Dict[str, Any]], start: float, end: float,
+                    output_path: Path, encode_args: Dict[str, Any], progress: JobProgress | None = None,
+                    max_height: int | None = None) -> None:
+    """
+    Render the overlays on [start, end) of the source into a video-only
+    segment, downscaled to `max_height` if given.
+    """
+    base = ffmpeg.input(str(input_path), ss=start, t=end - start)
+    overlay_stream = build_overlay_graph(base, overlays, offset=start, duration=end - start)
+    overlay_stream = scale_to_height(overlay_stream, max_height)
+    run_ffmpeg(
+        ffmpeg.output(overlay_stream, str(output_path), an=None, **encode_args),
+        progress, output_path.stem
+    )
+
+
+def apply_overlays_parallel(input_file: str, overlays: List[Dict[str, Any]], probe: MediaProbe,
+                            segments: int | None = None, progress: JobProgress | None = None,
+                            profile: str | None = None) -> str:
+    """
+    Render overlays by splitting the source at keyframes and encoding
+    each segment in its own ffmpeg process, then stream-concatenating
+    the segments and copying the source audio back in.
+
+    Falls back to apply_overlays_to_video when the source is too short
+    to split or has no keyframe index.
+    """
+    encoder = get_encoder_profile(profile)
+    segments = segments or settings.render_segments or ffmpeg_thread_budget()
+    if probe is None or not probe.keyframes or not probe.duration:
+        return apply_overlays_to_video(input_file, overlays, probe=probe, progress=progress, profile=profile)
+
+    # don't split into segments shorter than the configured minimum
+    segments = min(segments, int(probe.duration // settings.render_min_segment_seconds))
+    ranges = split_at_keyframes(probe.keyframes, probe.duration, segments)
+    if len(ranges) < 2:
+        return apply_overlays_to_video(input_file, overlays, probe=probe, progress=progress, profile=profile)
+
+    input_path = get_storage().input_url(get_upload_path() / input_file)
+    output_file = create_file_name()
+    output_path = get_upload_path('overlays') / output_file
+
+    # share the job's cores between the segment encoders
+    threads = max(1, ffmpeg_thread_budget() // len(ranges))
+    encode_args = {**profile_video_args(encoder), "threads": threads}
+
+    with tempfile.TemporaryDirectory(dir=get_upload_path("tmp")) as tmp:
+        segment_paths = [Path(tmp) / f"segment_{idx:04d}{SEGMENT_EXT}" for idx in range(len(ranges))]
+
+        # each worker thread only waits on its ffmpeg process
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [
+                # each segment keeps the job's metric labels
+                pool.submit(
+                    contextvars.copy_context().run,
+                    _render_segment, input_path, overlays, start, end, path, encode_args, progress,
+                    encoder.get("max_height")
+                )
+                for (start, end), path in zip(ranges, segment_paths)
+            ]
+            for future in futures:
+                future.result()
+
+        concat_segments(
+            segment_paths,
+            output_path,
+            audio_path=input_path if probe.audio_codec else None,
+            durations=[end - start for start, end in ranges],
+            audio_args=profile_audio_args(encoder, probe.audio_codec),
+        )
+
     return output_file
 
-def save_overlay(job_id: str, overlay_filename: str, overlays: list):
+
+def apply_overlays_windowed(input_file: str, overlays: List[Dict[str, Any]], probe: MediaProbe,
+                            progress: JobProgress | None = None, profile: str | None = None) -> str:
+    """
+    Re-encode only the parts of the video overlays are visible in.
+
+    The union of the overlay intervals is widened to keyframes, those
+    windows are rendered with the source codec and the stretches between
+    them are stream-copied, then everything is concatenated with the
+    source audio. A short logo on a long video only costs its own GOPs.
+    The encoder profile only sets the preset and CRF of the re-encoded
+    windows, the rest has to match the source.
+
+    Falls back to apply_overlays_to_video when the source has no keyframe
+    index or a codec that can't be matched, or when the profile
+    downscales the video.
+    """
+    encoder = get_encoder_profile(profile)
+    max_height = encoder.get("max_height")
+    if (
+        probe is None
+        or not probe.keyframes
+        or not probe.duration
+        or probe.video_codec not in SOURCE_ENCODERS
+        or (max_height and (probe.height or 0) > max_height)
+    ):
+        return apply_overlays_to_video(input_file, overlays, probe=probe, progress=progress, profile=profile)
+
+    intervals = [(overlay.get('start', 0), overlay.get('end', probe.duration)) for overlay in overlays]
+    spans = keyframe_windows(intervals, probe.keyframes, probe.duration)
+
+    input_path = get_storage().input_url(get_upload_path() / input_file)
+    output_file = create_file_name()
+    output_path = get_upload_path('overlays') / output_file
+    encode_args = source_encoder_args(probe)
+    if encode_args["vcodec"] in ("libx264", "libx265"):
+        # threads stay at the worker's budget (source_encoder_args), a profile's 0 would mean every core
+        encode_args.update({key: encoder[key] for key in ("preset", "crf") if encoder.get(key) is not None})
+
+    with tempfile.TemporaryDirectory(dir=get_upload_path("tmp")) as tmp:
+        segment_paths = []
+        for idx, (start, end, encode) in enumerate(spans):
+            path = Path(tmp) / f"span_{idx:04d}{SEGMENT_EXT}"
+            if encode:
+                _render_segment(input_path, overlays, start, end, path, encode_args, progress)
+            else:
+                copy_keyframe_range(input_path, start, end, path)
+                if progress:
+                    progress.update(path.stem, end - start)
+            segment_paths.append(path)
+
+        concat_segments(
+            segment_paths,
+            output_path,
+            audio_path=input_path if probe.audio_codec else None,
+            durations=[end - start for start, end, _ in spans],
+            audio_args=profile_audio_args(encoder, probe.audio_codec),
+        )
+
+    return output_file
+
+
+# overlay fields that change the rendered output, anything else is ignored by the cache key
+RENDER_FIELDS = {
+    "text": ("type", "start", "end", "position", "content", "language", "fontsize", "fontcolor"),
+    "image": ("type", "start", "end", "position", "file_hash", "scale", "opacity"),
+    "video": ("type", "start", "end", "position", "file_hash", "scale", "opacity"),
+}
+
+
+def _canonical_value(value):
+    # 5 and 5.0 render the same
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return {k: _canonical_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_canonical_value(v) for v in value]
+    return value
+
+
+def canonical_overlays(overlays: List[Dict[str, Any]]) -> List[Dict[str, Any]] | None:
+    """
+    Reduce overlays to the fields that affect rendering, assets by content hash.
+
+    Returns:
+        list | None: The canonical overlays, None if an asset has no content hash.
+    """
+    canonical = []
+    for overlay in overlays:
+        otype = overlay.get("type")
+        if otype in {"image", "video"} and not overlay.get("file_hash"):
+            return None
+        fields = RENDER_FIELDS.get(otype, ())
+        canonical.append({k: _canonical_value(overlay[k]) for k in fields if overlay.get(k) is not None})
+    return canonical
+
+
+def overlay_cache_key(content_hash: str | None, overlays: List[Dict[str, Any]],
+                      profile: str | None = None, render_mode: str = "single") -> str | None:
+    """
+    Build the render cache key of an overlay job.
+
+    The key covers the input content hash, the validated overlays reduced
+    to the fields that affect rendering (numbers normalized, dict keys
+    sorted), the content hash of every asset instead of its path, the
+    encoder profile and the render mode (a windowed render keeps the
+    source codec, its output differs from a full re-encode). Overlay
+    order is kept, it decides the layering.
+
+    Returns:
+        str | None: sha256 hex key, None if some content hash is unknown.
+    """
+    if not content_hash:
+        return None
+
+    canonical = canonical_overlays(overlays)
+    if canonical is None:
+        return None
+
+    payload = json.dumps(
+        {
+            "input": content_hash,
+            "overlays": canonical,
+            "profile": profile or settings.default_encoder_profile,
+            "render_mode": render_mode,
+        },
+        sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_cached_overlay(db: Session, cache_key: str | None) -> Overlay | None:
+    """
+    Return a finished render with the same cache key whose output is still stored.
+    """
+    if not cache_key:
+        return None
+
+    overlays_folder = get_upload_path('overlays')
+    candidates = (
+        db.query(Overlay)
+        .filter(Overlay.cache_key == cache_key, Overlay.evicted_at.is_(None))
+        .order_by(Overlay.id.desc())
+    )
+    for overlay in candidates:
+        if get_storage().exists(overlays_folder / overlay.overlay_filename):
+            return overlay
+    return None
+
+
+def get_overlay_outputs(db: Session, job_ids: List[str]) -> Dict[str, Overlay]:
+    """
+    The output rows of many overlay jobs in one query, by job ID. Jobs
+    without a row (unknown, or still running) are left out.
+    """
+    if not job_ids:
+        return {}
+    return {overlay.job_id: overlay for overlay in db.query(Overlay).filter(Overlay.job_id.in_(job_ids))}
+
+
+def touch_overlay_output(db: Session, overlay_filename: str) -> None:
+    """
+    Mark a rendered output as recently used for cache eviction.
+    """
+    db.execute(
+        update(Overlay)
+        .where(Overlay.overlay_filename == overlay_filename)
+        .values(last_accessed=datetime.now(timezone.utc))
+    )
+    db.commit()
+
+
+def evict_overlay_cache(db: Session, max_bytes: int | None = None, keep: Iterable[str] = ()) -> List[str]:
+    """
+    Delete the least recently used rendered outputs until the total size
+    of the kept ones fits in `max_bytes`.
+
+    An output shared by several jobs counts once and is used as recently
+    as its most recent job. Evicted jobs keep their row with `evicted_at` set.
+    Outputs used within `overlay_cache_protect_seconds` are still being
+    served and are never evicted, nor are the outputs in `keep` (the one
+    just rendered), even when the cache stays over budget.
+
+    Args:
+        db (Session): SQLAlchemy session.
+        max_bytes (int | None): Budget, `overlay_cache_max_bytes` if None.
+        keep (iterable): Output file names never evicted by this call.
+
+    Returns:
+        list: Evicted output file names.
+    """
+    max_bytes = settings.overlay_cache_max_bytes if max_bytes is None else max_bytes
+    keep = set(keep)
+    protected_since = datetime.now(timezone.utc) - timedelta(seconds=settings.overlay_cache_protect_seconds)
+
+    outputs = (
+        db.query(
+            Overlay.overlay_filename,
+            func.max(Overlay.size).label("size"),
+            func.max(Overlay.last_accessed).label("last_accessed"),
+        )
+        .filter(Overlay.evicted_at.is_(None))
+        .group_by(Overlay.overlay_filename)
+        .order_by(func.max(Overlay.last_accessed).asc())
+        .all()
+    )
+    total = sum(output.size or 0 for output in outputs)
+
+    overlays_folder = get_upload_path('overlays')
+    evicted = []
+    for output in outputs:
+        if total <= max_bytes:
+            break
+        last_accessed = output.last_accessed
+        if last_accessed is not None and last_accessed.tzinfo is None:
+            # naive values are stored as UTC
+            last_accessed = last_accessed.replace(tzinfo=timezone.utc)
+        if last_accessed is not None and last_accessed > protected_since:
+            # the rest is used even more recently
+            break
+        if output.overlay_filename in keep:
+            continue
+        get_storage().delete(overlays_folder / output.overlay_filename)
+        total -= output.size or 0
+        evicted.append(output.overlay_filename)
+
+    if evicted:
+        db.execute(
+            update(Overlay)
+            .where(Overlay.overlay_filename.in_(evicted))
+            .values(evicted_at=datetime.now(timezone.utc))
+        )
+        db.commit()
+
+    return evicted
+
+
+def save_overlay(job_id: str, overlay_filename: str, overlays: list, cache_key: str | None = None,
+                 output_hash: str | None = None, batch_id: str | None = None, profile: str | None = None,
+                 video_id: str | None = None, render_mode: str | None = None) -> None:
     """
-    Save overlay record into database.
+    Save overlay record into database. The row joins the next bulk insert
+    of the batch writer (one commit with the other pending rows of this
+    process), returns once it is committed.
 
     Args:
         job_id (str): ID of the job.
         overlay_filename (str): Filename of the overlay.
         overlays (list): JSON-compatible list (e.g. [{}, {}]).
+        cache_key (str | None): Render cache key of the job.
+        output_hash (str | None): sha256 of the output file.
+        batch_id (str | None): Template batch the job belongs to.
+        profile (str | None): Encoder profile of the render.
+        video_id (str | None): Source video, an evicted output is rendered again from it.
+        render_mode (str | None): Render mode of the job.
+    """
+    now = datetime.now(timezone.utc)
+    output_path = get_upload_path('overlays') / overlay_filename
+    get_batch_writer().add(Overlay, {
+        "job_id": job_id,
+        "overlay_filename": overlay_filename,
+        "overlay": overlays,
+        "cache_key": cache_key,
+        "size": get_storage().size(output_path),
+        "output_hash": output_hash,
+        "batch_id": batch_id,
+        "profile": profile or settings.default_encoder_profile,
+        "video_id": video_id,
+        "render_mode": render_mode,
+        "created_at": now,
+        "last_accessed": now,
+    }, wait=True)
+
+
+def _render_overlay_output(db: Session, job_id: str, input_file: str, overlays: list, content_hash: str | None,
+                           render_mode: str, profile: str | None) -> str:
+    """
+    Render the overlays onto the input with the given render mode, their
+    image and video assets normalized first (cached across jobs). With
+    the "pipeline" mode `overlays` holds the operations of a pipeline job.
+
+    Returns:
+        str: The output file name.
+    """
+    # stream layout stored at upload time
+    probe = get_media_probe(db, content_hash)
+    if probe:
+        db.expunge(probe)
+        set_job_resolution(probe.width, probe.height)
+    if render_mode == PIPELINE_RENDER_MODE:
+        # pipelines compose overlays with other operations, imported here as they build on this module
+        from app.services.pipeline_services import render_pipeline, plan_pipeline
+
+        plan = plan_pipeline(overlays, probe.duration if probe else None)
+        total = plan["end"] - plan["start"] if plan["end"] is not None else None
+        return render_pipeline(input_file, overlays, probe, progress=JobProgress(job_id, total=total), profile=profile)
+
+    with span("asset_normalize"):
+        overlays = normalize_overlay_assets(overlays, fps=probe.fps if probe else None)
+    progress = JobProgress(job_id, total=probe.duration if probe else None)
+    if render_mode == "parallel":
+        overlay_filename = apply_overlays_parallel(input_file, overlays, probe, progress=progress, profile=profile)
+    elif render_mode == "windowed":
+        overlay_filename = apply_overlays_windowed(input_file, overlays, probe, progress=progress, profile=profile)
+    else:
+        overlay_filename = apply_overlays_to_video(
+            input_file, overlays, probe=probe, progress=progress, profile=profile
+        )
+    return overlay_filename
+
+
+def process_overlay_job(job_id: str, input_file: str, overlays: list, content_hash: str | None = None,
+                        cache_key: str | None = None, render_mode: str = "single", output_format: str = "mp4",
+                        batch_id: str | None = None, profile: str | None = None, video_id: str | None = None) -> str:
+    """
+    Render an overlay job, or reuse an identical render finished while
+    this job was queued, then keep the render cache within its budget.
+    With output_format "hls" the output is also packaged for streaming.
+    `profile` names the encoder profile, the default one if None.
 
     Returns:
-        Overlay: The saved Overlay object.
+        str: The output file name.
     """
     db: Session = SessionLocal()
     try:
-        new_overlay = Overlay(
-            job_id=job_id,
-            overlay_filename=overlay_filename,
-            overlay=overlays
+        cached = get_cached_overlay(db, cache_key)
+        if cached:
+            overlay_filename = cached.overlay_filename
+            output_hash = cached.output_hash
+            touch_overlay_output(db, overlay_filename)
+        else:
+            overlay_filename = _render_overlay_output(
+                db, job_id, input_file, overlays, content_hash, render_mode, profile
+            )
+            output_hash = None
+
+        output_path = get_upload_path('overlays') / overlay_filename
+        with span("result_save"):
+            if not cached:
+                get_storage().publish(output_path)
+            output_hash = output_hash or file_sha256(output_path)
+            save_overlay(
+                job_id, overlay_filename, overlays, cache_key=cache_key, output_hash=output_hash, batch_id=batch_id,
+                profile=profile, video_id=video_id, render_mode=render_mode,
+            )
+
+        if output_format == "hls":
+            ensure_hls_package(output_hash, output_path)
+
+        if not cached:
+            evict_overlay_cache(db, keep={overlay_filename})
+
+        return overlay_filename
+    finally:
+        db.close()
+
+
+def restore_overlay_output(job_id: str, overlay_job_id: str) -> str:
+    """
+    Render the evicted output of an overlay job again, from the source
+    video, overlays and profile stored with the job, or reuse an identical
+    render made since. Every job that shared the evicted output gets the
+    restored one.
+
+    Args:
+        job_id (str): ID of the restore job.
+        overlay_job_id (str): ID of the overlay job whose output was evicted.
+
+    Returns:
+        str: The output file name.
+
+    Raises:
+        ValueError: If the job is unknown or its source video is gone.
+    """
+    db: Session = SessionLocal()
+    try:
+        overlay = db.query(Overlay).filter(Overlay.job_id == overlay_job_id).first()
+        if overlay is None:
+            raise ValueError(f"Overlay job {overlay_job_id} not found")
+        if overlay.evicted_at is None:
+            return overlay.overlay_filename
+
+        video = db.query(Video).filter(Video.id == overlay.video_id).first() if overlay.video_id else None
+        if video is None:
+            raise ValueError(f"Source video of overlay job {overlay_job_id} is gone")
+
+        cached = get_cached_overlay(db, overlay.cache_key)
+        if cached:
+            overlay_filename = cached.overlay_filename
+            output_hash = cached.output_hash
+        else:
+            overlay_filename = _render_overlay_output(
+                db, job_id, video.saved_filename, overlay.overlay, video.content_hash,
+                overlay.render_mode or "single", overlay.profile,
+            )
+            output_path = get_upload_path('overlays') / overlay_filename
+            with span("result_save"):
+                get_storage().publish(output_path)
+                output_hash = file_sha256(output_path)
+
+        db.execute(
+            update(Overlay)
+            .where(Overlay.overlay_filename == overlay.overlay_filename)
+            .values(
+                overlay_filename=overlay_filename,
+                evicted_at=None,
+                last_accessed=datetime.now(timezone.utc),
+                size=get_storage().size(get_upload_path('overlays') / overlay_filename),
+                output_hash=output_hash,
+            )
         )
-        db.add(new_overlay)
         db.commit()
-        db.refresh(new_overlay)
-        return str(new_overlay)
-    except Exception as e:
-        db.rollback()
-        raise e
+        logger.info("Restored overlay output of job %s as %s", overlay_job_id, overlay_filename)
+
+        if not cached:
+            evict_overlay_cache(db, keep={overlay_filename})
+        return overlay_filename
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
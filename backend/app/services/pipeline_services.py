@@ -0,0 +1,253 @@
+from typing import Any, Dict, List, Tuple
+import hashlib
+import json
+import logging
+
+import ffmpeg
+
+from app.config import settings
+from app.db import MediaProbe
+from app.services.asset_services import normalize_overlay_assets
+from app.services.overlay_services import build_overlay_graph, canonical_overlays, validate_overlays
+from app.storage import get_storage
+from app.utils import (
+    create_file_name, get_upload_path, run_ffmpeg, JobProgress, get_encoder_profile, profile_video_args,
+    profile_audio_args, scale_to_height, span
+)
+
+logger = logging.getLogger(__name__)
+
+VALID_PIPELINE_OPERATIONS = {"trim", "overlay", "scale", "encode"}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_pipeline(
+    operations: List[Dict[str, Any]], file_map: Dict[str, Any], duration: float | None = None
+) -> Tuple[bool, List[str]]:
+    """
+    Validates the operations of a pipeline job.
+
+    Operations run in order, each on the output of the previous ones:
+    {"type": "trim", "start", "end"} cuts the clip (times on the current
+    timeline), {"type": "overlay", "overlays": [...]} adds overlays like
+    /overlay (times on the current timeline), {"type": "scale", "width",
+    "height"} resizes (-2 keeps the aspect ratio) and {"type": "encode",
+    "profile"} picks the encoder profile.
+
+    Args:
+        operations (list): List of operation dicts from JSON.
+        file_map (dict): Mapping of file_key to uploaded file (for image/video overlays).
+        duration (float | None): Duration of the input video, when known.
+
+    Returns:
+        is_valid (bool): True if all operations are valid.
+        errors (list): List of error messages if any.
+    """
+    errors = []
+
+    if not isinstance(operations, list) or not operations:
+        return False, ["Operations must be a non-empty list"]
+    if len(operations) > settings.pipeline_max_operations:
+        errors.append(f"Maximum {settings.pipeline_max_operations} operations allowed")
+
+    overlay_count = 0
+    encode_count = 0
+    for idx, operation in enumerate(operations, start=1):
+        optype = operation.get("type") if isinstance(operation, dict) else None
+        if optype not in VALID_PIPELINE_OPERATIONS:
+            errors.append(f"Operation {idx}: Invalid type '{optype}'")
+            continue
+
+        if optype == "trim":
+            start, end = operation.get("start"), operation.get("end")
+            if not _is_number(start) or not _is_number(end):
+                errors.append(f"Operation {idx}: start and end must be numeric")
+            elif start < 0 or start >= end:
+                errors.append(f"Operation {idx}: start must be positive and less than end")
+
+        elif optype == "overlay":
+            overlays = operation.get("overlays")
+            _, overlay_errors = validate_overlays(overlays, file_map, max_overlays=3)
+            errors.extend(f"Operation {idx}: {error}" for error in overlay_errors)
+            overlay_count += len(overlays) if isinstance(overlays, list) else 0
+
+        elif optype == "scale":
+            sizes = (operation.get("width", -2), operation.get("height", -2))
+            if not all(isinstance(v, int) and not isinstance(v, bool) and (v > 0 or v in (-1, -2)) for v in sizes):
+                errors.append(f"Operation {idx}: width and height must be positive integers, -1 or -2")
+            elif sizes[0] < 0 and sizes[1] < 0:
+                errors.append(f"Operation {idx}: Scale must set width or height")
+
+        elif optype == "encode":
+            encode_count += 1
+            if operation.get("profile") not in settings.encoder_profiles:
+                errors.append(f"Operation {idx}: Invalid profile '{operation.get('profile')}'")
+
+    if overlay_count > 3:
+        errors.append("Maximum 3 overlays allowed")
+    if encode_count > 1:
+        errors.append("Only one encode operation allowed")
+
+    if not errors:
+        try:
+            plan_pipeline(operations, duration)
+        except ValueError as e:
+            errors.append(str(e))
+
+    return len(errors) == 0, errors
+
+
+def pipeline_profile(operations: List[Dict[str, Any]]) -> str:
+    """
+    Encoder profile of a pipeline, the default one without an encode operation.
+    """
+    for operation in operations:
+        if operation.get("type") == "encode":
+            return operation["profile"]
+    return settings.default_encoder_profile
+
+
+def plan_pipeline(operations: List[Dict[str, Any]], duration: float | None = None) -> Dict[str, Any]:
+    """
+    Resolve the trims of a pipeline to one window of the source, and the
+    source time each overlay operation's timeline starts at.
+
+    Returns:
+        dict: "start" and "end" (None: to the end) of the window on the
+            source, "origins" the timeline start of every operation.
+
+    Raises:
+        ValueError: If a trim ends up outside the clip.
+    """
+    start, end = 0.0, duration
+    origins = []
+    for idx, operation in enumerate(operations, start=1):
+        origins.append(start)
+        if operation.get("type") != "trim":
+            continue
+        trim_start, trim_end = start + operation["start"], start + operation["end"]
+        if end is not None and trim_start >= end:
+            raise ValueError(f"Operation {idx}: trim starts after the end of the clip")
+        start, end = trim_start, trim_end if end is None else min(end, trim_end)
+    return {"start": start, "end": end, "origins": origins}
+
+
+def pipeline_cache_key(content_hash: str | None, operations: List[Dict[str, Any]],
+                       profile: str | None = None) -> str | None:
+    """
+    Build the render cache key of a pipeline job, like overlay_cache_key:
+    the input content hash, the canonical operations in order and the
+    encoder profile.
+
+    Returns:
+        str | None: sha256 hex key, None if some content hash is unknown.
+    """
+    if not content_hash:
+        return None
+
+    canonical = []
+    for operation in operations:
+        optype = operation["type"]
+        if optype == "trim":
+            canonical.append({"type": optype, "start": float(operation["start"]), "end": float(operation["end"])})
+        elif optype == "scale":
+            canonical.append(
+                {"type": optype, "width": operation.get("width", -2), "height": operation.get("height", -2)}
+            )
+        elif optype == "overlay":
+            overlays = canonical_overlays(operation["overlays"])
+            if overlays is None:
+                return None
+            canonical.append({"type": optype, "overlays": overlays})
+
+    payload = json.dumps(
+        {
+            "input": content_hash,
+            "pipeline": canonical,
+            "profile": profile or settings.default_encoder_profile,
+        },
+        sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def pipeline_overlays(operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The overlays of every overlay operation, in order.
+    """
+    return [
+        overlay
+        for operation in operations if operation.get("type") == "overlay"
+        for overlay in operation.get("overlays") or []
+    ]
+
+
+def build_pipeline_graph(base, operations: List[Dict[str, Any]], plan: Dict[str, Any]):
+    """
+    Apply the overlay and scale operations in order on the video of `base`,
+    the input already cut to the window of the plan. Overlay times are
+    rebased from their operation's timeline onto the output timeline.
+
+    Returns:
+        The filtered video stream.
+    """
+    stream = base
+    duration = plan["end"] - plan["start"] if plan["end"] is not None else None
+    for operation, origin in zip(operations, plan["origins"]):
+        optype = operation["type"]
+        if optype == "overlay":
+            stream = build_overlay_graph(
+                stream, operation["overlays"], offset=plan["start"] - origin, duration=duration
+            )
+        elif optype == "scale":
+            stream = stream.filter("scale", operation.get("width", -2), operation.get("height", -2))
+    return stream
+
+
+def render_pipeline(input_file: str, operations: List[Dict[str, Any]], probe: MediaProbe | None = None,
+                    progress: JobProgress | None = None, profile: str | None = None) -> str:
+    """
+    Run a pipeline in a single ffmpeg pass: one decode of the trimmed
+    window of the source, one filter graph for every overlay and scale
+    operation, one encode with the profile.
+
+    `probe` is the stored probe of the input, its duration bounds the
+    trims and the frame rate the overlay assets are normalized to.
+
+    Returns:
+        str: The output file name, in the overlays folder.
+    """
+    plan = plan_pipeline(operations, probe.duration if probe else None)
+    fps = probe.fps if probe else None
+    with span("asset_normalize"):
+        operations = [
+            {**operation, "overlays": normalize_overlay_assets(operation["overlays"], fps=fps)}
+            if operation["type"] == "overlay" else operation
+            for operation in operations
+        ]
+
+    input_args = {}
+    if plan["start"] > 0:
+        input_args["ss"] = plan["start"]
+    if plan["end"] is not None:
+        input_args["t"] = plan["end"] - plan["start"]
+    base = ffmpeg.input(get_storage().input_url(get_upload_path() / input_file), **input_args)
+
+    encoder = get_encoder_profile(profile)
+    video = scale_to_height(build_pipeline_graph(base, operations, plan), encoder.get("max_height"))
+
+    output_file = create_file_name()
+    output_path = get_upload_path('overlays') / output_file
+    logger.debug("Rendering pipeline of %d operation(s) to %s", len(operations), output_path)
+
+    streams = [video]
+    output_args = profile_video_args(encoder)
+    if probe and probe.audio_codec:
+        streams.append(base.audio)
+        output_args.update(profile_audio_args(encoder, probe.audio_codec))
+
+    run_ffmpeg(ffmpeg.output(*streams, str(output_path), **output_args), progress)
+    return output_file
@@ -0,0 +1,309 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from PIL import Image
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db import SessionLocal, Video, VideoPreview
+from app.services.probe_services import get_or_create_media_probe
+from app.storage import get_storage
+from app.utils import (
+    get_upload_path, file_sha256, run_ffmpeg, thread_args, JobProgress, span, set_job_resolution
+)
+import ffmpeg
+import math
+import numpy as np
+import os
+import shutil
+import uuid
+
+
+PREVIEW_SUBFOLDER = "previews"
+SPRITE_NAME = "sprite.jpg"
+THUMBNAILS_VTT_NAME = "thumbnails.vtt"
+PREVIEW_NAME = "preview.mp4"
+
+PREVIEW_MEDIA_TYPES = {
+    SPRITE_NAME: "image/jpeg",
+    THUMBNAILS_VTT_NAME: "text/vtt",
+    PREVIEW_NAME: "video/mp4",
+}
+
+
+def preview_dir(content_hash: str) -> Path:
+    return get_upload_path(PREVIEW_SUBFOLDER) / content_hash
+
+
+def thumbnail_layout(duration: float, width: int | None, height: int | None) -> Dict[str, Any]:
+    """
+    Pick the thumbnails of a video: evenly spaced every `thumbnail_interval`
+    seconds (spread wider past `thumbnail_max_count`), scaled to
+    `thumbnail_width` with the source aspect ratio and tiled
+    `sprite_columns` wide.
+    """
+    count = min(max(math.ceil(duration / settings.thumbnail_interval), 1), settings.thumbnail_max_count)
+    tile_width = settings.thumbnail_width
+    # even height keeping the source aspect ratio, 16:9 if unknown
+    aspect = height / width if width and height else 9 / 16
+    tile_height = round(tile_width * aspect / 2) * 2
+    columns = min(settings.sprite_columns, count)
+
+    return {
+        "frame_count": count,
+        "interval": duration / count,
+        "tile_width": tile_width,
+        "tile_height": max(tile_height, 2),
+        "columns": columns,
+        "rows": math.ceil(count / columns),
+    }
+
+
+def _keyframes_suffice(keyframes: List[float] | None, duration: float, interval: float) -> bool:
+    # decoding only keyframes is enough when there is one at least every interval
+    if not keyframes:
+        return False
+    points = sorted(keyframes) + [duration]
+    return all(b - a <= interval for a, b in zip(points, points[1:]))
+
+
+def extract_thumbnails(
+    file_path: str | Path, layout: Dict[str, Any], keyframes: List[float] | None = None, duration: float | None = None,
+    progress: JobProgress | None = None
+) -> np.ndarray:
+    """
+    Grab evenly spaced frames of a video in a single ffmpeg pass.
+
+    The file is read once front to back, the fps filter keeps one frame
+    per interval and scales it to the tile size. When the video has a
+    keyframe at least every interval, the decoder skips every other frame
+    (`-skip_frame nokey`), so most of the file is only demuxed.
+
+    Returns:
+        np.ndarray: uint8 frames, shape (frame_count, tile_height, tile_width, 3).
+
+    Raises:
+        ffmpeg.Error: If ffmpeg fails to read the file.
+    """
+    count, interval = layout["frame_count"], layout["interval"]
+    width, height = layout["tile_width"], layout["tile_height"]
+
+    input_args = {}
+    if duration and _keyframes_suffice(keyframes, duration, interval):
+        input_args["skip_frame"] = "nokey"
+
+    raw_path = get_upload_path("tmp") / f"thumbnails_{uuid.uuid4().hex}.rgb"
+    try:
+        stream = (
+            ffmpeg
+            .input(str(file_path), **input_args)
+            .video
+            .filter("fps", fps=1 / interval, round="near")
+            .filter("scale", width, height)
+        )
+        run_ffmpeg(
+            stream.output(str(raw_path), format="rawvideo", pix_fmt="rgb24", vframes=count),
+            progress=progress, part="thumbnails"
+        )
+        frames = np.fromfile(raw_path, dtype=np.uint8)
+    finally:
+        raw_path.unlink(missing_ok=True)
+
+    frame_size = width * height * 3
+    frames = frames[: len(frames) // frame_size * frame_size].reshape(-1, height, width, 3)
+    if not len(frames):
+        raise ValueError("No frame could be extracted from the video.")
+    if len(frames) < count:
+        # the stream ended early, repeat the last frame
+        frames = np.concatenate([frames, np.repeat(frames[-1:], count - len(frames), axis=0)])
+    return frames[:count]
+
+
+def tile_sprite(frames: np.ndarray, columns: int) -> np.ndarray:
+    """
+    Tile frames row by row into one image, padding the last row with black.
+    """
+    count, height, width, channels = frames.shape
+    rows = math.ceil(count / columns)
+    padded = np.zeros((rows * columns, height, width, channels), dtype=frames.dtype)
+    padded[:count] = frames
+
+    return (
+        padded
+        .reshape(rows, columns, height, width, channels)
+        .transpose(0, 2, 1, 3, 4)
+        .reshape(rows * height, columns * width, channels)
+    )
+
+
+def _vtt_time(seconds: float) -> str:
+    millis = round(seconds * 1000)
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+
+def build_thumbnails_vtt(layout: Dict[str, Any], duration: float, sprite_url: str = SPRITE_NAME) -> str:
+    """
+    WebVTT thumbnail track pointing every cue at its tile of the sprite
+    (`sprite.jpg#xywh=x,y,w,h`), as read by most web players.
+    """
+    interval, columns = layout["interval"], layout["columns"]
+    width, height = layout["tile_width"], layout["tile_height"]
+
+    lines = ["WEBVTT", ""]
+    for idx in range(layout["frame_count"]):
+        start = idx * interval
+        end = min(start + interval, duration)
+        x, y = (idx % columns) * width, (idx // columns) * height
+        lines += [f"{_vtt_time(start)} --> {_vtt_time(end)}", f"{sprite_url}#xywh={x},{y},{width},{height}", ""]
+    return "\n".join(lines)
+
+
+def render_preview(
+    file_path: str | Path, output_path: Path, has_audio: bool = True, progress: JobProgress | None = None
+) -> None:
+    """
+    Encode a low-bitrate rendition for hover and scrub previews.
+    """
+    source = ffmpeg.input(str(file_path))
+    streams = [source.video.filter("scale", -2, f"min({settings.preview_height},ih)")]
+    if has_audio:
+        streams.append(source.audio)
+
+    run_ffmpeg(
+        ffmpeg.output(
+            *streams,
+            str(output_path),
+            vcodec="libx264",
+            preset="veryfast",
+            video_bitrate=settings.preview_video_bitrate,
+            maxrate=settings.preview_video_bitrate,
+            bufsize=settings.preview_video_bitrate,
+            pix_fmt="yuv420p",
+            acodec="aac",
+            audio_bitrate=settings.preview_audio_bitrate,
+            movflags="+faststart",
+            **thread_args(),
+        ),
+        progress=progress, part="preview"
+    )
+
+
+def get_video_preview(db: Session, content_hash: str | None) -> VideoPreview | None:
+    if not content_hash:
+        return None
+    return db.get(VideoPreview, content_hash)
+
+
+def request_video_preview(db: Session, video: Video) -> Tuple[VideoPreview, bool]:
+    """
+    Record that the previews of a video are wanted.
+
+    Previews are shared by every video with the same content, an existing
+    record is returned unless its generation failed.
+
+    Returns:
+        preview (VideoPreview): The preview record, its job_id names the job to run.
+        created (bool): True if a job has to be scheduled.
+
+    Raises:
+        ValueError: If the video has no content hash.
+    """
+    if not video.content_hash:
+        raise ValueError(f"Video {video.id} has no content hash.")
+
+    preview = get_video_preview(db, video.content_hash)
+    if preview and preview.status != "FAILURE":
+        return preview, False
+
+    try:
+        if preview:
+            preview.job_id = str(uuid.uuid4())
+            preview.status = "PENDING"
+            preview.error = None
+        else:
+            preview = VideoPreview(content_hash=video.content_hash, job_id=str(uuid.uuid4()))
+            db.add(preview)
+        db.commit()
+        db.refresh(preview)
+    except IntegrityError:
+        # requested concurrently for the same content
+        db.rollback()
+        return get_video_preview(db, video.content_hash), False
+
+    return preview, True
+
+
+def generate_video_previews(job_id: str, video_id: str) -> Dict[str, Any]:
+    """
+    Build the sprite sheet, WebVTT thumbnail track and preview rendition
+    of a video into uploads/previews/<content_hash>.
+
+    Files are written aside and the folder is renamed in place, so a
+    partial set is never served.
+
+    Returns:
+        dict: job_id, content_hash and the thumbnail layout.
+    """
+    db: Session = SessionLocal()
+    preview = None
+    try:
+        video = db.get(Video, video_id)
+        if video is None:
+            raise ValueError(f"No video found with ID {video_id}.")
+        preview = get_video_preview(db, video.content_hash)
+        if preview is None:
+            preview = VideoPreview(content_hash=video.content_hash, job_id=job_id)
+            db.add(preview)
+            db.commit()
+
+        # streamed from the storage backend when the video is not on this node
+        file_path = get_storage().input_url(get_upload_path() / video.saved_filename)
+        probe = get_or_create_media_probe(db, video.content_hash, file_path)
+        set_job_resolution(probe.width, probe.height)
+        duration = probe.duration or video.duration
+        layout = thumbnail_layout(duration, probe.width, probe.height)
+
+        output_dir = preview_dir(video.content_hash)
+        tmp_dir = output_dir.with_name(f"{video.content_hash}_{uuid.uuid4().hex}.tmp")
+        tmp_dir.mkdir(parents=True)
+        try:
+            # thumbnails and preview each read the whole timeline
+            progress = JobProgress(job_id, total=2 * duration)
+
+            frames = extract_thumbnails(file_path, layout, probe.keyframes, duration, progress=progress)
+            with span("sprite"):
+                Image.fromarray(tile_sprite(frames, layout["columns"])).save(tmp_dir / SPRITE_NAME, quality=80)
+                (tmp_dir / THUMBNAILS_VTT_NAME).write_text(build_thumbnails_vtt(layout, duration))
+            render_preview(file_path, tmp_dir / PREVIEW_NAME, has_audio=bool(probe.audio_codec), progress=progress)
+
+            with span("result_save"):
+                preview_hash = file_sha256(tmp_dir / PREVIEW_NAME)
+                shutil.rmtree(output_dir, ignore_errors=True)
+                os.replace(tmp_dir, output_dir)
+                for name in (SPRITE_NAME, THUMBNAILS_VTT_NAME, PREVIEW_NAME):
+                    get_storage().publish(output_dir / name)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        with span("result_save"):
+            for key, value in layout.items():
+                setattr(preview, key, value)
+            preview.preview_hash = preview_hash
+            preview.status = "SUCCESS"
+            preview.finished_at = datetime.now(timezone.utc)
+            db.commit()
+
+        return {"job_id": job_id, "content_hash": video.content_hash, **layout}
+
+    except Exception as e:
+        db.rollback()
+        if preview is not None:
+            preview.status = "FAILURE"
+            preview.error = str(e)
+            db.commit()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,158 @@
+from fractions import Fraction
+from typing import Dict, Any, List
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from app.db.models import MediaProbe
+from app.utils import span
+import ffmpeg
+import subprocess
+
+
+def _parse_rate(rate: str | None) -> float | None:
+    """
+    Convert an ffprobe frame rate such as '30000/1001' to a float.
+    """
+    if not rate:
+        return None
+    try:
+        value = Fraction(rate)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return float(value) if value else None
+
+
+def _to_int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_media(file_path: str) -> Dict[str, Any]:
+    """
+    Run ffprobe on a file and flatten the result into MediaProbe fields.
+
+    Raises:
+        ffmpeg.Error: If ffprobe fails to read the file.
+    """
+    with span("probe"):
+        response = ffmpeg.probe(str(file_path))
+    fmt = response.get("format", {})
+    streams = response.get("streams", [])
+
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+
+    return {
+        "format_name": fmt.get("format_name"),
+        "start_time": _to_float(fmt.get("start_time")),
+        "duration": _to_float(fmt.get("duration")),
+        "size": _to_int(fmt.get("size")),
+        "bit_rate": _to_int(fmt.get("bit_rate")),
+        "video_codec": video.get("codec_name"),
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "fps": _parse_rate(video.get("avg_frame_rate")) or _parse_rate(video.get("r_frame_rate")),
+        "pix_fmt": video.get("pix_fmt"),
+        "audio_codec": audio.get("codec_name"),
+        "audio_channels": audio.get("channels"),
+        "channel_layout": audio.get("channel_layout"),
+        "sample_rate": _to_int(audio.get("sample_rate")),
+        "streams": streams,
+    }
+
+
+def probe_keyframes(file_path: str, start_time: float | None = None) -> List[float]:
+    """
+    Build the keyframe (GOP) index of the first video stream.
+
+    Only packet headers are read, nothing is decoded, so this stays
+    cheap even on long files. Times are relative to the start time of
+    the file (non-zero in MPEG-TS or with an edit list), on the same
+    timeline as `-ss`/`-t` and the user's trim times.
+
+    Args:
+        file_path (str): Path of the file.
+        start_time (float | None): Format start time, probed if not given.
+
+    Returns:
+        list: Sorted presentation times of the keyframes in seconds.
+
+    Raises:
+        ffmpeg.Error: If ffprobe fails to read the file.
+    """
+    if start_time is None:
+        with span("probe"):
+            start_time = _to_float(
+                ffmpeg.probe(str(file_path), show_entries="format=start_time").get("format", {}).get("start_time")
+            )
+    start_time = start_time or 0.0
+
+    args = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=print_section=0",
+        str(file_path),
+    ]
+    with span("probe_keyframes"):
+        p = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if p.returncode != 0:
+        raise ffmpeg.Error("ffprobe", p.stdout, p.stderr)
+
+    keyframes = set()
+    for line in p.stdout.decode().splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            # a keyframe before the start (edit list) opens the first GOP of the timeline
+            keyframes.add(round(max(float(pts_time) - start_time, 0.0), 6))
+
+    return sorted(keyframes)
+
+
+def get_media_probe(db: Session, content_hash: str | None) -> MediaProbe | None:
+    """
+    Return the stored probe for a content hash, if any.
+    """
+    if not content_hash:
+        return None
+    return db.get(MediaProbe, content_hash)
+
+
+def get_or_create_media_probe(db: Session, content_hash: str, file_path: str) -> MediaProbe:
+    """
+    Return the stored probe for a content hash, probing the file only
+    the first time this content is seen.
+
+    Args:
+        db (Session): SQLAlchemy session object.
+        content_hash (str): sha256 digest of the file.
+        file_path (str): Path of the file to probe on a cache miss.
+
+    Returns:
+        MediaProbe: The stored probe.
+    """
+    media = get_media_probe(db, content_hash)
+    if media:
+        return media
+
+    media = MediaProbe(content_hash=content_hash, **probe_media(file_path))
+    if media.video_codec:
+        media.keyframes = probe_keyframes(file_path, start_time=media.start_time)
+    db.add(media)
+    try:
+        db.commit()
+    except IntegrityError:
+        # probed concurrently by another request for the same content
+        db.rollback()
+        return get_media_probe(db, content_hash)
+
+    db.refresh(media)
+    return media
@@ -0,0 +1,208 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.db import SessionLocal, OverlayTemplate, OverlayBatch, Video
+from app.services.blob_services import acquire_blob, get_blob
+from app.services.overlay_services import overlay_cache_key
+from app.services.asset_services import normalize_overlay_asset, STILL_IMAGE_EXTS
+from app.utils import rasterize_text, publish_job_event
+import uuid
+
+
+ASSET_SUBFOLDER = "overlay_items"
+
+
+def prepare_template_overlays(db: Session, overlays: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Prepare the assets of validated overlays once for all the videos a
+    template will be applied to: still images are normalized into the
+    asset cache, text captions are rasterized into the text cache.
+
+    Uploaded assets must already be stored and point at their blob
+    (`file_key` path, `file_hash` digest) like in an overlay job. The
+    overlays keep pointing at the uploads, the jobs find the normalized
+    assets in the cache (videos are normalized by the first job, at the
+    frame rate of its video).
+
+    Raises:
+        ValueError: If a caption can't be rasterized.
+    """
+    prepared = []
+    for overlay in overlays:
+        overlay = dict(overlay)
+        otype = overlay.get("type")
+
+        if otype == "text":
+            rasterize_text(
+                overlay["content"],
+                language=overlay.get("language"),
+                fontsize=overlay.get("fontsize", 24),
+                fontcolor=overlay.get("fontcolor", "white"),
+            )
+
+        elif otype == "image" and Path(overlay["file_key"]).suffix.lower() in STILL_IMAGE_EXTS:
+            normalize_overlay_asset(overlay)
+
+        prepared.append(overlay)
+    return prepared
+
+
+def create_overlay_template(name: str, overlays: List[Dict[str, Any]]) -> OverlayTemplate:
+    """
+    Prepare the assets of validated overlays and store them as a template
+    holding a reference on every asset.
+
+    Args:
+        name (str): Display name of the template.
+        overlays (list): Validated overlays, uploaded assets already stored.
+
+    Returns:
+        OverlayTemplate: The saved template.
+    """
+    db: Session = SessionLocal()
+    try:
+        overlays = prepare_template_overlays(db, overlays)
+        for overlay in overlays:
+            if overlay.get("file_hash"):
+                acquire_blob(db, get_blob(db, overlay["file_hash"], ASSET_SUBFOLDER))
+
+        template = OverlayTemplate(id=uuid.uuid4().hex, name=name, overlays=overlays)
+        db.add(template)
+        db.commit()
+        db.refresh(template)
+        return template
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        db.close()
+
+
+def get_overlay_template(db: Session, template_id: str) -> OverlayTemplate | None:
+    return db.get(OverlayTemplate, template_id)
+
+
+def get_overlay_batch(db: Session, batch_id: str) -> OverlayBatch | None:
+    return db.get(OverlayBatch, batch_id)
+
+
+def create_overlay_batch(
+    db: Session, template: OverlayTemplate, video_ids: List[str], render_mode: str = "single",
+    output_format: str = "mp4", profile: str | None = None
+) -> Tuple[OverlayBatch, List[Dict[str, Any]]]:
+    """
+    Record a batch applying a template to many videos and build the
+    arguments of one overlay job per video.
+
+    Returns:
+        batch (OverlayBatch): The batch record, its id is the batch job ID.
+        jobs (list): Per video job_id, input_file, content_hash and cache_key.
+
+    Raises:
+        ValueError: If some video does not exist.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    videos = {video.id: video for video in db.query(Video).filter(Video.id.in_(video_ids))}
+    missing = [video_id for video_id in video_ids if video_id not in videos]
+    if missing:
+        raise ValueError(f"Videos not found: {', '.join(missing)}.")
+
+    jobs = []
+    for video_id in video_ids:
+        video = videos[video_id]
+        jobs.append({
+            "video_id": video_id,
+            "job_id": str(uuid.uuid4()),
+            "input_file": video.saved_filename,
+            "content_hash": video.content_hash,
+            "cache_key": overlay_cache_key(video.content_hash, template.overlays, profile, render_mode),
+        })
+
+    batch = OverlayBatch(
+        id=str(uuid.uuid4()),
+        template_id=template.id,
+        render_mode=render_mode,
+        output_format=output_format,
+        profile=profile,
+        jobs={job["video_id"]: job["job_id"] for job in jobs},
+        total=len(jobs),
+    )
+    try:
+        db.add(batch)
+        db.commit()
+        db.refresh(batch)
+    except:
+        db.rollback()
+        raise
+    return batch, jobs
+
+
+def batch_progress(batch: OverlayBatch) -> Dict[str, Any]:
+    done = batch.completed + batch.failed
+    return {
+        "percent": round(done / batch.total * 100, 1) if batch.total else 100.0,
+        "completed": batch.completed,
+        "failed": batch.failed,
+        "total": batch.total,
+    }
+
+
+def record_batch_job(batch_id: str, succeeded: bool) -> None:
+    """
+    Count a finished video of a batch and publish the batch progress.
+    The counters are incremented in SQL, videos finish concurrently.
+    """
+    from app.celery_app import celery_app
+
+    db: Session = SessionLocal()
+    try:
+        counter = OverlayBatch.completed if succeeded else OverlayBatch.failed
+        db.execute(
+            update(OverlayBatch)
+            .where(OverlayBatch.id == batch_id)
+            .values({counter.key: counter + 1, "status": "RUNNING"})
+        )
+        db.commit()
+
+        progress = batch_progress(db.get(OverlayBatch, batch_id))
+    finally:
+        db.close()
+
+    celery_app.backend.store_result(batch_id, progress, "PROGRESS")
+    publish_job_event(batch_id, "PROGRESS", progress=progress)
+
+
+def finish_overlay_batch(batch_id: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Close a batch once all its videos are done.
+
+    Returns:
+        dict: Final counts, status (SUCCESS, PARTIAL or FAILURE) and the
+            error of every failed video.
+    """
+    db: Session = SessionLocal()
+    try:
+        batch = db.get(OverlayBatch, batch_id)
+        if batch.failed == 0:
+            batch.status = "SUCCESS"
+        elif batch.completed > 0:
+            batch.status = "PARTIAL"
+        else:
+            batch.status = "FAILURE"
+        batch.finished_at = datetime.now(timezone.utc)
+        db.commit()
+
+        return {
+            "batch_id": batch_id,
+            "status": batch.status,
+            **batch_progress(batch),
+            "errors": [
+                {"video_id": result["video_id"], "job_id": result["job_id"], "error": result["error"]}
+                for result in results
+                if result.get("error")
+            ],
+        }
+    finally:
+        db.close()
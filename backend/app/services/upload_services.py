@@ -0,0 +1,201 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, Any, List, Tuple
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+from app.utils import get_upload_path, write_stream, store_content_addressed, span
+from app.storage import get_storage
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+
+
+SESSION_SUBFOLDER = "sessions"
+MANIFEST_NAME = "manifest.json"
+MAX_PART_NUMBER = 10000
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _session_dir(upload_id: str) -> Path:
+    """
+    Return the folder holding the parts of an upload session.
+
+    Raises:
+        ValueError: If the upload_id is malformed or the session does not exist.
+    """
+    if not _UPLOAD_ID_RE.match(upload_id):
+        raise ValueError(f"Invalid upload session ID {upload_id}.")
+
+    path = get_upload_path(SESSION_SUBFOLDER) / upload_id
+    if not (path / MANIFEST_NAME).exists():
+        raise ValueError(f"No upload session found with ID {upload_id}.")
+    return path
+
+
+def _part_name(part_number: int) -> str:
+    return f"part_{part_number:05d}"
+
+
+def _list_parts(session_dir: Path) -> List[Dict[str, Any]]:
+    parts = []
+    for info_path in sorted(session_dir.glob("part_*.json")):
+        with open(info_path) as f:
+            parts.append(json.load(f))
+    return parts
+
+
+def create_upload_session(filename: str, subfolder: str = "videos", sha256: str | None = None) -> Dict[str, Any]:
+    """
+    Start a resumable chunked upload session.
+
+    Args:
+        filename (str): Original name of the file being uploaded.
+        subfolder (str): Uploads subfolder the assembled file will be stored in.
+        sha256 (str | None): Optional digest of the whole file, verified on completion.
+
+    Returns:
+        dict: The session manifest, including the generated upload_id.
+    """
+    upload_id = uuid.uuid4().hex
+    session_dir = get_upload_path(SESSION_SUBFOLDER) / upload_id
+    session_dir.mkdir(parents=True)
+
+    manifest = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "subfolder": subfolder,
+        "sha256": sha256,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(session_dir / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f)
+
+    return {**manifest, "parts": []}
+
+
+def get_upload_session(upload_id: str) -> Dict[str, Any]:
+    """
+    Return the session manifest along with the parts received so far,
+    so a client can resume after a dropped connection.
+    """
+    session_dir = _session_dir(upload_id)
+    with open(session_dir / MANIFEST_NAME) as f:
+        manifest = json.load(f)
+
+    return {**manifest, "parts": _list_parts(session_dir)}
+
+
+async def save_upload_part(
+    upload_id: str, part_number: int, chunks: AsyncIterator[bytes], expected_sha256: str | None = None
+) -> Dict[str, Any]:
+    """
+    Stream one part of a session to disk.
+
+    Re-sending a part number replaces the previous attempt, which makes
+    retries after a dropped connection safe. A part only becomes visible
+    in the session once it has been fully written.
+
+    Args:
+        upload_id (str): ID of the upload session.
+        part_number (int): 1-based position of the part in the file.
+        chunks (AsyncIterator[bytes]): Body of the part.
+        expected_sha256 (str | None): Optional client-side digest to verify the part against.
+
+    Returns:
+        dict: part_number, size and sha256 of the stored part.
+
+    Raises:
+        ValueError: If the session is unknown, the part number is out of range
+            or the digest does not match.
+    """
+    session_dir = _session_dir(upload_id)
+    if not 1 <= part_number <= MAX_PART_NUMBER:
+        raise ValueError(f"Part number must be between 1 and {MAX_PART_NUMBER}.")
+
+    part_path = session_dir / _part_name(part_number)
+    info_path = part_path.with_suffix(".json")
+    # hide the previous attempt while the new one is written
+    info_path.unlink(missing_ok=True)
+
+    with span("upload_write"):
+        digest, size = await write_stream(chunks, part_path)
+    if expected_sha256 and expected_sha256.lower() != digest:
+        part_path.unlink(missing_ok=True)
+        raise ValueError(f"Checksum mismatch for part {part_number}.")
+
+    info = {"part_number": part_number, "size": size, "sha256": digest}
+    with open(info_path, "w") as f:
+        json.dump(info, f)
+
+    return info
+
+
+def _assemble_parts(session_dir: Path, parts: List[Dict[str, Any]], tmp_path: Path) -> str:
+    """
+    Concatenate the parts into `tmp_path` chunk by chunk and hash the result.
+    """
+    hasher = hashlib.sha256()
+
+    try:
+        with open(tmp_path, "wb") as out:
+            for part in parts:
+                with open(session_dir / _part_name(part["part_number"]), "rb") as src:
+                    while chunk := src.read(settings.upload_chunk_size):
+                        hasher.update(chunk)
+                        out.write(chunk)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return hasher.hexdigest()
+
+
+async def complete_upload_session(upload_id: str) -> Tuple[str, str, Path, str]:
+    """
+    Assemble the parts of a session into the final upload and remove the session.
+
+    Returns:
+        original_filename (str): Name given when the session was created.
+        saved_filename (str): Name of the assembled file.
+        file_path (Path): Path of the assembled file.
+        digest (str): sha256 hex digest of the assembled file.
+
+    Raises:
+        ValueError: If the session is unknown, empty, has missing parts
+            or does not match the digest given at creation.
+    """
+    session = get_upload_session(upload_id)
+    parts = session["parts"]
+    if not parts:
+        raise ValueError("Upload session has no parts.")
+
+    expected = list(range(1, len(parts) + 1))
+    if [part["part_number"] for part in parts] != expected:
+        raise ValueError("Upload session has missing parts.")
+
+    session_dir = _session_dir(upload_id)
+    _, ext = os.path.splitext(session["filename"])
+    tmp_path = get_upload_path(session["subfolder"]) / f"{upload_id}.upload"
+
+    with span("upload_assemble"):
+        digest = await run_in_threadpool(_assemble_parts, session_dir, parts, tmp_path)
+    if session.get("sha256") and session["sha256"].lower() != digest:
+        tmp_path.unlink(missing_ok=True)
+        raise ValueError("Assembled file does not match the expected sha256.")
+    saved_filename, file_path = store_content_addressed(tmp_path, digest, ext)
+    await run_in_threadpool(shutil.rmtree, session_dir, True)
+    with span("storage_publish"):
+        await run_in_threadpool(get_storage().publish, file_path)
+
+    return session["filename"], saved_filename, file_path, digest
+
+
+def abort_upload_session(upload_id: str) -> None:
+    """
+    Discard an upload session and all of its parts.
+    """
+    shutil.rmtree(_session_dir(upload_id), ignore_errors=True)
@@ -1,27 +1,55 @@
 from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, insert, or_, select, tuple_, update
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError, NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError, NoResultFound
 from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
 from app.db.models import Video, TrimmedVideo
-from app.utils import get_upload_path, create_file_name
+from app.db.session import SessionLocal
+from app.utils import (
+    get_upload_path, create_file_name, iter_upload_file, write_stream, store_content_addressed,
+    SEGMENT_EXT, SOURCE_ENCODERS, source_encoder_args, keyframes_between, copy_keyframe_range, concat_segments,
+    run_ffmpeg, JobProgress, file_sha256, span, set_job_resolution
+)
+from app.services.blob_services import register_blob, acquire_blob
+from app.services.delivery_services import ensure_hls_package
+from app.services.probe_services import get_or_create_media_probe, get_media_probe, probe_media, probe_keyframes
+from app.storage import get_storage
+import base64
 import ffmpeg
+import json
+import logging
 import os
+import tempfile
 import uuid
 
-async def save_file(file: UploadFile, subfolder: str = "videos") -> str:
+logger = logging.getLogger(__name__)
+
+# trimmed clips are derived files, kept apart from the uploads so the lifecycle task can evict them
+TRIM_SUBFOLDER = "trims"
+
+async def save_file(file: UploadFile, subfolder: str = "videos") -> Tuple[str, Path, str]:
     '''
-    Save the uploaded file in local folder
+    Stream the uploaded file to the local folder in bounded chunks
+    and store it under its content-addressed name (sha256 digest).
+    A file already stored with the same content is reused. The file
+    is then published to the storage backend.
     '''
     upload_dir = get_upload_path(subfolder)
     _, ext = os.path.splitext(file.filename)
-    saved_filename = create_file_name(ext)
     
-    file_path = upload_dir / saved_filename
+    tmp_path = upload_dir / f"{uuid.uuid4().hex}.upload"
     
-    with open(file_path, 'wb') as f:
-        f.write(await file.read())
+    with span("upload_write"):
+        digest, _ = await write_stream(iter_upload_file(file), tmp_path)
+        saved_filename, file_path = store_content_addressed(tmp_path, digest, ext)
+    with span("storage_publish"):
+        await run_in_threadpool(get_storage().publish, file_path)
         
-    return saved_filename, file_path
+    return saved_filename, file_path, digest
 
 def get_video_by_id(db: Session, video_id: str) -> Video:
     """
@@ -55,45 +83,266 @@ def get_video_by_id(db: Session, video_id: str) -> Video:
         # Catch any other unexpected errors
         raise RuntimeError(f"An unexpected error occurred while fetching video ID {video_id}: {e}")
 
-def save_video_metadata(original_filename: str, saved_filename: str, db: Session, file_path: str) -> Video:
+def get_video_by_hash(db: Session, content_hash: str) -> Video | None:
+    """
+    Return the video already stored with the given content hash, if any.
+    """
+    return db.query(Video).filter(Video.content_hash == content_hash).first()
+
+
+# columns a listing can be reduced to
+VIDEO_LIST_FIELDS = ("id", "original_filename", "saved_filename", "content_hash", "size", "duration", "upload_time")
+
+
+def _as_naive_utc(value: datetime | None) -> datetime | None:
+    # upload times are stored as naive UTC, compare aware values in UTC
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _encode_cursor(upload_time: datetime | None, video_id: str) -> str:
+    payload = json.dumps([upload_time.isoformat() if upload_time else None, video_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime | None, str]:
+    try:
+        upload_time, video_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return _as_naive_utc(datetime.fromisoformat(upload_time)) if upload_time else None, video_id
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+
+async def list_videos(
+    db: AsyncSession,
+    limit: int,
+    cursor: str | None = None,
+    fields: List[str] | None = None,
+    filename: str | None = None,
+    content_hash: str | None = None,
+    uploaded_after: datetime | None = None,
+    uploaded_before: datetime | None = None,
+) -> Tuple[List[Dict[str, Any]], str | None]:
+    """
+    List videos newest first, one keyset page at a time.
+
+    Pages are read from the (upload_time, id) index, starting right after
+    the row the cursor points at, so every page costs the same however
+    deep the client has scrolled. Only the requested columns are selected.
+
+    Args:
+        db (AsyncSession): Async SQLAlchemy session.
+        limit (int): Page size.
+        cursor (str | None): next_cursor of the previous page.
+        fields (list | None): Columns to return, all of VIDEO_LIST_FIELDS if None.
+        filename (str | None): Case-insensitive substring of the original file name.
+        content_hash (str | None): Only the video with this content.
+        uploaded_after (datetime | None): Only videos uploaded at or after.
+        uploaded_before (datetime | None): Only videos uploaded before.
+
+    Returns:
+        items (list): Videos as dicts of the requested fields.
+        next_cursor (str | None): Cursor of the next page, None on the last page.
+
+    Raises:
+        ValueError: If a field or the cursor is invalid.
+    """
+    fields = list(fields or VIDEO_LIST_FIELDS)
+    unknown = set(fields) - set(VIDEO_LIST_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+
+    # the cursor is built from the sort key, select it even when not requested
+    columns = list(dict.fromkeys(fields + ["upload_time", "id"]))
+    query = select(*(getattr(Video, name) for name in columns))
+
+    if filename:
+        query = query.where(Video.original_filename.ilike(f"%{filename}%"))
+    if content_hash:
+        query = query.where(Video.content_hash == content_hash)
+    if uploaded_after:
+        query = query.where(Video.upload_time >= _as_naive_utc(uploaded_after))
+    if uploaded_before:
+        query = query.where(Video.upload_time < _as_naive_utc(uploaded_before))
+    if cursor:
+        cursor_time, cursor_id = _decode_cursor(cursor)
+        if cursor_time is None:
+            # rows without upload time come first, then all the others
+            query = query.where(
+                or_(and_(Video.upload_time.is_(None), Video.id < cursor_id), Video.upload_time.is_not(None))
+            )
+        else:
+            query = query.where(tuple_(Video.upload_time, Video.id) < tuple_(cursor_time, cursor_id))
+
+    # one extra row tells whether there is a next page
+    query = query.order_by(Video.upload_time.desc().nulls_first(), Video.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).mappings().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["upload_time"], rows[-1]["id"])
+
+    return [{name: row[name] for name in fields} for row in rows], next_cursor
+
+
+def save_video_metadata(
+    original_filename: str, saved_filename: str, db: Session, file_path: str, content_hash: str | None = None
+) -> Video:
     """
     Save a new video record to the database.
+    
+    A repeat upload of the same content returns the existing record
+    without probing the file again, also when both uploads are saved at
+    the same time. The probe result is stored per
+    content hash, so it is blocking: call it from the threadpool in async routes.
     """
     
     try:
-        response = ffmpeg.probe(str(file_path))
-        metadata = response.get('format')
-        
-        duration = metadata.get('duration')
-        size = metadata.get('size')
+        if content_hash:
+            existing_video = get_video_by_hash(db, content_hash)
+            if existing_video:
+                return existing_video
+            
+            blob = register_blob(db, content_hash, saved_filename)
+            saved_filename = blob.filename
+            file_path = str(get_upload_path() / saved_filename)
         
         existing_video = db.query(Video).filter(Video.saved_filename == saved_filename).first()
         if existing_video:
+            if content_hash:
+                # same content saved concurrently by another upload since the lookup above
+                return get_video_by_hash(db, content_hash) or existing_video
             raise ValueError(f"A video with saved_filename '{saved_filename}' already exists.")
+        
+        if content_hash:
+            media = get_or_create_media_probe(db, content_hash, file_path)
+            duration, size = media.duration, media.size
+        else:
+            metadata = probe_media(file_path)
+            duration, size = metadata['duration'], metadata['size']
 
         new_video = Video(
             id=uuid.uuid4().hex,
             original_filename=original_filename,
             saved_filename=saved_filename,
+            content_hash=content_hash,
             size=size,
             duration=duration,
             upload_time=datetime.now(timezone.utc)
         )
         db.add(new_video)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            existing_video = get_video_by_hash(db, content_hash) if content_hash else None
+            if existing_video is None:
+                raise
+            # inserted concurrently by another upload of the same content
+            return existing_video
         db.refresh(new_video)
         
+        if content_hash:
+            acquire_blob(db, blob)
+        
         return new_video
 
     except ffmpeg.Error as e:
-        print("FFmpeg error:", e.stderr.decode(errors="ignore"))
+        logger.error("FFmpeg error: %s", e.stderr.decode(errors="ignore"))
         raise
-    except Exception as e:
-        print("Unexpected error:", str(e))
+    except Exception:
+        logger.exception("Unexpected error saving video metadata")
         raise
     
     
-def trim_video(start_time: float, end_time: float, saved_filename: str) -> str:
+VALID_TRIM_MODES = {"copy", "accurate", "smart"}
+
+# gaps shorter than this around a keyframe are not worth a re-encoded segment
+KEYFRAME_EPSILON = 0.001
+
+
+def _trim_accurate(input_path: str | Path, output_path: Path, start_time: float, end_time: float, probe=None,
+                   progress: JobProgress | None = None) -> None:
+    """
+    Re-encode the whole range, frame accurate but slow.
+    """
+    video_args = source_encoder_args(probe) if probe and probe.video_codec in SOURCE_ENCODERS else {}
+    run_ffmpeg(
+        ffmpeg
+        .input(str(input_path), ss=start_time)
+        .output(str(output_path), t=end_time - start_time, **video_args),
+        progress
+    )
+
+
+def _trim_smart(input_path: str | Path, output_path: Path, start_time: float, end_time: float, probe,
+                progress: JobProgress | None = None) -> None:
+    """
+    Frame-accurate trim that only re-encodes the partial GOPs at both ends.
+
+    The range is split at the first and last keyframes inside it:
+    [start, first_key) and [last_key, end] are re-encoded with the source
+    codec, [first_key, last_key) is stream-copied. Audio is cut accurately
+    on its own (cheap to encode) and muxed with the concatenated video.
+    """
+    keyframes = probe.keyframes or probe_keyframes(str(input_path))
+    inner = keyframes_between(keyframes, start_time, end_time)
+    if len(inner) < 2:
+        # no complete GOP inside the range, nothing to copy
+        return _trim_accurate(input_path, output_path, start_time, end_time, probe, progress)
+
+    first_key, last_key = inner[0], inner[-1]
+    encode_args = source_encoder_args(probe)
+
+    with tempfile.TemporaryDirectory(dir=get_upload_path("tmp")) as tmp:
+        tmp_dir = Path(tmp)
+        segments, durations = [], []
+
+        if first_key - start_time > KEYFRAME_EPSILON:
+            head = tmp_dir / f"head{SEGMENT_EXT}"
+            run_ffmpeg(
+                ffmpeg
+                .input(str(input_path), ss=start_time)
+                .output(str(head), t=first_key - start_time, an=None, **encode_args),
+                progress, "head"
+            )
+            segments.append(head)
+            durations.append(first_key - start_time)
+
+        middle = tmp_dir / f"middle{SEGMENT_EXT}"
+        copy_keyframe_range(input_path, first_key, last_key, middle)
+        if progress:
+            progress.update("middle", last_key - first_key)
+        segments.append(middle)
+        durations.append(last_key - first_key)
+
+        if end_time - last_key > KEYFRAME_EPSILON:
+            tail = tmp_dir / f"tail{SEGMENT_EXT}"
+            run_ffmpeg(
+                ffmpeg
+                .input(str(input_path), ss=last_key)
+                .output(str(tail), t=end_time - last_key, an=None, **encode_args),
+                progress, "tail"
+            )
+            segments.append(tail)
+            durations.append(end_time - last_key)
+
+        audio = None
+        if probe.audio_codec:
+            audio = tmp_dir / "audio.m4a"
+            run_ffmpeg(
+                ffmpeg
+                .input(str(input_path), ss=start_time)
+                .output(str(audio), t=end_time - start_time, vn=None, acodec="aac")
+            )
+
+        concat_segments(segments, output_path, audio_path=audio, durations=durations)
+
+
+def trim_video(start_time: float, end_time: float, saved_filename: str, mode: str = "copy", probe=None,
+               progress: JobProgress | None = None) -> str:
     """
     Trim a video using ffmpeg-python.
 
@@ -101,34 +350,166 @@ def trim_video(start_time: float, end_time: float, saved_filename: str) -> str:
         saved_filename (str): uploaded file name.
         start_time (float): Start time in seconds.
         end_time (float): End time in seconds.
+        mode (str): "copy" stream-copies and snaps to keyframes (fastest),
+            "accurate" re-encodes the whole range, "smart" re-encodes only
+            the partial GOPs at both ends and copies the rest.
+        probe (MediaProbe): Stored probe of the video, required for "smart".
+        progress (JobProgress | None): Receives the ffmpeg progress reports.
+
+    The source is read from the storage backend (streamed when it is not
+    on this node), the trimmed file is written to the trims folder.
     """
-    
+    if mode not in VALID_TRIM_MODES:
+        raise ValueError(f"Invalid trim mode '{mode}'.")
 
     try:
-        upload_dir = get_upload_path()
         _, ext = os.path.splitext(saved_filename)
         trimmed_filename = create_file_name(ext)
-        input_path = upload_dir / saved_filename
-        trimmed_path = upload_dir / trimmed_filename
-        
-        # print(f"Trimmed video saved to: \n{trimmed_path}\n{input_path}")
+        input_path = get_storage().input_url(get_upload_path() / saved_filename)
+        trimmed_path = get_upload_path(TRIM_SUBFOLDER) / trimmed_filename
         
-        # trim the video        
-        (
-            ffmpeg
-            .input(str(input_path), ss=start_time, to=end_time)
-            .output(str(trimmed_path), c='copy')  # use copy to avoid re-encoding
-            .overwrite_output()
-            .run(quiet=True)
-        )
+        if mode == "smart" and probe is not None and probe.video_codec in SOURCE_ENCODERS:
+            _trim_smart(input_path, trimmed_path, start_time, end_time, probe, progress)
+        elif mode in ("smart", "accurate"):
+            _trim_accurate(input_path, trimmed_path, start_time, end_time, probe, progress)
+        else:
+            # trim the video        
+            run_ffmpeg(
+                ffmpeg
+                .input(str(input_path), ss=start_time, to=end_time)
+                .output(str(trimmed_path), c='copy'),  # use copy to avoid re-encoding
+                progress
+            )
         
         return str(trimmed_path)
     
     except ffmpeg.Error as e:
-        print("Error trimming video:", e.stderr.decode())
+        logger.error("Error trimming video: %s", e.stderr.decode(errors="ignore"))
         raise
     
-def save_trim_video_metadata(original_file_id: str, saved_filename: str, db: Session) -> TrimmedVideo:
+def _round_time(value: float) -> float:
+    # trims are memoized to the millisecond
+    return round(float(value), 3)
+
+
+def get_cached_trim(db: Session, source_hash: str | None, start_time: float, end_time: float, mode: str) -> TrimmedVideo | None:
+    """
+    Return a previous trim of the same content, range and mode whose
+    output is still stored, if any.
+    """
+    if not source_hash:
+        return None
+
+    candidates = (
+        db.query(TrimmedVideo)
+        .filter(
+            TrimmedVideo.source_hash == source_hash,
+            TrimmedVideo.start_time == _round_time(start_time),
+            TrimmedVideo.end_time == _round_time(end_time),
+            TrimmedVideo.mode == mode,
+            TrimmedVideo.evicted_at.is_(None),
+        )
+        .order_by(TrimmedVideo.upload_time.desc())
+    )
+    for trimmed in candidates:
+        if get_storage().exists(Path(trimmed.saved_filename)):
+            return trimmed
+    return None
+
+
+def get_cached_trims(
+    db: Session, source_hash: str | None, ranges: List[Tuple[float, float]], mode: str
+) -> Dict[Tuple[float, float], TrimmedVideo]:
+    """
+    get_cached_trim for many ranges of the same content in one query.
+
+    Returns:
+        dict: Previous trims still stored, by rounded (start_time, end_time).
+    """
+    if not source_hash or not ranges:
+        return {}
+
+    keys = {(_round_time(start), _round_time(end)) for start, end in ranges}
+    candidates = (
+        db.query(TrimmedVideo)
+        .filter(
+            TrimmedVideo.source_hash == source_hash,
+            TrimmedVideo.mode == mode,
+            tuple_(TrimmedVideo.start_time, TrimmedVideo.end_time).in_(keys),
+            TrimmedVideo.evicted_at.is_(None),
+        )
+        .order_by(TrimmedVideo.upload_time.desc())
+    )
+    cached = {}
+    for trimmed in candidates:
+        key = (trimmed.start_time, trimmed.end_time)
+        if key not in cached and get_storage().exists(Path(trimmed.saved_filename)):
+            cached[key] = trimmed
+    return cached
+
+
+def touch_trimmed_output(db: Session, saved_filename: str) -> None:
+    """
+    Mark a trimmed clip as recently used, the lifecycle task evicts the least recently used.
+    """
+    db.execute(
+        update(TrimmedVideo)
+        .where(TrimmedVideo.saved_filename == saved_filename)
+        .values(last_accessed=datetime.now(timezone.utc))
+    )
+    db.commit()
+
+
+def get_trimmed_video_by_job(db: Session, job_id: str) -> TrimmedVideo | None:
+    """
+    Return the clip of a single trim job, None for unknown and batch trim jobs.
+    """
+    return (
+        db.query(TrimmedVideo)
+        .filter(TrimmedVideo.job_id == job_id, TrimmedVideo.batch_index.is_(None))
+        .first()
+    )
+
+
+def is_batch_trim_job(db: Session, job_id: str) -> bool:
+    return (
+        db.query(TrimmedVideo.id)
+        .filter(TrimmedVideo.job_id == job_id, TrimmedVideo.batch_index.is_not(None))
+        .first()
+    ) is not None
+
+
+def get_batch_trim_clips(db: Session, job_id: str) -> List[TrimmedVideo]:
+    """
+    Return the clips of a batch trim job in request order.
+    """
+    return (
+        db.query(TrimmedVideo)
+        .filter(TrimmedVideo.job_id == job_id)
+        .order_by(TrimmedVideo.batch_index)
+        .all()
+    )
+
+
+def get_batch_trim_clip(db: Session, job_id: str, index: int) -> TrimmedVideo | None:
+    return (
+        db.query(TrimmedVideo)
+        .filter(TrimmedVideo.job_id == job_id, TrimmedVideo.batch_index == index)
+        .first()
+    )
+
+
+def save_trim_video_metadata(
+    original_file_id: str,
+    saved_filename: str,
+    db: Session,
+    job_id: str | None = None,
+    source_hash: str | None = None,
+    start_time: float | None = None,
+    end_time: float | None = None,
+    mode: str | None = None,
+    output_hash: str | None = None,
+) -> TrimmedVideo:
     """
     Save a trimmed video record to the database.
     """
@@ -137,7 +518,13 @@ def save_trim_video_metadata(original_file_id: str, saved_filename: str, db: Ses
             id=uuid.uuid4().hex,
             original_file_id=original_file_id,
             saved_filename=saved_filename,
-            upload_time=datetime.now(timezone.utc)
+            upload_time=datetime.now(timezone.utc),
+            job_id=job_id,
+            source_hash=source_hash,
+            start_time=_round_time(start_time) if start_time is not None else None,
+            end_time=_round_time(end_time) if end_time is not None else None,
+            mode=mode,
+            output_hash=output_hash,
         )
         
         db.add(new_video)
@@ -149,10 +536,274 @@ def save_trim_video_metadata(original_file_id: str, saved_filename: str, db: Ses
     except:
         db.rollback()
         raise
-    
-    
-    
-    
-    
-    
-    
\ No newline at end of file
+
+
+def process_trim_job(job_id: str, video_id: str, start_time: float, end_time: float, mode: str = "copy",
+                     output_format: str = "mp4") -> dict:
+    """
+    Run a queued trim and record its result under `job_id`.
+
+    The memo is checked again here, an identical trim may have finished
+    while this job was waiting in the queue. With output_format "hls"
+    the clip is also packaged for streaming.
+    """
+    db: Session = SessionLocal()
+    try:
+        video = get_video_by_id(db, video_id)
+        probe = get_media_probe(db, video.content_hash)
+        if probe:
+            set_job_resolution(probe.width, probe.height)
+
+        cached = get_cached_trim(db, video.content_hash, start_time, end_time, mode)
+        if cached:
+            saved_filename = cached.saved_filename
+            output_hash = cached.output_hash
+        else:
+            progress = JobProgress(job_id, total=end_time - start_time)
+            saved_filename = trim_video(
+                start_time, end_time, video.saved_filename, mode=mode, probe=probe, progress=progress
+            )
+            output_hash = None
+
+        with span("result_save"):
+            if not cached:
+                get_storage().publish(Path(saved_filename))
+            output_hash = output_hash or file_sha256(saved_filename)
+            trimmed = save_trim_video_metadata(
+                original_file_id=video.id,
+                saved_filename=saved_filename,
+                db=db,
+                job_id=job_id,
+                source_hash=video.content_hash,
+                start_time=start_time,
+                end_time=end_time,
+                mode=mode,
+                output_hash=output_hash,
+            )
+        if output_format == "hls":
+            ensure_hls_package(output_hash, Path(saved_filename))
+        return {"job_id": job_id, "trimmed_video_id": trimmed.id, "cached": cached is not None}
+    finally:
+        db.close()
+
+
+VALID_BATCH_TRIM_MODES = {"copy", "accurate"}
+
+
+def trim_video_batch(
+    ranges: List[Tuple[float, float]], saved_filename: str, mode: str = "copy", probe=None,
+    progress: JobProgress | None = None
+) -> List[str]:
+    """
+    Cut several ranges of one video in a single ffmpeg run.
+
+    The source is opened once and every clip is an output of the same
+    command. "copy" demuxes the source once and stream-copies each range,
+    starting on the keyframe at or before its start. "accurate" decodes
+    the covered span once, splits the frames to one trim per range and
+    re-encodes every clip with the source codec.
+
+    Args:
+        ranges (list): (start_time, end_time) of each clip, in seconds.
+        saved_filename (str): uploaded file name.
+        mode (str): "copy" or "accurate".
+        probe (MediaProbe): Stored probe of the video.
+        progress (JobProgress | None): Receives the ffmpeg progress reports.
+
+    Returns:
+        list: Paths of the clips, in the order of `ranges`.
+    """
+    if mode not in VALID_BATCH_TRIM_MODES:
+        raise ValueError(f"Invalid batch trim mode '{mode}'.")
+
+    _, ext = os.path.splitext(saved_filename)
+    input_path = get_storage().input_url(get_upload_path() / saved_filename)
+    trims_dir = get_upload_path(TRIM_SUBFOLDER)
+    clip_paths = [trims_dir / create_file_name(ext) for _ in ranges]
+
+    outputs = []
+    if mode == "copy":
+        keyframes = (probe.keyframes if probe else None) or probe_keyframes(str(input_path))
+        source = ffmpeg.input(str(input_path))
+        for (start_time, end_time), clip_path in zip(ranges, clip_paths):
+            # a copied clip has to start on a keyframe
+            start_key = max((k for k in keyframes if k <= start_time), default=0.0)
+            outputs.append(source.output(str(clip_path), ss=start_key, to=end_time, c="copy"))
+    else:
+        # decode only the span covering all the clips
+        span_start = min(start for start, _ in ranges)
+        span_end = max(end for _, end in ranges)
+        source = ffmpeg.input(str(input_path), ss=span_start, t=span_end - span_start)
+        has_audio = bool(probe and probe.audio_codec)
+        video_args = source_encoder_args(probe) if probe and probe.video_codec in SOURCE_ENCODERS else {}
+
+        videos = source.video.filter_multi_output("split", len(ranges))
+        audios = source.audio.filter_multi_output("asplit", len(ranges)) if has_audio else None
+        for idx, ((start_time, end_time), clip_path) in enumerate(zip(ranges, clip_paths)):
+            start, end = start_time - span_start, end_time - span_start
+            streams = [videos[idx].trim(start=start, end=end).setpts("PTS-STARTPTS")]
+            if has_audio:
+                streams.append(audios[idx].filter("atrim", start=start, end=end).filter("asetpts", "PTS-STARTPTS"))
+            outputs.append(ffmpeg.output(*streams, str(clip_path), **video_args))
+
+    try:
+        run_ffmpeg(ffmpeg.merge_outputs(*outputs), progress)
+    except ffmpeg.Error as e:
+        logger.error("Error trimming video: %s", e.stderr.decode(errors="ignore"))
+        for clip_path in clip_paths:
+            clip_path.unlink(missing_ok=True)
+        raise
+
+    return [str(clip_path) for clip_path in clip_paths]
+
+
+def save_trim_videos_bulk(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert many TrimmedVideo rows with a single executemany.
+    """
+    try:
+        db.execute(insert(TrimmedVideo), rows)
+        db.commit()
+    except:
+        db.rollback()
+        raise
+
+
+def process_batch_trim_job(job_id: str, video_id: str, ranges: List[List[float]], mode: str = "copy") -> dict:
+    """
+    Run a queued batch trim and record every clip under `job_id`.
+
+    Ranges already trimmed from the same content are reused, identical
+    ranges are cut once, the rest come out of one trim_video_batch run.
+
+    Returns:
+        dict: The batch manifest, clips listed in request order.
+    """
+    db: Session = SessionLocal()
+    try:
+        video = get_video_by_id(db, video_id)
+        probe = get_media_probe(db, video.content_hash)
+        if probe:
+            set_job_resolution(probe.width, probe.height)
+        keys = [(_round_time(start), _round_time(end)) for start, end in ranges]
+
+        cached = get_cached_trims(db, video.content_hash, keys, mode)
+        outputs = {key: (trimmed.saved_filename, trimmed.output_hash) for key, trimmed in cached.items()}
+
+        missing = [key for key in dict.fromkeys(keys) if key not in outputs]
+        if missing:
+            total = max(end for _, end in missing)
+            if mode == "accurate":
+                total -= min(start for start, _ in missing)
+            progress = JobProgress(job_id, total=total)
+            clip_paths = trim_video_batch(missing, video.saved_filename, mode=mode, probe=probe, progress=progress)
+            with span("result_save"):
+                for key, clip_path in zip(missing, clip_paths):
+                    get_storage().publish(Path(clip_path))
+                    outputs[key] = (clip_path, file_sha256(clip_path))
+
+        upload_time = datetime.now(timezone.utc)
+        rows = []
+        for idx, key in enumerate(keys):
+            saved_filename, output_hash = outputs[key]
+            rows.append({
+                "id": uuid.uuid4().hex,
+                "original_file_id": video.id,
+                "saved_filename": saved_filename,
+                "upload_time": upload_time,
+                "job_id": job_id,
+                "source_hash": video.content_hash,
+                "start_time": key[0],
+                "end_time": key[1],
+                "mode": mode,
+                "output_hash": output_hash,
+                "batch_index": idx,
+            })
+        with span("result_save"):
+            save_trim_videos_bulk(db, rows)
+
+        return {
+            "job_id": job_id,
+            "video_id": video.id,
+            "mode": mode,
+            "cached": len(cached),
+            "clips": [
+                {
+                    "index": row["batch_index"],
+                    "start_time": row["start_time"],
+                    "end_time": row["end_time"],
+                    "trimmed_video_id": row["id"],
+                    "saved_filename": os.path.basename(row["saved_filename"]),
+                }
+                for row in rows
+            ],
+        }
+    finally:
+        db.close()
+
+
+def restore_trim_output(job_id: str, trim_job_id: str) -> List[str]:
+    """
+    Cut the evicted clips of a trim (or batch trim) job again from the
+    source video, or reuse identical trims made since. Every job that
+    shared an evicted clip gets the restored one.
+
+    Args:
+        job_id (str): ID of the restore job.
+        trim_job_id (str): ID of the trim job whose clips were evicted.
+
+    Returns:
+        list: Paths of the restored clips.
+
+    Raises:
+        ValueError: If the job is unknown or its source video is gone.
+    """
+    db: Session = SessionLocal()
+    try:
+        clips = get_batch_trim_clips(db, trim_job_id)
+        if not clips:
+            raise ValueError(f"Trim job {trim_job_id} not found")
+
+        evicted = {clip.saved_filename: clip for clip in clips if clip.evicted_at is not None}
+        if not evicted:
+            return []
+
+        video = db.query(Video).filter(Video.id == clips[0].original_file_id).first()
+        if video is None:
+            raise ValueError(f"Source video of trim job {trim_job_id} is gone")
+        probe = get_media_probe(db, video.content_hash)
+        if probe:
+            set_job_resolution(probe.width, probe.height)
+
+        restored = []
+        for old_filename, clip in evicted.items():
+            cached = get_cached_trim(db, video.content_hash, clip.start_time, clip.end_time, clip.mode)
+            if cached:
+                saved_filename, output_hash = cached.saved_filename, cached.output_hash
+            else:
+                progress = JobProgress(job_id, total=clip.end_time - clip.start_time)
+                saved_filename = trim_video(
+                    clip.start_time, clip.end_time, video.saved_filename, mode=clip.mode, probe=probe,
+                    progress=progress
+                )
+                with span("result_save"):
+                    get_storage().publish(Path(saved_filename))
+                    output_hash = file_sha256(saved_filename)
+
+            db.execute(
+                update(TrimmedVideo)
+                .where(TrimmedVideo.saved_filename == old_filename)
+                .values(
+                    saved_filename=saved_filename,
+                    output_hash=output_hash,
+                    evicted_at=None,
+                    last_accessed=datetime.now(timezone.utc),
+                )
+            )
+            db.commit()
+            restored.append(saved_filename)
+
+        logger.info("Restored %d clip(s) of trim job %s", len(restored), trim_job_id)
+        return restored
+    finally:
+        db.close()
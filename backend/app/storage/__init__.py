@@ -0,0 +1,24 @@
+from app.config import settings
+from .base import Storage
+from .local import LocalStorage, iter_file_range
+from .s3 import S3Storage
+
+STORAGE_BACKENDS = {
+    "local": LocalStorage,
+    "s3": S3Storage,
+}
+
+_storage: Storage | None = None
+
+
+def get_storage() -> Storage:
+    """
+    Return the storage backend picked by `storage_backend`, created on first use.
+    """
+    global _storage
+    if _storage is None:
+        backend = STORAGE_BACKENDS.get(settings.storage_backend)
+        if backend is None:
+            raise ValueError(f"Unknown storage backend '{settings.storage_backend}'.")
+        _storage = backend()
+    return _storage
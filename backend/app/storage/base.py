@@ -0,0 +1,89 @@
+from pathlib import Path
+from typing import Iterator, Tuple
+
+
+class Storage:
+    """
+    Where uploads and results are kept.
+
+    Files are named by their path in the local uploads folder (e.g.
+    uploads/videos/<hash>.mp4), a remote backend stores them under the
+    same relative key. The uploads folder is then a cache of the node:
+    a file written there is published to the store, and a file missing
+    there is read from the store.
+    """
+
+    def publish(self, path: Path) -> None:
+        """
+        Make a file written to the uploads folder available to every node.
+        """
+        raise NotImplementedError
+
+    def exists(self, path: Path) -> bool:
+        raise NotImplementedError
+
+    def size(self, path: Path) -> int | None:
+        """
+        Size of a stored file in bytes, None if it is not stored.
+        """
+        raise NotImplementedError
+
+    def input_url(self, path: Path) -> str:
+        """
+        Location ffmpeg reads a stored file from: the local path when the
+        file is on this node, a URL streaming it from the store otherwise.
+        """
+        raise NotImplementedError
+
+    def download_url(self, path: Path, filename: str | None = None) -> str | None:
+        """
+        URL a client can download the file from directly, None if it has
+        to go through the API.
+        """
+        return None
+
+    def iter_range(self, path: Path, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        """
+        Yield the bytes [start, end] (inclusive, to the end of the file if
+        `end` is None) of a stored file in bounded chunks.
+        """
+        raise NotImplementedError
+
+    def fetch(self, path: Path) -> Path:
+        """
+        Make sure a stored file is in the local uploads folder and return its path.
+
+        Raises:
+            FileNotFoundError: If the file is not stored.
+        """
+        raise NotImplementedError
+
+    def touch(self, path: Path) -> None:
+        """
+        Record a use of a stored file, cache folders of the store expire by last use.
+        """
+        raise NotImplementedError
+
+    def list_files(self, folder: Path) -> Iterator[Tuple[Path, int, float]]:
+        """
+        Yield the files the store holds under a folder (subfolders too):
+        path, size in bytes and time of last use (epoch seconds), as seen
+        by every node.
+        """
+        raise NotImplementedError
+
+    def delete(self, path: Path) -> None:
+        """
+        Remove a file from this node and from the store, if present.
+        """
+        raise NotImplementedError
+
+    def drop_local(self, path: Path) -> bool:
+        """
+        Free this node's copy of a file the store still holds, it is read
+        from the store when needed again.
+
+        Returns:
+            bool: True if the local copy was removed.
+        """
+        return False
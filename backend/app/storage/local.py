@@ -0,0 +1,73 @@
+from pathlib import Path
+from typing import Iterator, Tuple
+import os
+
+from app.config import settings
+from .base import Storage
+
+
+def iter_file_range(path: Path, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+    """
+    Yield the bytes [start, end] of a local file in bounded chunks.
+    """
+    remaining = None if end is None else end - start + 1
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining is None or remaining > 0:
+            size = settings.upload_chunk_size if remaining is None else min(settings.upload_chunk_size, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class LocalStorage(Storage):
+    """
+    Files stay in the uploads folder, API and workers share that disk.
+    """
+
+    def publish(self, path: Path) -> None:
+        pass
+
+    def exists(self, path: Path) -> bool:
+        return Path(path).exists()
+
+    def size(self, path: Path) -> int | None:
+        try:
+            return Path(path).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def input_url(self, path: Path) -> str:
+        return str(path)
+
+    def iter_range(self, path: Path, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        return iter_file_range(Path(path), start, end)
+
+    def fetch(self, path: Path) -> Path:
+        path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(f"{path} is not stored.")
+        return path
+
+    def touch(self, path: Path) -> None:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def list_files(self, folder: Path) -> Iterator[Tuple[Path, int, float]]:
+        if not Path(folder).is_dir():
+            return
+        for entry in Path(folder).rglob("*"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.is_file():
+                yield entry, stat.st_size, stat.st_mtime
+
+    def delete(self, path: Path) -> None:
+        Path(path).unlink(missing_ok=True)
@@ -0,0 +1,160 @@
+from pathlib import Path
+from typing import Iterator, Tuple
+import logging
+import os
+import time
+import uuid
+
+from app.config import settings
+from app.utils import get_upload_path
+from .base import Storage
+from .local import iter_file_range
+
+logger = logging.getLogger(__name__)
+
+
+class S3Storage(Storage):
+    """
+    Files are kept in an S3-compatible bucket (AWS S3, MinIO...) under
+    `s3_prefix` + their path relative to the uploads folder, which only
+    caches them on each node.
+
+    Uploads are streamed from disk in `s3_chunk_size` parts (multipart
+    above one part), reads are ranged, and ffmpeg reads files missing on
+    the node straight from presigned URLs instead of downloading them first.
+    """
+
+    def __init__(self):
+        # only needed with this backend
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+
+        if not settings.s3_bucket:
+            raise ValueError("s3_bucket must be set to use the s3 storage backend.")
+
+        self.bucket = settings.s3_bucket
+        self.prefix = settings.s3_prefix
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.s3_endpoint_url,
+            region_name=settings.s3_region,
+            aws_access_key_id=settings.s3_access_key_id,
+            aws_secret_access_key=settings.s3_secret_access_key,
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.s3_chunk_size,
+            multipart_chunksize=settings.s3_chunk_size,
+            io_chunksize=settings.upload_chunk_size,
+        )
+
+    def key(self, path: Path) -> str:
+        relative = Path(path).resolve().relative_to(get_upload_path("").resolve())
+        return self.prefix + relative.as_posix()
+
+    def _head(self, path: Path) -> dict | None:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.key(path))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def _presign(self, path: Path, **params) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self.key(path), **params},
+            ExpiresIn=settings.s3_presign_seconds,
+        )
+
+    def publish(self, path: Path) -> None:
+        # content-addressed files come back with every duplicate upload
+        head = self._head(path)
+        if head and head["ContentLength"] == Path(path).stat().st_size:
+            return
+        self.client.upload_file(str(path), self.bucket, self.key(path), Config=self.transfer_config)
+        logger.debug("Published %s to s3://%s/%s", path, self.bucket, self.key(path))
+
+    def exists(self, path: Path) -> bool:
+        return Path(path).exists() or self._head(path) is not None
+
+    def size(self, path: Path) -> int | None:
+        if Path(path).exists():
+            return Path(path).stat().st_size
+        head = self._head(path)
+        return head["ContentLength"] if head else None
+
+    def input_url(self, path: Path) -> str:
+        if Path(path).exists():
+            return str(path)
+        return self._presign(path)
+
+    def download_url(self, path: Path, filename: str | None = None) -> str | None:
+        if filename:
+            return self._presign(path, ResponseContentDisposition=f'attachment; filename="{filename}"')
+        return self._presign(path)
+
+    def iter_range(self, path: Path, start: int = 0, end: int | None = None) -> Iterator[bytes]:
+        if Path(path).exists():
+            yield from iter_file_range(Path(path), start, end)
+            return
+
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(Bucket=self.bucket, Key=self.key(path), Range=byte_range)["Body"]
+        try:
+            yield from body.iter_chunks(settings.upload_chunk_size)
+        finally:
+            body.close()
+
+    def fetch(self, path: Path) -> Path:
+        path = Path(path)
+        if path.exists():
+            return path
+        if self._head(path) is None:
+            raise FileNotFoundError(f"{path} is not stored.")
+
+        # download aside and rename, a reader never sees a partial file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.download")
+        try:
+            self.client.download_file(self.bucket, self.key(path), str(tmp_path), Config=self.transfer_config)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return path
+
+    def touch(self, path: Path) -> None:
+        path = Path(path)
+        if path.exists():
+            os.utime(path)
+        head = self._head(path)
+        # copying the object onto itself moves its LastModified, done at most once per s3_touch_interval
+        if head and time.time() - head["LastModified"].timestamp() > settings.s3_touch_interval:
+            key = self.key(path)
+            self.client.copy_object(
+                Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": key},
+                MetadataDirective="REPLACE", Metadata=head.get("Metadata", {}),
+            )
+
+    def list_files(self, folder: Path) -> Iterator[Tuple[Path, int, float]]:
+        prefix = self.key(folder).rstrip("/") + "/"
+        uploads = get_upload_path("")
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                yield uploads / item["Key"][len(self.prefix):], item["Size"], item["LastModified"].timestamp()
+
+    def delete(self, path: Path) -> None:
+        Path(path).unlink(missing_ok=True)
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(path))
+
+    def drop_local(self, path: Path) -> bool:
+        path = Path(path)
+        if not path.exists():
+            return False
+        # only drop copies the store holds in full
+        head = self._head(path)
+        if not head or head["ContentLength"] != path.stat().st_size:
+            return False
+        path.unlink(missing_ok=True)
+        return True
@@ -1,2 +1,18 @@
-from .file_util import get_upload_path, create_file_name
-from .task_status import get_task_status
+from .file_util import (
+    get_upload_path, create_file_name, content_addressed_name, iter_upload_file, write_stream, file_sha256,
+    store_content_addressed
+)
+from .ffmpeg_util import (
+    SEGMENT_EXT, SOURCE_ENCODERS, HLS_PLAYLIST, HLS_INIT_SEGMENT, MP4_AUDIO_CODECS, run_ffmpeg, source_encoder_args,
+    ffmpeg_thread_budget, thread_args, get_encoder_profile, profile_video_args, profile_audio_args, scale_to_height,
+    keyframes_between, split_at_keyframes, keyframe_windows, copy_keyframe_range, concat_segments, package_hls
+)
+from .task_status import get_task_status, get_task_statuses, mark_task_success
+from .job_events import (
+    TERMINAL_STATES, JobProgress, job_channel, publish_job_event, stream_job_events, claim_job, release_job
+)
+from .text_util import TEXT_CACHE_SUBFOLDER, get_font_path, parse_color, rasterize_text, text_shaping_available
+from .metrics import (
+    resolution_label, current_job, start_job, finish_job, set_job_resolution, span, observe_stage,
+    observe_ffmpeg_run, observe_queue_wait, metrics_registry
+)
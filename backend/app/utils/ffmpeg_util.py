@@ -0,0 +1,340 @@
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+import ffmpeg
+import os
+import subprocess
+import tempfile
+
+from app.config import settings
+from .metrics import span, current_job, observe_ffmpeg_run
+
+
+# container for intermediate segments, MPEG-TS keeps parameter sets in-band
+# so re-encoded and copied segments can be concatenated
+SEGMENT_EXT = ".ts"
+
+# ffmpeg encoder used to re-encode a part of a stream with the source codec
+SOURCE_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "mpeg4": "mpeg4",
+    "vp9": "libvpx-vp9",
+    "av1": "libaom-av1",
+}
+
+
+def ffmpeg_thread_budget() -> int:
+    """
+    Cores the ffmpeg processes of one job may share: `ffmpeg_threads`,
+    set per worker by start_celery.py, or every core when unset.
+    """
+    return settings.ffmpeg_threads or os.cpu_count() or 1
+
+
+def thread_args() -> Dict[str, Any]:
+    """
+    Output option capping an encoder at the worker's thread budget,
+    nothing when ffmpeg may pick (one thread per core).
+    """
+    return {"threads": settings.ffmpeg_threads} if settings.ffmpeg_threads else {}
+
+
+def _progress_value(value: str | None) -> float | None:
+    # ffmpeg reports "N/A" until it knows, and speed as "1.5x"
+    try:
+        return float(value.rstrip("x"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def run_ffmpeg(stream, progress=None, part: str = "main", stage: str = "ffmpeg") -> None:
+    """
+    Run an ffmpeg-python stream spec, overwriting the output.
+
+    When a JobProgress is given, ffmpeg writes its progress to a pipe
+    (`-progress pipe:1`) and every report (output time, fps, speed) is
+    forwarded to `progress` under `part`. Inside a job, the reports are
+    read even without `progress`, so the final speed and fps of the run
+    end up in the job's metrics. The run is timed as the `stage` span.
+    With a thread budget set, filter graphs are held to it as well.
+
+    Raises:
+        ffmpeg.Error: If ffmpeg fails, with its stderr attached.
+    """
+    stream = stream.overwrite_output()
+    if settings.ffmpeg_threads:
+        threads = str(settings.ffmpeg_threads)
+        stream = stream.global_args("-filter_threads", threads, "-filter_complex_threads", threads)
+    with span(stage):
+        if progress is None and current_job() is None:
+            try:
+                stream.run(quiet=True)
+            except ffmpeg.Error:
+                observe_ffmpeg_run(None, None, failed=True)
+                raise
+            return
+
+        args = stream.compile()
+        args[1:1] = ["-progress", "pipe:1", "-nostats"]
+
+        # stderr goes to a file so a chatty ffmpeg can't block on a full pipe
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr)
+            report, fps, speed = {}, None, None
+            for line in process.stdout:
+                key, _, value = line.decode(errors="replace").strip().partition("=")
+                report[key] = value
+                if key != "progress":
+                    continue
+                fps, speed = _progress_value(report.get("fps")), _progress_value(report.get("speed"))
+                out_time = _progress_value(report.get("out_time_us"))
+                if progress is not None and out_time is not None:
+                    progress.update(part, out_time / 1_000_000, fps=fps, speed=speed)
+                report = {}
+
+            if process.wait() != 0:
+                observe_ffmpeg_run(None, None, failed=True)
+                stderr.seek(0)
+                raise ffmpeg.Error("ffmpeg", b"", stderr.read())
+
+        observe_ffmpeg_run(speed, fps)
+
+
+def source_encoder_args(probe) -> Dict[str, Any]:
+    """
+    Output options that re-encode video with the same codec and pixel
+    format as the source, so re-encoded parts can be stream-concatenated
+    with parts copied from the source.
+
+    Args:
+        probe (MediaProbe): Stored probe of the source.
+
+    Raises:
+        ValueError: If the source codec can't be re-encoded.
+    """
+    vcodec = SOURCE_ENCODERS.get(probe.video_codec)
+    if vcodec is None:
+        raise ValueError(f"Can't re-encode '{probe.video_codec}' video to match the source.")
+
+    args = {"vcodec": vcodec, **thread_args()}
+    if probe.pix_fmt:
+        args["pix_fmt"] = probe.pix_fmt
+    if vcodec in ("libx264", "libx265"):
+        # re-encoded parts are short, favour quality so they blend with the copied ones
+        args.update(preset="veryfast", crf=18)
+    return args
+
+
+# audio codecs an MP4 output carries as is, anything else is re-encoded
+MP4_AUDIO_CODECS = {"aac", "mp3", "ac3", "eac3", "alac", "opus", "flac"}
+
+
+def get_encoder_profile(name: str | None = None) -> Dict[str, Any]:
+    """
+    Return the settings of a named encoder profile, the default one if
+    `name` is None.
+
+    Raises:
+        ValueError: If no profile has this name.
+    """
+    name = name or settings.default_encoder_profile
+    profile = settings.encoder_profiles.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown encoder profile '{name}'.")
+    return profile
+
+
+def profile_video_args(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Output options encoding video with a profile's codec, preset, CRF,
+    pixel format and thread count. A profile without a thread count
+    uses the worker's thread budget.
+    """
+    keys = ("vcodec", "preset", "crf", "pix_fmt")
+    args = {key: profile[key] for key in keys if profile.get(key) is not None}
+    return {**args, **({"threads": profile["threads"]} if profile.get("threads") else thread_args())}
+
+
+def profile_audio_args(profile: Dict[str, Any], audio_codec: str | None) -> Dict[str, Any]:
+    """
+    Output options for the source audio: stream-copied when the codec
+    fits in MP4, re-encoded to AAC at the profile's bitrate otherwise.
+    """
+    if audio_codec in MP4_AUDIO_CODECS:
+        return {"acodec": "copy"}
+    return {"acodec": "aac", "audio_bitrate": profile.get("audio_bitrate", "128k")}
+
+
+def scale_to_height(stream, max_height: int | None):
+    """
+    Downscale a video stream to at most `max_height`, keeping the aspect
+    ratio and an even width. Smaller videos are left as they are.
+    """
+    if not max_height:
+        return stream
+    return stream.filter("scale", -2, f"min({max_height},ih)")
+
+
+def keyframes_between(keyframes: List[float], start: float, end: float) -> List[float]:
+    """
+    Return the keyframes within [start, end].
+    """
+    return [k for k in keyframes if start <= k <= end]
+
+
+def split_at_keyframes(keyframes: List[float], duration: float, segments: int) -> List[Tuple[float, float]]:
+    """
+    Split [0, duration) into about `segments` ranges of similar length
+    whose boundaries are keyframes, so each range can be decoded on its own.
+
+    Returns:
+        list: (start, end) ranges covering the whole duration.
+    """
+    if segments < 2 or not keyframes:
+        return [(0.0, duration)]
+
+    boundaries = [0.0]
+    for idx in range(1, segments):
+        target = duration * idx / segments
+        nearest = min(keyframes, key=lambda k: abs(k - target))
+        if boundaries[-1] < nearest < duration:
+            boundaries.append(nearest)
+    boundaries.append(duration)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def keyframe_windows(
+    intervals: List[Tuple[float, float]], keyframes: List[float], duration: float
+) -> List[Tuple[float, float, bool]]:
+    """
+    Cover [0, duration) with spans that either need re-encoding or can be
+    stream-copied.
+
+    Each interval is widened to the keyframe at or before its start and
+    the keyframe at or after its end, then overlapping windows are merged.
+    The gaps between windows start and end on keyframes and can be copied.
+
+    Returns:
+        list: (start, end, encode) spans in timeline order.
+    """
+    windows = []
+    for start, end in sorted(intervals):
+        start, end = max(start, 0.0), min(end, duration)
+        if start >= end:
+            continue
+        start = max((k for k in keyframes if k <= start), default=0.0)
+        end = min((k for k in keyframes if k >= end), default=duration)
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+        else:
+            windows.append((start, end))
+
+    spans = []
+    position = 0.0
+    for start, end in windows:
+        if start > position:
+            spans.append((position, start, False))
+        spans.append((start, end, True))
+        position = end
+    if position < duration:
+        spans.append((position, duration, False))
+
+    return spans
+
+
+def copy_keyframe_range(input_path: str | Path, start_key: float, end_key: float, output_path: Path) -> None:
+    """
+    Stream-copy the video between two keyframes into `output_path`.
+
+    The segment muxer is used so the cut happens exactly on the keyframe
+    at `end_key`, a plain `-t` would keep the trailing B-frames decoded
+    after it.
+    """
+    length = end_key - start_key
+    pattern = output_path.with_name(f"{output_path.stem}_%03d{output_path.suffix}")
+    run_ffmpeg(
+        ffmpeg
+        .input(str(input_path), ss=start_key)
+        .output(
+            str(pattern),
+            t=length + 1,  # read a bit past end_key so the segmenter sees it
+            an=None,
+            vcodec="copy",
+            f="segment",
+            segment_times=max(length - 0.001, 0),
+            reset_timestamps=1,
+        ),
+        stage="ffmpeg_copy",
+    )
+
+    parts = sorted(output_path.parent.glob(f"{output_path.stem}_*{output_path.suffix}"))
+    parts[0].replace(output_path)
+    for part in parts[1:]:
+        part.unlink(missing_ok=True)
+
+
+def concat_segments(
+    segment_paths: List[Path], output_path: Path, audio_path: str | Path | None = None, durations: List[float] | None = None,
+    audio_args: Dict[str, Any] | None = None
+) -> None:
+    """
+    Stream-concatenate video segments into `output_path` with the concat
+    demuxer, optionally muxing a separately prepared audio track.
+
+    Segments should use SEGMENT_EXT so parameter sets travel in-band and
+    re-encoded segments can sit next to copied ones. When the timeline
+    length of each segment is known, pass it as `durations`: container
+    durations include the B-frame delay and would drift the timeline.
+    The audio is copied unless `audio_args` say otherwise.
+    """
+    list_path = output_path.with_name(output_path.stem + "_segments.txt")
+    with open(list_path, "w") as f:
+        for idx, path in enumerate(segment_paths):
+            f.write(f"file '{Path(path).resolve().as_posix()}'\n")
+            if durations is not None:
+                f.write(f"duration {durations[idx]:.6f}\n")
+
+    try:
+        video = ffmpeg.input(str(list_path), f="concat", safe=0)
+        streams = [video.video]
+        if audio_path is not None:
+            streams.append(ffmpeg.input(str(audio_path)).audio)
+
+        output_args = {"vcodec": "copy", "acodec": "copy", **(audio_args or {})}
+        run_ffmpeg(ffmpeg.output(*streams, str(output_path), movflags="+faststart", **output_args), stage="ffmpeg_copy")
+    finally:
+        list_path.unlink(missing_ok=True)
+
+
+HLS_PLAYLIST = "index.m3u8"
+HLS_INIT_SEGMENT = "init.mp4"
+
+
+def package_hls(input_path: Path, output_dir: Path, segment_seconds: float = 6.0) -> Path:
+    """
+    Remux a finished output into a VOD HLS package with fMP4 segments,
+    without re-encoding. Segments are cut on keyframes, so their length
+    is only close to `segment_seconds`.
+
+    Returns:
+        Path: The playlist, segments and init segment sit next to it.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    playlist = output_dir / HLS_PLAYLIST
+    run_ffmpeg(
+        ffmpeg
+        .input(str(input_path))
+        .output(
+            str(playlist),
+            c="copy",
+            f="hls",
+            hls_time=segment_seconds,
+            hls_playlist_type="vod",
+            hls_segment_type="fmp4",
+            hls_fmp4_init_filename=HLS_INIT_SEGMENT,
+            hls_segment_filename=str(output_dir / "segment_%05d.m4s"),
+        ),
+        stage="ffmpeg_copy",
+    )
+    return playlist
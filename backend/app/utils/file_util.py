@@ -1,8 +1,21 @@
 from pathlib import Path
 from datetime import datetime
+from typing import AsyncIterator, Tuple
+import hashlib
+import os
+import uuid
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
 
 def create_file_name(ext=".mp4"):
-    return f"video_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
+    # random suffix keeps names unique when several files are created in the same second
+    return f"video_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}{ext}"
+
+
+def content_addressed_name(digest: str, ext: str) -> str:
+    return f"{digest}{ext.lower()}"
 
 
 def get_upload_path(subfolder: str = 'videos') -> Path:
@@ -12,4 +25,82 @@ def get_upload_path(subfolder: str = 'videos') -> Path:
     """
     path = Path("uploads") / subfolder
     path.mkdir(parents=True, exist_ok=True)
-    return path
\ No newline at end of file
+    return path
+
+
+async def iter_upload_file(file: UploadFile, chunk_size: int | None = None) -> AsyncIterator[bytes]:
+    """
+    Yield the content of an uploaded file in bounded chunks.
+    """
+    chunk_size = chunk_size or settings.upload_chunk_size
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def write_stream(chunks: AsyncIterator[bytes], file_path: Path) -> Tuple[str, int]:
+    """
+    Write an async stream of bytes to disk, hashing the data as it arrives.
+
+    Only one chunk is held in memory at a time, and the blocking writes run
+    in the threadpool so the event loop is never stalled by disk I/O.
+    The file is written under a temporary name and renamed once complete,
+    so a dropped connection never leaves a truncated file at `file_path`.
+
+    Returns:
+        digest (str): sha256 hex digest of the written data.
+        size (int): Number of bytes written.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+
+    f = await run_in_threadpool(open, tmp_path, 'wb')
+    try:
+        async for chunk in chunks:
+            hasher.update(chunk)
+            size += len(chunk)
+            await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        f.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    f.close()
+
+    os.replace(tmp_path, file_path)
+    return hasher.hexdigest(), size
+
+
+def file_sha256(file_path: Path) -> str:
+    """
+    Hash a file on disk in bounded chunks.
+    """
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(settings.upload_chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def store_content_addressed(tmp_path: Path, digest: str, ext: str) -> Tuple[str, Path]:
+    """
+    Move a freshly written file to its content-addressed name.
+
+    If a file with the same digest is already stored, the new copy is
+    discarded and the existing one is returned instead.
+
+    Returns:
+        saved_filename (str): Content-addressed file name.
+        file_path (Path): Path of the stored file.
+    """
+    saved_filename = content_addressed_name(digest, ext)
+    file_path = tmp_path.parent / saved_filename
+
+    if file_path.exists():
+        tmp_path.unlink(missing_ok=True)
+    else:
+        os.replace(tmp_path, file_path)
+
+    return saved_filename, file_path
@@ -0,0 +1,162 @@
+from typing import Any, AsyncIterator, Dict
+import json
+import logging
+import threading
+import time
+
+import redis
+import redis.asyncio as aioredis
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# states after which a job publishes nothing more
+TERMINAL_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+_redis_client = None
+
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.redis_url)
+    return _redis_client
+
+
+def job_channel(job_id: str) -> str:
+    return f"job_events:{job_id}"
+
+
+def publish_job_event(job_id: str, status: str, progress: Dict[str, Any] | None = None, result: Any = None) -> None:
+    """
+    Push a job state change to the clients listening on the job's channel.
+
+    Publishing is best effort, a job never fails because nobody could be told.
+    """
+    event = {"task_id": job_id, "status": status, "progress": progress, "result": result}
+    try:
+        _get_redis().publish(job_channel(job_id), json.dumps(event, default=str))
+    except redis.RedisError as e:
+        logger.warning("Error publishing job event: %s", e)
+
+
+def claim_job(name: str, job_id: str, ttl: int) -> str:
+    """
+    Make `job_id` the one job doing `name` (e.g. packaging an output),
+    unless another job already holds the claim. Claims expire after
+    `ttl` seconds, so a lost job doesn't block the work forever.
+
+    Returns:
+        str: ID of the job holding the claim, `job_id` if it was free.
+    """
+    client = _get_redis()
+    key = f"job_claims:{name}"
+    if client.set(key, job_id, nx=True, ex=ttl):
+        return job_id
+    holder = client.get(key)
+    # released in the meantime
+    return holder.decode() if holder else claim_job(name, job_id, ttl)
+
+
+def release_job(name: str, job_id: str) -> None:
+    """
+    Drop the claim of `job_id` on `name`, if it still holds it.
+    """
+    client = _get_redis()
+    key = f"job_claims:{name}"
+    holder = client.get(key)
+    if holder and holder.decode() == job_id:
+        client.delete(key)
+
+
+class JobProgress:
+    """
+    Progress of a job made of one or more ffmpeg runs.
+
+    Each run reports the seconds of output it has produced under its own
+    part name, parts running in parallel add up. Updates are stored as the
+    PROGRESS state of the Celery task and published on the job's channel,
+    at most once per `settings.progress_interval`, and stored as a job
+    event every `settings.job_event_progress_step` percent.
+    """
+
+    def __init__(self, job_id: str, total: float | None = None):
+        self.job_id = job_id
+        self.total = total
+        self._parts: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_publish = 0.0
+        self._next_checkpoint = 0.0
+
+    def update(self, part: str, out_time: float, fps: float | None = None, speed: float | None = None) -> None:
+        with self._lock:
+            self._parts[part] = max(out_time, self._parts.get(part, 0.0))
+            done = sum(self._parts.values())
+            percent = min(done / self.total * 100, 100.0) if self.total else None
+
+            now = time.monotonic()
+            if now - self._last_publish < settings.progress_interval and percent != 100.0:
+                return
+            self._last_publish = now
+
+            step = settings.job_event_progress_step
+            checkpoint = step > 0 and percent is not None and percent >= self._next_checkpoint
+            if checkpoint:
+                self._next_checkpoint = (percent // step + 1) * step
+
+        progress = {
+            "percent": round(percent, 1) if percent is not None else None,
+            "out_time": round(done, 3),
+            "fps": fps,
+            "speed": speed,
+        }
+        from app.celery_app import celery_app
+
+        celery_app.backend.store_result(self.job_id, progress, "PROGRESS")
+        publish_job_event(self.job_id, "PROGRESS", progress=progress)
+        if checkpoint:
+            from app.services.job_event_services import record_job_event
+
+            record_job_event(self.job_id, "progress", status="PROGRESS", percent=progress["percent"])
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['status'].lower()}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def stream_job_events(job_id: str, current_state, is_disconnected) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for a job: its current state first, then every
+    published update until the job finishes or the client goes away.
+
+    Args:
+        job_id (str): Celery task ID.
+        current_state: Async callable returning the job status dict, read
+            once after subscribing so no update is missed in between.
+        is_disconnected: Async callable telling whether the client left.
+    """
+    client = aioredis.Redis.from_url(settings.redis_url)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(job_channel(job_id))
+    try:
+        state = await current_state()
+        yield format_sse(state)
+        if state["status"] in TERMINAL_STATES:
+            return
+
+        while not await is_disconnected():
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=settings.job_events_keepalive)
+            if message is None:
+                # keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+
+            event = json.loads(message["data"])
+            yield format_sse(event)
+            if event["status"] in TERMINAL_STATES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
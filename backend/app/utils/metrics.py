@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator
+import logging
+import os
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY
+from prometheus_client import multiprocess
+
+logger = logging.getLogger(__name__)
+
+
+# stages last from milliseconds (DB commit) to many minutes (encoding a long video)
+_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time until an API response starts, streamed bodies are not included.",
+    ["method", "route", "status"],
+    buckets=_DURATION_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "video_stage_duration_seconds",
+    "Time spent in one stage of handling a video (upload_write, probe, db_commit, ffmpeg, result_save...).",
+    ["stage", "job_type", "resolution"],
+    buckets=_DURATION_BUCKETS,
+)
+JOB_SECONDS = Histogram(
+    "video_job_duration_seconds",
+    "Run time of a Celery job, from start to finish on the worker.",
+    ["job_type", "resolution", "status"],
+    buckets=_DURATION_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "video_job_queue_wait_seconds",
+    "Time a job waited in the queue before a worker started it.",
+    ["job_type"],
+    buckets=_DURATION_BUCKETS,
+)
+FFMPEG_SPEED = Histogram(
+    "video_ffmpeg_speed_ratio",
+    "Speed reported by ffmpeg at the end of a run, in seconds of media per second.",
+    ["job_type", "resolution"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128),
+)
+FFMPEG_FPS = Histogram(
+    "video_ffmpeg_fps",
+    "Frames per second reported by ffmpeg at the end of a run.",
+    ["job_type", "resolution"],
+    buckets=(1, 5, 10, 25, 50, 100, 200, 400, 800, 1600),
+)
+FFMPEG_FAILURES = Counter(
+    "video_ffmpeg_failures_total",
+    "ffmpeg runs that exited with an error.",
+    ["job_type"],
+)
+
+# labels of the job running in the current thread, set by the Celery signals
+_current_job: ContextVar[Dict[str, Any] | None] = ContextVar("current_job", default=None)
+
+# API requests are not jobs, their stages are labelled "api"
+_NO_JOB = {"job_type": "api", "resolution": "unknown", "job_id": None}
+
+
+def resolution_label(width: int | None, height: int | None) -> str:
+    """
+    Bucket a frame size into a few classes (by its short side), keeping
+    the label cardinality low.
+    """
+    if not width or not height:
+        return "unknown"
+    short_side = min(width, height)
+    for limit, label in ((360, "360p"), (480, "480p"), (720, "720p"), (1080, "1080p"), (1440, "1440p")):
+        if short_side <= limit:
+            return label
+    return "2160p+"
+
+
+def current_job() -> Dict[str, Any] | None:
+    return _current_job.get()
+
+
+def start_job(job_type: str, job_id: str | None):
+    """
+    Label everything measured in this thread with the job until
+    `finish_job` is called with the returned token.
+    """
+    job = {"job_type": job_type, "job_id": job_id, "resolution": "unknown", "started": time.perf_counter()}
+    return _current_job.set(job)
+
+
+def finish_job(token, status: str) -> None:
+    job = _current_job.get()
+    _current_job.reset(token)
+    if job is None:
+        return
+
+    seconds = time.perf_counter() - job["started"]
+    JOB_SECONDS.labels(job["job_type"], job["resolution"], status).observe(seconds)
+    logger.info(
+        "job finished job_type=%s job_id=%s resolution=%s status=%s seconds=%.3f",
+        job["job_type"], job["job_id"], job["resolution"], status, seconds,
+    )
+
+
+def set_job_resolution(width: int | None, height: int | None) -> None:
+    """
+    Record the input size of the running job, once its probe is known.
+    """
+    job = _current_job.get()
+    if job is not None:
+        job["resolution"] = resolution_label(width, height)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """
+    Record the duration of a stage of the current job (or API request)
+    into the stage histogram and log it.
+    """
+    job = _current_job.get() or _NO_JOB
+    STAGE_SECONDS.labels(stage, job["job_type"], job["resolution"]).observe(seconds)
+    logger.debug(
+        "span stage=%s job_type=%s job_id=%s resolution=%s seconds=%.3f",
+        stage, job["job_type"], job["job_id"], job["resolution"], seconds,
+    )
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time the enclosed block as a stage of the current job.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def observe_ffmpeg_run(speed: float | None, fps: float | None, failed: bool = False) -> None:
+    """
+    Record the final speed and fps ffmpeg reported for a run of the current job.
+    """
+    job = _current_job.get() or _NO_JOB
+    if failed:
+        FFMPEG_FAILURES.labels(job["job_type"]).inc()
+        return
+    if speed is not None:
+        FFMPEG_SPEED.labels(job["job_type"], job["resolution"]).observe(speed)
+    if fps is not None:
+        FFMPEG_FPS.labels(job["job_type"], job["resolution"]).observe(fps)
+    logger.info(
+        "ffmpeg finished job_type=%s job_id=%s resolution=%s speed=%s fps=%s",
+        job["job_type"], job["job_id"], job["resolution"], speed, fps,
+    )
+
+
+def observe_queue_wait(job_type: str, seconds: float) -> None:
+    QUEUE_WAIT_SECONDS.labels(job_type).observe(max(seconds, 0.0))
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Registry to expose. With several processes (uvicorn workers, prefork
+    Celery pool) set PROMETHEUS_MULTIPROC_DIR, every process writes its
+    samples there and they are merged on scrape.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
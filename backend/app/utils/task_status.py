@@ -1,3 +1,57 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+import threading
+import time
+
+from app.config import settings
+from app.utils.job_events import TERMINAL_STATES
+
+# finished jobs never change state, their status is kept in process for a while instead of read again
+_terminal_statuses: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+_terminal_lock = threading.Lock()
+
+
+def _cached_status(task_id: str) -> dict | None:
+    with _terminal_lock:
+        entry = _terminal_statuses.get(task_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > settings.status_cache_ttl:
+            del _terminal_statuses[task_id]
+            return None
+        _terminal_statuses.move_to_end(task_id)
+        return dict(entry[1])
+
+
+def _cache_status(job_status: dict) -> None:
+    if job_status["status"] not in TERMINAL_STATES or settings.status_cache_size <= 0:
+        return
+    with _terminal_lock:
+        _terminal_statuses[job_status["task_id"]] = (time.monotonic(), dict(job_status))
+        _terminal_statuses.move_to_end(job_status["task_id"])
+        while len(_terminal_statuses) > settings.status_cache_size:
+            _terminal_statuses.popitem(last=False)
+
+
+def _status_from_meta(task_id: str, status: str, value: Any) -> dict:
+    res = None
+    progress = None
+
+    if status == "SUCCESS":
+        res = value  # the returned value of the task
+    elif status == "FAILURE":
+        res = str(value)  # exception info
+    elif status == "PROGRESS":
+        progress = value  # meta published by JobProgress
+
+    return {
+        "task_id": task_id,
+        "status": status,
+        "result": res,
+        "progress": progress
+    }
+
+
 def get_task_status(task_id: str) -> dict:
     """
     Check the status of a Celery task by ID.
@@ -5,24 +59,74 @@ def get_task_status(task_id: str) -> dict:
     Returns:
         dict: {
             "task_id": str,
-            "status": str,      # PENDING, STARTED, SUCCESS, FAILURE, etc.
-            "result": any       # result if SUCCESS, error info if FAILURE, else None
+            "status": str,      # PENDING, STARTED, PROGRESS, SUCCESS, FAILURE, etc.
+            "result": any,      # result if SUCCESS, error info if FAILURE, else None
+            "progress": dict    # percent, out_time, fps and speed if PROGRESS, else None
         }
     """
+    cached = _cached_status(task_id)
+    if cached is not None:
+        return cached
+
     from app.celery_app import celery_app
     from celery.result import AsyncResult
 
     result = AsyncResult(task_id, app=celery_app)
-    status = result.status
-    res = None
+    job_status = _status_from_meta(task_id, result.status, result.info)
+    _cache_status(job_status)
+    return job_status
 
-    if status == "SUCCESS":
-        res = result.result  # the returned value of the task
-    elif status == "FAILURE":
-        res = str(result.result)  # exception info
 
-    return {
-        "task_id": task_id,
-        "status": status,
-        "result": res
-    }
+def get_task_statuses(task_ids: List[str]) -> Dict[str, dict]:
+    """
+    Check the status of many Celery tasks at once: finished ones come from
+    the in-process cache, the others are read from the result backend in
+    a single MGET.
+
+    Returns:
+        dict: task_id -> status dict, as returned by get_task_status.
+    """
+    from app.celery_app import celery_app
+    from celery.backends.base import KeyValueStoreBackend
+
+    statuses = {}
+    missing = []
+    for task_id in dict.fromkeys(task_ids):
+        cached = _cached_status(task_id)
+        if cached is not None:
+            statuses[task_id] = cached
+        else:
+            missing.append(task_id)
+    if not missing:
+        return statuses
+
+    backend = celery_app.backend
+    if not isinstance(backend, KeyValueStoreBackend):
+        # no batched read on this backend
+        statuses.update((task_id, get_task_status(task_id)) for task_id in missing)
+        return statuses
+
+    keys = [backend.get_key_for_task(task_id) for task_id in missing]
+    values = backend.mget(keys)
+    if hasattr(values, "items"):
+        # memcached-like backends answer a mapping of the keys found
+        values = [values.get(key) for key in keys]
+    for task_id, value in zip(missing, values):
+        meta = backend.decode_result(value) if value is not None else {"status": "PENDING", "result": None}
+        job_status = _status_from_meta(task_id, meta["status"], meta.get("result"))
+        _cache_status(job_status)
+        statuses[task_id] = job_status
+    return statuses
+
+
+def mark_task_success(task_id: str, result) -> None:
+    """
+    Record a task as finished without running it, used when the result
+    is already available (e.g. served from a cache). Status and result
+    endpoints then behave exactly as for a real job.
+    """
+    from app.celery_app import celery_app
+    from app.utils.job_events import publish_job_event
+
+    celery_app.backend.store_result(task_id, result, "SUCCESS")
+    publish_job_event(task_id, "SUCCESS", result=result)
@@ -0,0 +1,161 @@
+from pathlib import Path
+from typing import Tuple
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+
+import ffmpeg
+from PIL import Image, ImageColor, ImageDraw, ImageFont, features
+from app.config import settings
+from .file_util import get_upload_path
+from .ffmpeg_util import run_ffmpeg
+
+TEXT_CACHE_SUBFOLDER = "text_cache"
+
+# scripts whose glyphs must be shaped (conjuncts, reordered vowel signs), Pillow's basic layout can't
+COMPLEX_SCRIPT_LANGUAGES = {"hi", "mr", "ta", "bn", "te"}
+
+
+def text_shaping_available() -> bool:
+    """
+    Whether Pillow was built with libraqm, needed to shape complex scripts.
+    Without it, captions in those scripts are drawn by ffmpeg's drawtext.
+    """
+    return features.check("raqm")
+
+
+def get_font_path(language: str | None = None) -> Path:
+    """
+    Return the font registered for a language, falling back to the
+    default language when it has none.
+
+    Raises:
+        ValueError: If no font is registered or the font file is missing.
+    """
+    fonts = settings.text_fonts
+    font = fonts.get(language or settings.text_default_language) or fonts.get(settings.text_default_language)
+    if not font:
+        raise ValueError(f"No font registered for language '{language}'.")
+
+    path = Path(font)
+    if not path.is_absolute():
+        path = Path(settings.text_font_dir) / path
+    if not path.exists():
+        raise ValueError(f"Font file {path} for language '{language}' not found.")
+    return path
+
+
+def parse_color(color: str) -> Tuple[int, int, int, int]:
+    """
+    Convert an ffmpeg color ('white', '#ff0000', '0xff000080', 'red@0.5')
+    to an RGBA tuple.
+
+    Raises:
+        ValueError: If the color can't be parsed.
+    """
+    color, _, alpha = str(color).partition("@")
+    if color.lower().startswith("0x"):
+        color = "#" + color[2:]
+
+    rgba = ImageColor.getcolor(color, "RGBA")
+    if alpha:
+        rgba = rgba[:3] + (round(rgba[3] * min(max(float(alpha), 0.0), 1.0)),)
+    return rgba
+
+
+def text_raster_key(content: str, font_path: Path, fontsize: int, fontcolor: str, engine: str) -> str:
+    payload = json.dumps([content, str(font_path), int(fontsize), str(fontcolor), engine], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _draw_with_pillow(content: str, font_path: Path, fontsize: int, fontcolor: str, layout) -> Image.Image:
+    font = ImageFont.truetype(str(font_path), int(fontsize), layout_engine=layout)
+    fill = parse_color(fontcolor)
+
+    left, top, right, bottom = ImageDraw.Draw(Image.new("RGBA", (1, 1))).multiline_textbbox(
+        (0, 0), content, font=font, anchor="la"
+    )
+    image = Image.new("RGBA", (max(right - min(left, 0), 1), max(bottom, 1)), (0, 0, 0, 0))
+    ImageDraw.Draw(image).multiline_text((-min(left, 0), 0), content, font=font, fill=fill, anchor="la")
+    return image
+
+
+def _draw_with_drawtext(content: str, font_path: Path, fontsize: int, fontcolor: str) -> Image.Image:
+    # canvas sized from the unshaped text with room to spare, cropped to the drawn glyphs afterwards
+    font = ImageFont.truetype(str(font_path), int(fontsize), layout_engine=ImageFont.Layout.BASIC)
+    _, _, right, bottom = ImageDraw.Draw(Image.new("RGBA", (1, 1))).multiline_textbbox((0, 0), content, font=font)
+    width, height = int(right * 1.5) + 2 * int(fontsize), int(bottom * 1.5) + 2 * int(fontsize)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # the text goes through a file and is drawn literally, it needs no escaping
+        text_path = Path(tmp_dir) / "text.txt"
+        text_path.write_text(content, encoding="utf-8")
+        png_path = Path(tmp_dir) / "text.png"
+        stream = (
+            # transparent canvas, the format must be set inside the lavfi graph to keep the alpha
+            ffmpeg.input(f"color=c=black@0.0:s={width}x{height},format=rgba", f="lavfi")
+            .drawtext(textfile=str(text_path), fontfile=str(font_path), fontsize=int(fontsize), fontcolor="white",
+                      expansion="none")
+        )
+        run_ffmpeg(stream.output(str(png_path), vframes=1, format="image2", vcodec="png"))
+        with Image.open(png_path) as drawn:
+            coverage = drawn.getchannel("A")
+
+    # drawtext blends onto the canvas color, only keep the glyph coverage and paint it in the font color
+    red, green, blue, alpha = parse_color(fontcolor)
+    image = Image.new("RGBA", coverage.size, (red, green, blue, 0))
+    image.putalpha(coverage.point(lambda value: value * alpha // 255))
+    bbox = coverage.getbbox()
+    return image.crop((0, 0, bbox[2], bbox[3])) if bbox else image.crop((0, 0, 1, 1))
+
+
+def rasterize_text(content: str, language: str | None = None, fontsize: int = 24, fontcolor: str = "white") -> Path:
+    """
+    Render a caption once to a transparent PNG sized to the text.
+
+    Rasters are cached in uploads/text_cache by (content, font, size, color),
+    so the same caption is rendered once and reused across jobs. Text is
+    shaped with raqm; without it, complex scripts are drawn with drawtext. The top
+    left corner of the image is the top of the first line, like drawtext.
+
+    Args:
+        content (str): Text to render, may span several lines.
+        language (str | None): Language picking the font from the registry.
+        fontsize (int): Font size in pixels.
+        fontcolor (str): Color in ffmpeg syntax.
+
+    Returns:
+        Path: Path of the cached PNG.
+
+    Raises:
+        ValueError: If the font or the color is invalid.
+    """
+    font_path = get_font_path(language)
+    parse_color(fontcolor)
+    # shaped by raqm when Pillow has it, complex scripts fall back to drawtext (HarfBuzz) otherwise
+    if text_shaping_available():
+        engine = "raqm"
+    elif (language or settings.text_default_language) in COMPLEX_SCRIPT_LANGUAGES:
+        engine = "drawtext"
+    else:
+        engine = "basic"
+
+    key = text_raster_key(content, font_path, fontsize, fontcolor, engine)
+    output_path = get_upload_path(TEXT_CACHE_SUBFOLDER) / f"{key}.png"
+    if output_path.exists():
+        return output_path
+
+    if engine == "drawtext":
+        image = _draw_with_drawtext(content, font_path, fontsize, fontcolor)
+    else:
+        layout = ImageFont.Layout.RAQM if engine == "raqm" else ImageFont.Layout.BASIC
+        image = _draw_with_pillow(content, font_path, fontsize, fontcolor, layout)
+
+    # several jobs may render the same caption at once, publish it atomically
+    tmp_path = output_path.with_name(f"{output_path.stem}_{uuid.uuid4().hex}.tmp")
+    image.save(tmp_path, format="PNG")
+    os.replace(tmp_path, output_path)
+
+    return output_path
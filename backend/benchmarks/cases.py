@@ -0,0 +1,176 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+import statistics
+import time
+
+from .media import MediaSpec
+
+
+@dataclass
+class Context:
+    """
+    Everything the benchmarks of one input share. `video` and `probe`
+    are the records registered by the upload benchmark.
+    """
+    spec: MediaSpec
+    path: Path
+    assets: Dict[str, Path]
+    repeat: int
+    render_modes: List[str]
+    client: Any = None
+    video: Any = None
+    probe: Any = None
+    results: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def timed(fn: Callable[[], Any], repeat: int) -> List[float]:
+    """
+    Wall-clock seconds of `repeat` calls of `fn`.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def record(ctx: Context, name: str, unit: str, better: str, samples: List[float]) -> None:
+    """
+    Store the median of `samples` as the value of a benchmark.
+
+    Args:
+        better (str): "lower" or "higher", the direction of an improvement.
+    """
+    ctx.results.append({
+        "benchmark": name,
+        "media": ctx.spec.name,
+        "unit": unit,
+        "better": better,
+        "value": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+        "samples": samples,
+    })
+
+
+def describe_error(error: Exception) -> str:
+    # ffmpeg errors carry the reason in the last line of stderr
+    stderr = getattr(error, "stderr", None)
+    lines = stderr.decode(errors="replace").strip().splitlines() if stderr else []
+    return f"{error}: {lines[-1]}" if lines else str(error)
+
+
+def measure(ctx: Context, name: str, unit: str, better: str, fn: Callable[[], Any],
+            rate: float | None = None) -> None:
+    """
+    Time `fn` and record it, as seconds or as `rate` per second.
+    A failure is recorded as the benchmark's error, the others still run.
+    """
+    try:
+        samples = timed(fn, ctx.repeat)
+    except Exception as e:
+        ctx.results.append({"benchmark": name, "media": ctx.spec.name, "value": None, "error": describe_error(e)})
+        return
+    record(ctx, name, unit, better, [rate / s for s in samples] if rate is not None else samples)
+
+
+def bench_upload(ctx: Context) -> None:
+    """
+    Upload throughput of POST /video/upload. The first upload registers
+    the video (and probes it) and is not timed; the timed ones stream,
+    hash and store the whole body, then hit the content-hash dedupe.
+    """
+    size_mb = ctx.path.stat().st_size / 1_000_000
+
+    def upload():
+        with open(ctx.path, "rb") as f:
+            response = ctx.client.post("/video/upload", files={"file": (ctx.path.name, f, "video/mp4")})
+        response.raise_for_status()
+        return response.json()["result"]
+
+    result = upload()
+    measure(ctx, "upload.throughput", "MB/s", "higher", upload, rate=size_mb)
+
+    from app.db import SessionLocal
+    from app.services.probe_services import get_media_probe
+    from app.services.video_services import get_video_by_id
+
+    db = SessionLocal()
+    try:
+        ctx.video = get_video_by_id(db, result["id"])
+        ctx.probe = get_media_probe(db, ctx.video.content_hash)
+        db.expunge_all()
+    finally:
+        db.close()
+
+
+def bench_probe(ctx: Context) -> None:
+    """
+    ffprobe latency: stream layout, then the keyframe index.
+    """
+    from app.services.probe_services import probe_media, probe_keyframes
+
+    measure(ctx, "probe.media", "s", "lower", lambda: probe_media(str(ctx.path)))
+    measure(ctx, "probe.keyframes", "s", "lower", lambda: probe_keyframes(str(ctx.path)))
+
+
+def bench_trim(ctx: Context) -> None:
+    """
+    Latency of trim_video cutting the middle half of the input, per mode.
+    """
+    from app.services.video_services import trim_video
+
+    start, end = ctx.spec.duration * 0.25, ctx.spec.duration * 0.75
+    for mode in ("copy", "accurate", "smart"):
+        def trim():
+            Path(trim_video(start, end, ctx.video.saved_filename, mode=mode, probe=ctx.probe)).unlink()
+
+        measure(ctx, f"trim.{mode}", "s", "lower", trim)
+
+
+def overlay_specs(ctx: Context) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    One overlay of each type, visible for the whole input.
+    """
+    window = {"start": 0, "end": ctx.spec.duration, "position": {"x": 16, "y": 16}}
+    return {
+        "text": [{"type": "text", "content": "Benchmark caption", "fontsize": 48, **window}],
+        "image": [{"type": "image", "file_key": str(ctx.assets["image"]), **window}],
+        "video": [{"type": "video", "file_key": str(ctx.assets["video"]), **window}],
+    }
+
+
+def bench_overlay(ctx: Context) -> None:
+    """
+    Render speed of each overlay type, in frames of output per second,
+    for every requested render mode.
+    """
+    from app.services.overlay_services import (
+        apply_overlays_to_video, apply_overlays_parallel, apply_overlays_windowed
+    )
+    from app.utils import get_upload_path
+
+    renderers = {
+        "single": lambda overlays: apply_overlays_to_video(ctx.video.saved_filename, overlays, probe=ctx.probe),
+        "parallel": lambda overlays: apply_overlays_parallel(ctx.video.saved_filename, overlays, ctx.probe),
+        "windowed": lambda overlays: apply_overlays_windowed(ctx.video.saved_filename, overlays, ctx.probe),
+    }
+
+    for otype, overlays in overlay_specs(ctx).items():
+        for mode in ctx.render_modes:
+            def render():
+                (get_upload_path("overlays") / renderers[mode](overlays)).unlink()
+
+            name = f"overlay.{otype}" if mode == "single" else f"overlay.{otype}.{mode}"
+            measure(ctx, name, "fps", "higher", render, rate=ctx.spec.frames)
+
+
+# run in this order, the upload registers the video the others use
+BENCHMARKS = {
+    "upload": bench_upload,
+    "probe": bench_probe,
+    "trim": bench_trim,
+    "overlay": bench_overlay,
+}
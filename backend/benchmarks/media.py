@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from pathlib import Path
+import ffmpeg
+
+
+@dataclass(frozen=True)
+class MediaSpec:
+    """
+    Synthetic input rendered from ffmpeg's lavfi sources
+    (testsrc2 video, sine audio).
+    """
+    width: int
+    height: int
+    duration: float
+    fps: int = 25
+    # keyframe interval in frames, fixed so copy trims and windowed renders see the same GOPs on every run
+    gop: int = 50
+    audio: bool = True
+
+    @property
+    def name(self) -> str:
+        return f"{self.width}x{self.height}_{self.duration:g}s_gop{self.gop}"
+
+    @property
+    def frames(self) -> int:
+        return round(self.duration * self.fps)
+
+
+# sets of inputs benchmarked by `--matrix`
+MATRICES = {
+    "quick": [
+        MediaSpec(640, 360, 10),
+    ],
+    "default": [
+        MediaSpec(640, 360, 30, gop=50),
+        MediaSpec(1280, 720, 30, gop=50),
+        MediaSpec(1280, 720, 30, gop=250),
+    ],
+    "full": [
+        MediaSpec(640, 360, 30, gop=50),
+        MediaSpec(1280, 720, 30, gop=25),
+        MediaSpec(1280, 720, 30, gop=250),
+        MediaSpec(1920, 1080, 60, gop=50),
+        MediaSpec(1920, 1080, 60, gop=250),
+    ],
+}
+
+# bit-exact, single threaded encodes give the same bytes on every run of the same ffmpeg build
+_DETERMINISTIC_ARGS = {
+    "fflags": "+bitexact",
+    "flags": "+bitexact",
+    "map_metadata": -1,
+    "threads": 1,
+}
+
+
+def generate_video(spec: MediaSpec, media_dir: Path) -> Path:
+    """
+    Render the synthetic video of `spec` into `media_dir`, reusing it if
+    it was already generated.
+    """
+    media_dir.mkdir(parents=True, exist_ok=True)
+    path = media_dir / f"{spec.name}.mp4"
+    if path.exists():
+        return path
+
+    streams = [
+        ffmpeg.input(f"testsrc2=size={spec.width}x{spec.height}:rate={spec.fps}:duration={spec.duration}", f="lavfi")
+    ]
+    if spec.audio:
+        streams.append(ffmpeg.input(f"sine=frequency=440:sample_rate=48000:duration={spec.duration}", f="lavfi"))
+
+    tmp_path = path.with_suffix(".tmp.mp4")
+    (
+        ffmpeg
+        .output(
+            *streams,
+            str(tmp_path),
+            vcodec="libx264",
+            preset="veryfast",
+            pix_fmt="yuv420p",
+            g=spec.gop,
+            keyint_min=spec.gop,
+            sc_threshold=0,
+            acodec="aac",
+            movflags="+faststart",
+            **_DETERMINISTIC_ARGS,
+        )
+        .overwrite_output()
+        .run(quiet=True)
+    )
+    tmp_path.replace(path)
+    return path
+
+
+def generate_overlay_assets(media_dir: Path) -> dict:
+    """
+    Render the image (semi-transparent PNG) and video inputs of the
+    overlay benchmarks.
+
+    Returns:
+        dict: Paths of the "image" and "video" assets.
+    """
+    media_dir.mkdir(parents=True, exist_ok=True)
+    image_path = media_dir / "overlay_image.png"
+    video_path = media_dir / "overlay_video.mp4"
+
+    if not image_path.exists():
+        (
+            ffmpeg
+            .input("testsrc2=size=256x144:rate=1", f="lavfi")
+            .filter("format", "rgba")
+            .filter("colorchannelmixer", aa=0.6)
+            .output(str(image_path), vframes=1, **_DETERMINISTIC_ARGS)
+            .overwrite_output()
+            .run(quiet=True)
+        )
+
+    if not video_path.exists():
+        (
+            ffmpeg
+            .input("testsrc=size=320x180:rate=25:duration=60", f="lavfi")
+            .output(str(video_path), vcodec="libx264", preset="veryfast", pix_fmt="yuv420p", g=50,
+                    **_DETERMINISTIC_ARGS)
+            .overwrite_output()
+            .run(quiet=True)
+        )
+
+    return {"image": image_path, "video": video_path}
@@ -0,0 +1,197 @@
+"""
+Benchmark the upload, probe, trim and overlay paths on synthetic media.
+
+Run from the backend folder:
+
+    python -m benchmarks --matrix quick
+    python -m benchmarks --save-baseline            # store the results as the baseline
+    python -m benchmarks --fail-on-regression       # exit 1 if slower than the baseline
+
+A benchmark that fails is reported and makes the run exit with 1.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from .media import MATRICES, generate_video, generate_overlay_assets
+from .standin import configure
+
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCHMARKS_DIR / "baseline.json"
+DEFAULT_MEDIA_DIR = BENCHMARKS_DIR / ".media"
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    return f"{result['benchmark']}/{result['media']}"
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> Dict[str, Any]:
+    """
+    Compare results with a baseline run. A change beyond `tolerance`
+    (relative) in the worse direction is a regression. A benchmark the
+    baseline has no value for is reported as "no baseline", one that
+    failed in this run as "failed".
+
+    Returns:
+        dict: Per benchmark key, the baseline and current values, the
+            relative change and its status.
+    """
+    previous = {result_key(result): result for result in baseline if result.get("value") is not None}
+    comparison = {}
+    for result in results:
+        key = result_key(result)
+        base = previous.get(key)
+        if base is None or not base["value"] or result.get("value") is None:
+            comparison[key] = {
+                "baseline": base["value"] if base else None,
+                "current": result.get("value"),
+                "unit": result.get("unit"),
+                "change": None,
+                "status": "failed" if result.get("value") is None else "no baseline",
+            }
+            continue
+
+        change = (result["value"] - base["value"]) / base["value"]
+        worse = change > tolerance if result["better"] == "lower" else change < -tolerance
+        better = change < -tolerance if result["better"] == "lower" else change > tolerance
+        comparison[key] = {
+            "baseline": base["value"],
+            "current": result["value"],
+            "unit": result["unit"],
+            "change": round(change, 4),
+            "status": "regression" if worse else "improvement" if better else "unchanged",
+        }
+    return comparison
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        ffmpeg_version = subprocess.run(
+            ["ffmpeg", "-version"], capture_output=True, text=True, check=True
+        ).stdout.splitlines()[0]
+    except (OSError, subprocess.CalledProcessError):
+        ffmpeg_version = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_version,
+    }
+
+
+def run_benchmarks(args) -> List[Dict[str, Any]]:
+    media_dir = Path(args.media_dir).resolve()
+    configure(Path(args.workdir or tempfile.mkdtemp(prefix="benchmarks_")).resolve())
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from .cases import BENCHMARKS, Context, describe_error
+
+    assets = generate_overlay_assets(media_dir)
+    client = TestClient(app)
+    results = []
+
+    for spec in MATRICES[args.matrix]:
+        print(f"[{spec.name}] generating input", file=sys.stderr)
+        ctx = Context(
+            spec=spec,
+            path=generate_video(spec, media_dir),
+            assets=assets,
+            repeat=args.repeat,
+            render_modes=args.render_modes,
+            client=client,
+            results=results,
+        )
+
+        for name in [name for name in BENCHMARKS if not args.only or name in args.only]:
+            print(f"[{spec.name}] {name}", file=sys.stderr)
+            try:
+                BENCHMARKS[name](ctx)
+            except Exception as e:
+                # keep going, the other benchmarks may still run
+                results.append({"benchmark": name, "media": spec.name, "value": None, "error": describe_error(e)})
+                if name == "upload":
+                    break
+
+    return results
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[1])
+    parser.add_argument("--matrix", choices=sorted(MATRICES), default="default", help="set of synthetic inputs")
+    parser.add_argument("--only", nargs="+", choices=["upload", "probe", "trim", "overlay"],
+                        help="benchmarks to run (upload always runs first, it registers the input)")
+    parser.add_argument("--render-modes", nargs="+", choices=["single", "parallel", "windowed"], default=["single"],
+                        help="overlay render modes to measure")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark, the median is kept")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="baseline report to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change ignored as noise")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with 1 if anything regressed")
+    parser.add_argument("--media-dir", default=str(DEFAULT_MEDIA_DIR), help="cache of the generated inputs")
+    parser.add_argument("--workdir", help="database and uploads folder, a temporary folder by default")
+    args = parser.parse_args(argv)
+
+    if args.only and "upload" not in args.only:
+        args.only = ["upload", *args.only]
+    # the stand-in environment changes the working directory
+    output_path = Path(args.output).resolve() if args.output else None
+    baseline_path = Path(args.baseline).resolve()
+
+    # the app prints as it works, keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_benchmarks(args)
+
+    report = {
+        "environment": environment(),
+        "matrix": args.matrix,
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    if baseline_path.exists() and not args.save_baseline:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        report["baseline"] = {"path": str(baseline_path), **baseline["environment"]}
+        report["comparison"] = compare(report["results"], baseline["results"], args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    if output_path:
+        output_path.write_text(output)
+    else:
+        print(output)
+
+    errors = [result for result in results if result.get("error")]
+    for result in errors:
+        print(f"ERROR {result_key(result)}: {result['error']}", file=sys.stderr)
+
+    if args.save_baseline:
+        # a benchmark that failed has nothing to compare with later
+        if errors:
+            print("Baseline not saved, some benchmarks failed", file=sys.stderr)
+        else:
+            baseline_path.write_text(output)
+            print(f"Baseline saved to {baseline_path}", file=sys.stderr)
+
+    comparison = report.get("comparison", {})
+    for key in [key for key, item in comparison.items() if item["status"] == "no baseline"]:
+        print(f"NO BASELINE {key}: not in {baseline_path.name}, not compared", file=sys.stderr)
+
+    regressions = [key for key, item in comparison.items() if item["status"] == "regression"]
+    for key in regressions:
+        item = comparison[key]
+        print(f"REGRESSION {key}: {item['baseline']:.4g} -> {item['current']:.4g} {item['unit']}", file=sys.stderr)
+
+    return 1 if errors or (regressions and args.fail_on_regression) else 0
@@ -0,0 +1,33 @@
+from pathlib import Path
+import os
+
+
+def configure(workdir: Path) -> None:
+    """
+    Point the app at local stand-ins before it is imported: a SQLite
+    database and uploads folder in `workdir`, Celery tasks run eagerly
+    with an in-memory result backend and job events go to fakeredis.
+
+    Must run before anything imports `app`, settings are read on import.
+    """
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{(workdir / 'benchmarks.db').resolve()}"
+    os.environ["REDIS_URL"] = "redis://localhost:6379/15"
+    # previews are a job of their own, they would be timed as part of the upload
+    os.environ["PREVIEWS_ON_UPLOAD"] = "false"
+    # uploads/ is relative to the working directory
+    os.chdir(workdir)
+
+    import fakeredis
+    from app.db import Base, engine
+    from app.celery_app import celery_app
+    from app.utils import job_events
+
+    Base.metadata.create_all(engine)
+    celery_app.conf.update(
+        task_always_eager=True,
+        task_store_eager_result=True,
+        broker_url="memory://",
+        result_backend="cache+memory://",
+    )
+    job_events._redis_client = fakeredis.FakeRedis()
@@ -1,4 +1,23 @@
+"""
+Start the Celery workers, one per queue (trim, preview, overlay, batch, default).
+
+    python start_celery.py                                   # every queue
+    python start_celery.py overlay --concurrency 4 --ffmpeg-threads 2
+    python start_celery.py --beat                            # also run the periodic lifecycle task
+
+Each worker runs a pool of processes sized from `worker_queues` in the
+settings, and every job's ffmpeg processes are held to a thread budget
+so the pools of all the workers together don't oversubscribe the CPU.
+The pool processes write their metrics to a per-worker
+PROMETHEUS_MULTIPROC_DIR, served merged on the worker's metrics port. With --beat the worker of the
+default queue also runs the schedule (only one beat per deployment).
+"""
+import argparse
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
 from pathlib import Path
 
 # allow to use the local 'ffmpeg.exe' and 'ffprobe.exe' stored in ffmpeg/bin folder, instead of global
@@ -6,5 +25,92 @@ from pathlib import Path
 ffmpeg_path = Path(__file__).resolve().parent / "ffmpeg" / "bin"
 os.environ["PATH"] += os.pathsep + str(ffmpeg_path)
 
-# Now start Celery
-os.system("celery -A app.celery_app worker --loglevel=info --pool=solo")
+from app.config import settings
+
+
+def worker_concurrency(queue: str, pool: str, concurrency: int | None = None) -> int:
+    """
+    Pool processes of the worker of `queue`. Unset values come from
+    `worker_queues`, 0 means one per core.
+    """
+    if pool == "solo":
+        return 1
+    return concurrency or settings.worker_queues.get(queue, {}).get("concurrency") or os.cpu_count() or 1
+
+
+def worker_ffmpeg_threads(queue: str, total_processes: int, ffmpeg_threads: int | None = None) -> int:
+    """
+    ffmpeg threads per job of the worker of `queue`. Unset values come
+    from `worker_queues`, 0 shares the cores evenly between the pool
+    processes of all the workers started, so busy queues together don't
+    oversubscribe the CPU.
+    """
+    cores = os.cpu_count() or 1
+    layout = settings.worker_queues.get(queue, {})
+    return ffmpeg_threads or layout.get("ffmpeg_threads") or max(1, cores // max(total_processes, 1))
+
+
+def metrics_dir(queue: str) -> Path:
+    """
+    Empty folder the pool processes of the worker of `queue` write their
+    metrics to (PROMETHEUS_MULTIPROC_DIR), merged when the worker is scraped.
+    Samples of a previous run are removed.
+    """
+    base = Path(os.environ.get("PROMETHEUS_MULTIPROC_DIR") or Path(tempfile.gettempdir()) / "video_worker_metrics")
+    path = base / queue
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+    return path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Start the Celery workers, one per queue.")
+    parser.add_argument("queues", nargs="*", help="queues to serve, all of `worker_queues` by default")
+    parser.add_argument("--concurrency", type=int, help="pool processes of each worker")
+    parser.add_argument("--ffmpeg-threads", type=int, help="threads the ffmpeg processes of one job may use")
+    # prefork is not available on Windows
+    parser.add_argument("--pool", choices=["prefork", "solo", "threads"],
+                        default="solo" if os.name == "nt" else "prefork")
+    parser.add_argument("--beat", action="store_true", help="run the periodic tasks (lifecycle) in one worker")
+    args = parser.parse_args(argv)
+
+    queues = args.queues or list(settings.worker_queues)
+    beat_queue = "default" if "default" in queues else queues[0]
+
+    concurrencies = {queue: worker_concurrency(queue, args.pool, args.concurrency) for queue in queues}
+    total_processes = sum(concurrencies.values())
+
+    workers = []
+    for idx, queue in enumerate(queues):
+        concurrency = concurrencies[queue]
+        ffmpeg_threads = worker_ffmpeg_threads(queue, total_processes, args.ffmpeg_threads)
+        env = {
+            **os.environ,
+            "FFMPEG_THREADS": str(ffmpeg_threads),
+            # every worker on the host serves its metrics on its own port, merged from all its pool processes
+            "WORKER_METRICS_PORT": str(settings.worker_metrics_port + idx),
+            "PROMETHEUS_MULTIPROC_DIR": str(metrics_dir(queue)),
+        }
+        command = [
+            sys.executable, "-m", "celery", "-A", "app.celery_app", "worker",
+            "--queues", queue,
+            "--hostname", f"{queue}@%h",
+            f"--pool={args.pool}",
+            f"--concurrency={concurrency}",
+            f"--loglevel={settings.log_level.lower()}",
+        ]
+        if args.beat and queue == beat_queue:
+            command.append("--beat")
+        print(f"{queue}: {concurrency} process(es), {ffmpeg_threads} ffmpeg thread(s) per job")
+        workers.append(subprocess.Popen(command, env=env))
+
+    try:
+        return max(worker.wait() for worker in workers)
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+        return max(worker.wait() for worker in workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# the app reads its settings on import: a throwaway SQLite database (shared by the sync and async engines),
+# no Redis running
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(tempfile.mkdtemp(prefix='tests_')) / 'tests.db'}")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def db():
+    """
+    A session on empty tables, dropped after the test.
+    """
+    from app.db import Base, SessionLocal, engine
+
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
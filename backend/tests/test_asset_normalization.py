@@ -0,0 +1,82 @@
+"""
+Normalized overlay assets must composite to the same pixels as the uploads they come from.
+"""
+import ffmpeg
+import pytest
+from PIL import Image
+
+from app.services.asset_services import normalize_overlay_asset
+from app.services.overlay_services import build_overlay_graph
+from app.utils import get_upload_path
+
+SIZE = 64
+# channel difference allowed between the paths, from YUV rounding
+TOLERANCE = 3
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # uploads/ is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+def _image(name: str, color: tuple) -> str:
+    path = get_upload_path("assets") / name
+    Image.new("RGBA", (16, 16), color).save(path)
+    return str(path)
+
+
+def _video(name: str, color: str) -> str:
+    path = get_upload_path("assets") / name
+    ffmpeg.input(f"color=c={color}:s=16x16:r=25:d=1", f="lavfi").output(
+        str(path), vcodec="libx264", pix_fmt="yuv420p"
+    ).run(quiet=True)
+    return str(path)
+
+
+def _overlay(file_key: str, otype: str = "image", **extra) -> dict:
+    return {"type": otype, "start": 0, "end": 1, "position": {"x": 24, "y": 24}, "file_key": file_key, **extra}
+
+
+def _center_pixel(overlays: list) -> list:
+    base = ffmpeg.input(f"color=c=gray:s={SIZE}x{SIZE}:r=25:d=1", f="lavfi")
+    stream = build_overlay_graph(base, overlays).filter("format", "yuv420p")
+    out, _ = stream.output("pipe:", vframes=1, format="rawvideo", pix_fmt="rgb24").run(quiet=True)
+    offset = (SIZE // 2 * SIZE + SIZE // 2) * 3
+    return list(out[offset:offset + 3])
+
+
+def _assert_close(actual: list, expected: list) -> None:
+    assert all(abs(a - e) <= TOLERANCE for a, e in zip(actual, expected)), (actual, expected)
+
+
+def test_semi_transparent_image_matches_the_upload():
+    upload = _image("translucent.png", (255, 0, 0, 128))
+    normalized = normalize_overlay_asset(_overlay(upload, file_hash="translucent"))
+
+    assert normalized["file_key"] != upload
+    _assert_close(_center_pixel([normalized]), _center_pixel([_overlay(upload)]))
+
+
+def test_image_opacity_matches_an_upload_with_that_alpha():
+    opaque = _image("opaque.png", (255, 0, 0, 255))
+    translucent = _image("half.png", (255, 0, 0, 128))
+    normalized = normalize_overlay_asset(_overlay(opaque, file_hash="opaque", opacity=0.5))
+
+    _assert_close(_center_pixel([normalized]), _center_pixel([_overlay(translucent)]))
+
+
+def test_video_opacity_matches_an_upload_with_that_alpha():
+    video = _video("blue.mp4", "blue")
+    translucent = _image("blue_half.png", (0, 0, 255, 128))
+    normalized = normalize_overlay_asset(_overlay(video, "video", file_hash="blue", opacity=0.5), fps=25)
+
+    assert normalized["file_key"].endswith(".mkv")
+    _assert_close(_center_pixel([normalized]), _center_pixel([_overlay(translucent)]))
+
+
+def test_normalized_overlay_is_not_normalized_again():
+    upload = _image("again.png", (255, 0, 0, 128))
+    normalized = normalize_overlay_asset(_overlay(upload, file_hash="again", opacity=0.5))
+
+    assert normalize_overlay_asset(normalized) == normalized
@@ -0,0 +1,79 @@
+"""
+Size-bounded eviction of the rendered overlay outputs.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config import settings
+from app.db import Overlay
+from app.services import overlay_services
+from app.services.overlay_services import evict_overlay_cache
+from app.utils import get_upload_path
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # uploads/ is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "overlay_cache_protect_seconds", 600)
+
+
+def _output(db, name: str, size: int, age: timedelta, job_id: str | None = None) -> None:
+    (get_upload_path("overlays") / name).write_bytes(b"0" * size)
+    db.add(Overlay(job_id=job_id or name, overlay_filename=name, overlay=[], size=size, last_accessed=NOW - age))
+    db.commit()
+
+
+def _evicted(db) -> set:
+    return {overlay.overlay_filename for overlay in db.query(Overlay).filter(Overlay.evicted_at.is_not(None))}
+
+
+def test_evicts_least_recently_used_until_within_budget(db):
+    _output(db, "old.mp4", 100, timedelta(days=3))
+    _output(db, "mid.mp4", 100, timedelta(days=2))
+    _output(db, "new.mp4", 100, timedelta(days=1))
+
+    assert evict_overlay_cache(db, max_bytes=150) == ["old.mp4", "mid.mp4"]
+    assert _evicted(db) == {"old.mp4", "mid.mp4"}
+    assert not (get_upload_path("overlays") / "old.mp4").exists()
+    assert (get_upload_path("overlays") / "new.mp4").exists()
+
+
+def test_shared_output_counts_once_and_as_its_latest_use(db):
+    _output(db, "shared.mp4", 100, timedelta(days=3), job_id="a")
+    # a later job reusing the output
+    db.add(Overlay(
+        job_id="b", overlay_filename="shared.mp4", overlay=[], size=100, last_accessed=NOW - timedelta(hours=1)
+    ))
+    db.commit()
+    _output(db, "other.mp4", 100, timedelta(days=2))
+
+    assert evict_overlay_cache(db, max_bytes=100) == ["other.mp4"]
+
+
+def test_output_in_keep_is_never_evicted(db):
+    _output(db, "huge.mp4", 1000, timedelta(days=3))
+    _output(db, "small.mp4", 10, timedelta(days=2))
+
+    assert evict_overlay_cache(db, max_bytes=100, keep={"huge.mp4"}) == ["small.mp4"]
+    assert "huge.mp4" not in _evicted(db)
+
+
+def test_recently_used_outputs_are_never_evicted(db):
+    _output(db, "old.mp4", 100, timedelta(days=3))
+    _output(db, "served.mp4", 1000, timedelta(minutes=1))
+
+    # still over budget, but the served output is in use
+    assert evict_overlay_cache(db, max_bytes=100) == ["old.mp4"]
+    assert _evicted(db) == {"old.mp4"}
+
+
+def test_fresh_render_over_budget_stays(db, monkeypatch):
+    monkeypatch.setattr(settings, "overlay_cache_protect_seconds", 0)
+    _output(db, "fresh.mp4", 1000, timedelta(0))
+
+    assert evict_overlay_cache(db, max_bytes=100, keep={"fresh.mp4"}) == []
+    assert overlay_services.get_storage().exists(get_upload_path("overlays") / "fresh.mp4")
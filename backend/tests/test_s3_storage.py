@@ -0,0 +1,193 @@
+"""
+S3 storage backend and the delivery of files only the store holds, against moto's in-memory S3.
+"""
+import asyncio
+
+import boto3
+import pytest
+from moto import mock_aws
+from starlette.requests import Request
+
+from app.config import settings
+from app.services import delivery_services
+from app.storage.s3 import S3Storage
+from app.utils import get_upload_path
+
+BUCKET = "video-backend-test"
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    # uploads/ is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "s3_bucket", BUCKET)
+    monkeypatch.setattr(settings, "s3_prefix", "media/")
+    monkeypatch.setattr(settings, "s3_region", "us-east-1")
+    monkeypatch.setattr(settings, "s3_redirect_downloads", False)
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        storage = S3Storage()
+        monkeypatch.setattr(delivery_services, "get_storage", lambda: storage)
+        yield storage
+
+
+@pytest.fixture
+def stored_file(storage):
+    # published, then only in the store
+    path = get_upload_path("overlays") / "result.mp4"
+    path.write_bytes(CONTENT)
+    storage.publish(path)
+    path.unlink()
+    return path
+
+
+def _request(headers: dict | None = None) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+def _body(response) -> bytes:
+    async def read():
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(read())
+
+
+def test_publish_stores_the_file_under_the_prefix(storage):
+    path = get_upload_path("videos") / "a.mp4"
+    path.write_bytes(CONTENT)
+
+    storage.publish(path)
+
+    head = storage.client.head_object(Bucket=BUCKET, Key="media/videos/a.mp4")
+    assert head["ContentLength"] == len(CONTENT)
+
+
+def test_exists_and_size_without_local_copy(storage, stored_file):
+    assert not stored_file.exists()
+    assert storage.exists(stored_file)
+    assert storage.size(stored_file) == len(CONTENT)
+
+    missing = get_upload_path("overlays") / "missing.mp4"
+    assert not storage.exists(missing)
+    assert storage.size(missing) is None
+
+
+def test_delete_removes_local_copy_and_object(storage):
+    path = get_upload_path("videos") / "a.mp4"
+    path.write_bytes(CONTENT)
+    storage.publish(path)
+
+    storage.delete(path)
+
+    assert not path.exists()
+    assert not storage.exists(path)
+
+
+def test_input_url_is_local_path_or_presigned_url(storage, stored_file):
+    local = get_upload_path("videos") / "local.mp4"
+    local.write_bytes(CONTENT)
+    assert storage.input_url(local) == str(local)
+
+    url = storage.input_url(stored_file)
+    assert url.startswith("https://")
+    assert "media/overlays/result.mp4" in url
+    assert "Signature" in url
+
+
+def test_fetch_downloads_a_stored_file(storage, stored_file):
+    assert storage.fetch(stored_file) == stored_file
+    assert stored_file.read_bytes() == CONTENT
+
+
+def test_storage_response_proxies_whole_file(stored_file):
+    response = delivery_services.media_file_response(_request(), stored_file, etag="abc", filename="result.mp4")
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-disposition"] == 'attachment; filename="result.mp4"'
+    assert _body(response) == CONTENT
+
+
+def test_storage_response_proxies_a_range(stored_file):
+    response = delivery_services.media_file_response(_request({"Range": "bytes=10-19"}), stored_file, etag="abc")
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+    assert response.headers["content-length"] == "10"
+    assert _body(response) == CONTENT[10:20]
+
+
+def test_storage_response_suffix_range(stored_file):
+    response = delivery_services.media_file_response(_request({"Range": "bytes=-5"}), stored_file, etag="abc")
+
+    assert response.status_code == 206
+    assert _body(response) == CONTENT[-5:]
+
+
+def test_storage_response_stale_if_range_gets_whole_file(stored_file):
+    request = _request({"Range": "bytes=10-19", "If-Range": '"other"'})
+    response = delivery_services.media_file_response(request, stored_file, etag="abc")
+
+    assert response.status_code == 200
+    assert _body(response) == CONTENT
+
+
+def test_storage_response_unsatisfiable_range(stored_file):
+    request = _request({"Range": f"bytes={len(CONTENT)}-"})
+    response = delivery_services.media_file_response(request, stored_file, etag="abc")
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_storage_response_missing_file(storage):
+    missing = get_upload_path("overlays") / "missing.mp4"
+    response = delivery_services.media_file_response(_request(), missing, etag="abc")
+
+    assert response.status_code == 404
+
+
+def test_storage_response_redirects_to_presigned_url(monkeypatch, stored_file):
+    monkeypatch.setattr(settings, "s3_redirect_downloads", True)
+
+    response = delivery_services.media_file_response(_request(), stored_file, etag="abc", filename="result.mp4")
+
+    assert response.status_code == 307
+    location = response.headers["location"]
+    assert "media/overlays/result.mp4" in location
+    assert "response-content-disposition=attachment" in location
+    assert response.headers["cache-control"] == "no-store"
+
+
+def test_storage_response_not_modified(stored_file):
+    response = delivery_services.media_file_response(_request({"If-None-Match": '"abc"'}), stored_file, etag="abc")
+
+    assert response.status_code == 304
+
+
+def test_list_files_reports_store_size_and_last_use(storage, stored_file):
+    package = get_upload_path("hls") / "abc"
+    package.mkdir()
+    (package / "index.m3u8").write_bytes(b"#EXTM3U")
+    storage.publish(package / "index.m3u8")
+
+    files = {str(path): size for path, size, _ in storage.list_files(get_upload_path("hls"))}
+
+    assert files == {str(package / "index.m3u8"): 7}
+    assert [path for path, _, _ in storage.list_files(get_upload_path("overlays"))] == [stored_file]
+
+
+def test_touch_refreshes_the_store_last_use(monkeypatch, storage, stored_file):
+    before = storage._head(stored_file)["LastModified"]
+    monkeypatch.setattr(settings, "s3_touch_interval", -1)
+
+    storage.touch(stored_file)
+
+    assert storage._head(stored_file)["LastModified"] >= before
+    assert storage.size(stored_file) == len(CONTENT)
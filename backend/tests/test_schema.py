@@ -0,0 +1,64 @@
+"""
+Databases created before the columns of the current models are brought up to date.
+"""
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+
+from app.db import Base, Overlay, TrimmedVideo, Video, create_schema
+
+# the tables as the first release created them
+BASELINE_TABLES = [
+    """CREATE TABLE videos (
+        id VARCHAR PRIMARY KEY, original_filename VARCHAR NOT NULL, saved_filename VARCHAR NOT NULL UNIQUE,
+        size INTEGER, duration FLOAT, upload_time DATETIME
+    )""",
+    """CREATE TABLE trimmed_videos (
+        id VARCHAR PRIMARY KEY, original_file_id VARCHAR NOT NULL REFERENCES videos (id),
+        saved_filename VARCHAR NOT NULL, upload_time DATETIME
+    )""",
+    """CREATE TABLE overlays (
+        id INTEGER PRIMARY KEY, job_id VARCHAR NOT NULL, overlay_filename VARCHAR NOT NULL, overlay JSON NOT NULL
+    )""",
+    "INSERT INTO videos VALUES ('v1', 'a.mp4', 'a.mp4', 10, 1.5, '2024-01-01 00:00:00')",
+    "INSERT INTO trimmed_videos VALUES ('t1', 'v1', 'a_trim.mp4', '2024-01-01 00:00:00')",
+    "INSERT INTO overlays VALUES (1, 'job', 'out.mp4', '[]')",
+]
+
+
+def _baseline_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        for statement in BASELINE_TABLES:
+            conn.exec_driver_sql(statement)
+    return engine
+
+
+def test_adds_the_missing_columns_and_indexes(tmp_path):
+    engine = _baseline_engine(tmp_path)
+
+    applied = create_schema(engine)
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {column.name for column in table.columns} <= {c["name"] for c in inspector.get_columns(table.name)}
+        assert {index.name for index in table.indexes} <= {i["name"] for i in inspector.get_indexes(table.name)}
+    assert any("ADD COLUMN content_hash" in change for change in applied)
+
+
+def test_existing_rows_are_kept_and_readable(tmp_path):
+    engine = _baseline_engine(tmp_path)
+
+    create_schema(engine)
+
+    with Session(engine) as db:
+        video = db.get(Video, "v1")
+        assert video.saved_filename == "a.mp4" and video.content_hash is None
+        assert db.get(TrimmedVideo, "t1").evicted_at is None
+        assert db.query(Overlay).filter(Overlay.cache_key.is_(None)).count() == 1
+
+
+def test_up_to_date_database_is_left_alone(tmp_path):
+    engine = _baseline_engine(tmp_path)
+    create_schema(engine)
+
+    assert create_schema(engine) == []
@@ -0,0 +1,236 @@
+"""
+Keyframe planning of smart trims and windowed renders, and frame-accurate trims of lavfi media.
+"""
+import ffmpeg
+import pytest
+
+from app.db import MediaProbe
+from app.services import video_services
+from app.services.probe_services import probe_keyframes, probe_media
+from app.services.video_services import KEYFRAME_EPSILON, trim_video
+from app.utils import get_upload_path
+from app.utils.ffmpeg_util import SEGMENT_EXT, keyframe_windows, keyframes_between, split_at_keyframes
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0]
+
+SIZE = 16
+FPS = 10
+# one GOP per second
+GOP = FPS
+# gray level difference allowed between a source frame and its re-encoded copy
+TOLERANCE = 2
+
+
+def _covers(ranges, duration):
+    assert ranges[0][0] == 0.0 and ranges[-1][1] == duration
+    assert all(previous[1] == current[0] for previous, current in zip(ranges, ranges[1:]))
+
+
+def test_keyframes_between_includes_the_bounds():
+    assert keyframes_between(KEYFRAMES, 2.0, 6.0) == [2.0, 4.0, 6.0]
+    assert keyframes_between(KEYFRAMES, 2.5, 3.5) == []
+
+
+def test_split_snaps_boundaries_to_the_nearest_keyframes():
+    ranges = split_at_keyframes(KEYFRAMES, 10.0, 3)
+
+    assert ranges == [(0.0, 4.0), (4.0, 6.0), (6.0, 10.0)]
+    _covers(ranges, 10.0)
+
+
+def test_split_drops_boundaries_snapped_to_the_same_keyframe():
+    # targets 2.5 and 5.0 and 7.5 all snap to the only inner keyframe
+    assert split_at_keyframes([0.0, 5.0], 10.0, 4) == [(0.0, 5.0), (5.0, 10.0)]
+
+
+def test_split_never_starts_a_range_at_zero_or_the_end():
+    assert split_at_keyframes([0.0, 10.0], 10.0, 2) == [(0.0, 10.0)]
+
+
+@pytest.mark.parametrize("keyframes, segments", [([], 4), (KEYFRAMES, 1)])
+def test_split_without_keyframes_or_segments_is_one_range(keyframes, segments):
+    assert split_at_keyframes(keyframes, 10.0, segments) == [(0.0, 10.0)]
+
+
+def test_windows_widen_to_the_surrounding_keyframes():
+    spans = keyframe_windows([(3.0, 5.0)], KEYFRAMES, 10.0)
+
+    assert spans == [(0.0, 2.0, False), (2.0, 6.0, True), (6.0, 10.0, False)]
+    _covers(spans, 10.0)
+
+
+def test_windows_on_keyframes_are_not_widened():
+    assert keyframe_windows([(2.0, 4.0)], KEYFRAMES, 10.0) == [
+        (0.0, 2.0, False), (2.0, 4.0, True), (4.0, 10.0, False)
+    ]
+
+
+def test_windows_sharing_a_gop_are_merged():
+    spans = keyframe_windows([(7.0, 7.5), (0.5, 1.5), (6.5, 9.0)], KEYFRAMES, 10.0)
+
+    assert spans == [(0.0, 2.0, True), (2.0, 6.0, False), (6.0, 10.0, True)]
+
+
+def test_windows_meeting_on_a_keyframe_are_merged():
+    assert keyframe_windows([(1.0, 4.0), (4.0, 5.0)], KEYFRAMES, 10.0) == [(0.0, 6.0, True), (6.0, 10.0, False)]
+
+
+def test_windows_skip_empty_intervals_and_clamp_to_the_duration():
+    spans = keyframe_windows([(3.0, 3.0), (12.0, 15.0), (9.0, 12.0), (-1.0, 0.0)], KEYFRAMES, 10.0)
+
+    assert spans == [(0.0, 8.0, False), (8.0, 10.0, True)]
+
+
+def test_windows_without_intervals_copy_everything():
+    assert keyframe_windows([], KEYFRAMES, 10.0) == [(0.0, 10.0, False)]
+
+
+@pytest.fixture
+def smart_plan(tmp_path, monkeypatch):
+    """
+    Run _trim_smart against a probe with a keyframe every 2 seconds,
+    recording the parts it would encode, copy and concatenate.
+    """
+    monkeypatch.chdir(tmp_path)
+    plan = {"encoded": [], "copied": [], "durations": None}
+
+    def run_ffmpeg(stream, progress=None, part="main", stage="ffmpeg"):
+        plan["encoded"].append(part)
+
+    def copy_keyframe_range(input_path, start_key, end_key, output_path):
+        plan["copied"].append((start_key, end_key))
+
+    def concat_segments(segment_paths, output_path, audio_path=None, durations=None, audio_args=None):
+        plan["durations"] = durations
+
+    monkeypatch.setattr(video_services, "run_ffmpeg", run_ffmpeg)
+    monkeypatch.setattr(video_services, "copy_keyframe_range", copy_keyframe_range)
+    monkeypatch.setattr(video_services, "concat_segments", concat_segments)
+
+    probe = MediaProbe(keyframes=KEYFRAMES, video_codec="h264", pix_fmt="yuv420p", audio_codec=None)
+
+    def trim(start_time, end_time):
+        video_services._trim_smart("input.mp4", tmp_path / "out.mp4", start_time, end_time, probe)
+        return plan
+
+    return trim
+
+
+def test_smart_trim_encodes_the_partial_gops_only(smart_plan):
+    plan = smart_plan(1.0, 7.0)
+
+    assert plan["encoded"] == ["head", "tail"]
+    assert plan["copied"] == [(2.0, 6.0)]
+    assert plan["durations"] == [1.0, 4.0, 1.0]
+
+
+def test_smart_trim_skips_parts_within_the_keyframe_epsilon(smart_plan):
+    plan = smart_plan(2.0 - KEYFRAME_EPSILON / 2, 6.0 + KEYFRAME_EPSILON / 2)
+
+    assert plan["encoded"] == []
+    assert plan["copied"] == [(2.0, 6.0)]
+    assert plan["durations"] == [4.0]
+
+
+def test_smart_trim_encodes_parts_beyond_the_keyframe_epsilon(smart_plan):
+    plan = smart_plan(2.0 - KEYFRAME_EPSILON * 2, 6.0 + KEYFRAME_EPSILON * 2)
+
+    assert plan["encoded"] == ["head", "tail"]
+    assert plan["copied"] == [(2.0, 6.0)]
+
+
+def test_smart_trim_without_a_complete_gop_encodes_everything(smart_plan):
+    plan = smart_plan(2.5, 5.5)
+
+    assert plan["encoded"] == ["main"]
+    assert plan["copied"] == []
+    assert plan["durations"] is None
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """
+    A 4 second upload with a keyframe every second, whose frame N is
+    flat gray at a level growing with N, and its probe.
+    """
+    # uploads/ is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    path = get_upload_path() / "source.mp4"
+    video = ffmpeg.input(f"color=c=black:s={SIZE}x{SIZE}:r={FPS}:d=4", f="lavfi").filter(
+        "geq", lum="N*6", cb=128, cr=128
+    )
+    audio = ffmpeg.input("sine=d=4", f="lavfi")
+    ffmpeg.output(
+        video, audio, str(path), vcodec="libx264", pix_fmt="yuv420p", g=GOP, keyint_min=GOP, sc_threshold=0,
+        acodec="aac"
+    ).run(quiet=True)
+
+    probe = MediaProbe(**probe_media(str(path)), keyframes=probe_keyframes(str(path)))
+    return path, probe
+
+
+def _frame_levels(path) -> list:
+    out, _ = ffmpeg.input(str(path)).output("pipe:", format="rawvideo", pix_fmt="gray").run(quiet=True)
+    pixels = SIZE * SIZE
+    return [sum(out[i:i + pixels]) / pixels for i in range(0, len(out), pixels)]
+
+
+def _assert_same_frames(actual: list, expected: list) -> None:
+    assert len(actual) == len(expected), (actual, expected)
+    assert all(abs(a - e) <= TOLERANCE for a, e in zip(actual, expected)), (actual, expected)
+
+
+@pytest.fixture(scope="module")
+def mpegts(tmp_path_factory):
+    """
+    Skip when the ffmpeg on the PATH can't read back the MPEG-TS
+    segments smart trims copy from an MP4 (some static builds crash).
+    """
+    tmp = tmp_path_factory.mktemp("mpegts")
+    segment = tmp / f"segment{SEGMENT_EXT}"
+    try:
+        ffmpeg.input(f"color=c=black:s={SIZE}x{SIZE}:r={FPS}:d=1", f="lavfi").output(
+            str(tmp / "source.mp4"), vcodec="libx264", pix_fmt="yuv420p"
+        ).run(quiet=True)
+        ffmpeg.input(str(tmp / "source.mp4")).output(str(segment), vcodec="copy").run(quiet=True)
+        ffmpeg.input(str(segment)).output("pipe:", f="null").run(quiet=True)
+    except ffmpeg.Error:
+        pytest.skip("this ffmpeg can't demux stream-copied MPEG-TS segments")
+
+
+# with a head and a tail to encode, on keyframes (copy only), without a complete GOP (accurate fallback)
+TRIM_RANGES = [(0.5, 3.5), (1.0, 3.0), (1.2, 1.8)]
+
+
+def _assert_trimmed(source_path, trimmed, start_time, end_time):
+    first, last = round(start_time * FPS), round(end_time * FPS)
+    _assert_same_frames(_frame_levels(trimmed), _frame_levels(source_path)[first:last])
+    assert probe_media(trimmed)["duration"] == pytest.approx(end_time - start_time, abs=1 / FPS)
+
+
+@pytest.mark.parametrize("start_time, end_time", TRIM_RANGES)
+def test_accurate_trim_is_frame_accurate(source, start_time, end_time):
+    path, probe = source
+
+    trimmed = trim_video(start_time, end_time, path.name, mode="accurate", probe=probe)
+
+    _assert_trimmed(path, trimmed, start_time, end_time)
+
+
+@pytest.mark.parametrize("start_time, end_time", TRIM_RANGES)
+def test_smart_trim_is_frame_accurate(mpegts, source, start_time, end_time):
+    path, probe = source
+
+    trimmed = trim_video(start_time, end_time, path.name, mode="smart", probe=probe)
+
+    _assert_trimmed(path, trimmed, start_time, end_time)
+
+
+def test_copy_trim_starts_on_the_requested_frame(source):
+    path, probe = source
+
+    trimmed = trim_video(1.2, 2.6, path.name, mode="copy", probe=probe)
+
+    # stream copy can only end on a packet boundary, it may run past the end time
+    levels, expected = _frame_levels(trimmed), _frame_levels(path)[12:26]
+    _assert_same_frames(levels[:len(expected)], expected)
@@ -0,0 +1,101 @@
+"""
+Uploads of the same content share one video record, also when they are saved at the same time.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.db import SessionLocal, Video
+from app.services import video_services
+from app.services.video_services import save_video_metadata
+from app.utils import content_addressed_name, get_upload_path
+
+DIGEST = "ab" * 32
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # uploads/ is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture
+def stored_upload():
+    name = content_addressed_name(DIGEST, ".mp4")
+    path = get_upload_path() / name
+    path.write_bytes(b"video")
+    return name, str(path)
+
+
+@pytest.fixture
+def probe(monkeypatch):
+    calls = []
+
+    def get_or_create_media_probe(db, content_hash, file_path):
+        calls.append(content_hash)
+        return SimpleNamespace(duration=1.0, size=5)
+
+    monkeypatch.setattr(video_services, "get_or_create_media_probe", get_or_create_media_probe)
+    return calls
+
+
+def _insert_video(video_id: str, saved_filename: str) -> None:
+    # another upload, committed on its own connection
+    other = SessionLocal()
+    other.add(Video(id=video_id, original_filename="other.mp4", saved_filename=saved_filename, content_hash=DIGEST))
+    other.commit()
+    other.close()
+
+
+def test_repeat_upload_returns_the_existing_video(db, stored_upload, probe):
+    name, path = stored_upload
+
+    first = save_video_metadata("a.mp4", name, db, path, content_hash=DIGEST)
+    second = save_video_metadata("b.mp4", name, db, path, content_hash=DIGEST)
+
+    assert second.id == first.id
+    assert probe == [DIGEST]
+
+
+def test_concurrent_insert_of_the_same_content_returns_it(db, stored_upload, monkeypatch):
+    name, path = stored_upload
+
+    # the other upload commits between our lookup and our insert
+    def get_or_create_media_probe(db, content_hash, file_path):
+        _insert_video("concurrent", name)
+        return SimpleNamespace(duration=1.0, size=5)
+
+    monkeypatch.setattr(video_services, "get_or_create_media_probe", get_or_create_media_probe)
+
+    video = save_video_metadata("a.mp4", name, db, path, content_hash=DIGEST)
+
+    assert video.id == "concurrent"
+    assert db.query(Video).count() == 1
+
+
+def test_saved_filename_taken_by_the_same_content_returns_it(db, stored_upload, probe, monkeypatch):
+    name, path = stored_upload
+    lookups = []
+
+    # the other upload commits right after our content hash lookup
+    def get_video_by_hash(db, content_hash):
+        lookups.append(content_hash)
+        if len(lookups) == 1:
+            _insert_video("concurrent", name)
+            return None
+        return db.query(Video).filter(Video.content_hash == content_hash).first()
+
+    monkeypatch.setattr(video_services, "get_video_by_hash", get_video_by_hash)
+
+    video = save_video_metadata("a.mp4", name, db, path, content_hash=DIGEST)
+
+    assert video.id == "concurrent"
+    assert probe == []
+
+
+def test_saved_filename_collision_without_content_hash_still_fails(db, stored_upload):
+    name, path = stored_upload
+    _insert_video("existing", name)
+
+    with pytest.raises(ValueError):
+        save_video_metadata("a.mp4", name, db, path)
@@ -0,0 +1,85 @@
+"""
+Keyset pages of list_videos: every video exactly once, in order, whatever the page size.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.db import AsyncSessionLocal, Video, async_engine
+from app.services.video_services import list_videos
+
+# naive UTC, as stored
+T0 = datetime(2026, 3, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def videos(db):
+    """
+    Videos without upload time, several sharing one upload time and a
+    few with their own, returned in listing order.
+    """
+    times = {
+        "null-a": None, "null-b": None, "null-c": None,
+        "same-a": T0, "same-b": T0, "same-c": T0, "same-d": T0,
+        "newer": T0 + timedelta(hours=1), "older": T0 - timedelta(hours=1), "oldest": T0 - timedelta(days=1),
+    }
+    for video_id, upload_time in times.items():
+        db.add(Video(
+            id=video_id, original_filename=f"{video_id}.mp4", saved_filename=f"{video_id}.mp4",
+            upload_time=upload_time,
+        ))
+    db.commit()
+    # the column default fills in a None upload time, clear it afterwards
+    db.query(Video).filter(Video.id.like("null-%")).update({Video.upload_time: None}, synchronize_session=False)
+    db.commit()
+
+    return [
+        "null-c", "null-b", "null-a", "newer", "same-d", "same-c", "same-b", "same-a", "older", "oldest"
+    ]
+
+
+def _all_pages(limit: int, **filters) -> list:
+    async def read():
+        pages = []
+        try:
+            async with AsyncSessionLocal() as session:
+                cursor = None
+                while True:
+                    items, cursor = await list_videos(session, limit, cursor=cursor, fields=["id"], **filters)
+                    pages.append([item["id"] for item in items])
+                    if cursor is None:
+                        return pages
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(read())
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 10, 11])
+def test_pages_list_every_video_once_in_order(videos, limit):
+    pages = _all_pages(limit)
+
+    assert [video_id for page in pages for video_id in page] == videos
+    assert all(len(page) == limit for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= limit
+
+
+def test_aware_bounds_are_compared_in_utc(videos):
+    # 14:00+02:00 is T0, the time of the same-* videos
+    local = timezone(timedelta(hours=2))
+    after = (T0 + timedelta(hours=2)).replace(tzinfo=local)
+    before = (T0 + timedelta(hours=3)).replace(tzinfo=local)
+
+    pages = _all_pages(2, uploaded_after=after, uploaded_before=before)
+
+    assert [video_id for page in pages for video_id in page] == ["same-d", "same-c", "same-b", "same-a"]
+
+
+def test_aware_bounds_page_without_gaps(videos):
+    after = (T0 - timedelta(hours=1)).replace(tzinfo=timezone.utc)
+
+    pages = _all_pages(3, uploaded_after=after)
+
+    # videos without upload time match no time range
+    assert [video_id for page in pages for video_id in page] == videos[3:9]